@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import csv
+import sys
+from time import perf_counter, time
+from typing import Iterable, NamedTuple, Optional, TextIO
+
+import aiohttp
+
+from pipeline import WritePipeline
+from scraper import FreeImagesAsyncScraper
+from storage import Database
+from writers import DatabaseWriter, RecentKeys
+
+DEFAULT_NUMBER_OF_ITEMS = 1000
+
+
+class ManifestEntry(NamedTuple):
+    query: str
+    number_of_items: int
+
+
+class QueryResult(NamedTuple):
+    query: str
+    requested: int
+    items: int
+    failed_pages: dict[int, str]
+    elapsed: float
+    run_id: int
+
+
+def read_manifest(
+    lines: Iterable[str], default_items: int = DEFAULT_NUMBER_OF_ITEMS
+) -> list[ManifestEntry]:
+    """
+    Read a batch manifest: one ``query,number_of_items`` per line.
+
+    The number of items is optional and defaults to ``default_items``. Blank lines and
+    lines starting with ``#`` are ignored.
+
+    Raises
+    ------
+    ValueError
+        If a line has an empty query or an invalid number of items, or a query is listed
+        twice.
+    """
+    entries = []
+    queries = set()
+    for line_number, row in enumerate(csv.reader(lines), start=1):
+        if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+            continue
+        query = row[0].strip()
+        # Runs of the same query would share their checkpoints, and crawl the same pages.
+        if query in queries:
+            raise ValueError(f"Duplicate query on line {line_number}: {query}")
+        queries.add(query)
+        try:
+            number_of_items = (
+                int(row[1]) if len(row) > 1 and row[1].strip() else default_items
+            )
+        except ValueError:
+            raise ValueError(f"Invalid number of items on line {line_number}: {row[1]}")
+        if number_of_items <= 0:
+            raise ValueError(f"Invalid number of items on line {line_number}: {row[1]}")
+        entries.append(ManifestEntry(query, number_of_items))
+    return entries
+
+
+class BatchRunner:
+    """
+    Runs many queries through one crawl engine.
+
+    Every query gets its own FreeImagesAsyncScraper state (query, pages, checkpoints), but
+    they all share one pooled HTTP session, one global limit of requests in flight, one
+    SQLite connection and one background write pipeline. The global limit is a FIFO
+    semaphore, so the active queries take turns fairly instead of the first ones starving
+    the others.
+
+    Parameters
+    ----------
+    concurrency : int
+        Global number of requests in flight, across all queries.
+    per_query_concurrency : int
+        Pages in flight for a single query, the chunk size of its scraper.
+    max_active_queries : int
+        Number of queries crawled at the same time.
+    db_name : str
+        The SQLite database receiving the results.
+    profile : str
+        The database profile, "ingest" by default.
+    resume : bool
+        Skip the pages already checkpointed for each query. The checkpoints are read up
+        front, before the shared write pipeline starts using the connection.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 50,
+        per_query_concurrency: int = 10,
+        max_active_queries: int = 20,
+        db_name: str = "data.sqlite3",
+        profile: str = "ingest",
+        resume: bool = False,
+    ):
+        self.concurrency = concurrency
+        self.per_query_concurrency = per_query_concurrency
+        self.max_active_queries = max_active_queries
+        self.db_name = db_name
+        self.profile = profile
+        self.resume = resume
+
+    def create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.concurrency,
+            keepalive_timeout=30,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    async def run(
+        self,
+        manifest: list[ManifestEntry],
+        session: Optional[aiohttp.ClientSession] = None,
+    ) -> list[QueryResult]:
+        """
+        Crawl every query of the manifest.
+
+        Parameters
+        ----------
+        manifest : list[ManifestEntry]
+            The queries and their number of items.
+        session : Optional[aiohttp.ClientSession]
+            A session to use instead of creating one. It is not closed.
+
+        Returns
+        -------
+        list[QueryResult]
+            Per-query totals and timings, in manifest order.
+        """
+        database = Database(self.db_name, profile=self.profile)
+
+        # All the runs are registered, and the checkpoints read, up front, in one
+        # transaction, before the writer thread starts using the connection.
+        with database.transaction():
+            DatabaseWriter.create_schema(database)
+            known_keys = RecentKeys()
+            writers = [
+                DatabaseWriter(
+                    entry.query,
+                    db=database,
+                    known_keys=known_keys,
+                    create_schema=False,
+                )
+                for entry in manifest
+            ]
+            completed_pages = [
+                writer.completed_pages(entry.query) if self.resume else {}
+                for entry, writer in zip(manifest, writers)
+            ]
+
+        request_semaphore = asyncio.Semaphore(self.concurrency)
+        active_queries = asyncio.Semaphore(self.max_active_queries)
+        owns_session = session is None
+        session = session or self.create_session()
+        try:
+            async with WritePipeline() as pipeline:
+
+                async def run_query(
+                    entry: ManifestEntry,
+                    writer: DatabaseWriter,
+                    completed_pages: dict[int, int],
+                ):
+                    async with active_queries:
+                        scraper = FreeImagesAsyncScraper(
+                            entry.number_of_items,
+                            entry.query,
+                            writer,
+                            chunk_size=self.per_query_concurrency,
+                            session=session,
+                            write_pipeline=pipeline,
+                            resume=self.resume,
+                            completed_pages=completed_pages,
+                            request_semaphore=request_semaphore,
+                        )
+                        start = perf_counter()
+                        result = await scraper.scrap()
+                        return QueryResult(
+                            entry.query,
+                            entry.number_of_items,
+                            result.items,
+                            result.failed_pages,
+                            perf_counter() - start,
+                            writer.run_id,
+                        )
+
+                return await asyncio.gather(
+                    *(
+                        run_query(entry, writer, pages)
+                        for entry, writer, pages in zip(
+                            manifest, writers, completed_pages
+                        )
+                    )
+                )
+        finally:
+            if owns_session:
+                await session.close()
+
+
+def print_report(results: list[QueryResult], elapsed: float, file: TextIO = sys.stdout):
+    width = max([len("query")] + [len(result.query) for result in results])
+    print(
+        f"{'query':<{width}}  {'requested':>9}  {'items':>9}  {'failed':>6}  {'time':>8}  run",
+        file=file,
+    )
+    for result in results:
+        print(
+            f"{result.query:<{width}}  {result.requested:>9}  {result.items:>9}"
+            f"  {len(result.failed_pages):>6}  {result.elapsed:>7.2f}s  {result.run_id}",
+            file=file,
+        )
+    total_items = sum(result.items for result in results)
+    print(
+        f"{len(results)} queries, {total_items} images in {elapsed:.2f}s "
+        f"({total_items / elapsed if elapsed else 0:.0f} images/s)",
+        file=file,
+    )
+
+
+async def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Scrape many queries in one process. The manifest holds one "
+        "'query,number_of_items' per line."
+    )
+    parser.add_argument(
+        "manifest",
+        nargs="?",
+        default="-",
+        help="Manifest file, or '-' to read it from stdin (default).",
+    )
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--per-query-concurrency", type=int, default=10)
+    parser.add_argument("--max-active-queries", type=int, default=20)
+    parser.add_argument("--db", default="data.sqlite3")
+    parser.add_argument("--resume", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.manifest == "-":
+        manifest = read_manifest(sys.stdin)
+    else:
+        with open(args.manifest, newline="") as file:
+            manifest = read_manifest(file)
+
+    runner = BatchRunner(
+        concurrency=args.concurrency,
+        per_query_concurrency=args.per_query_concurrency,
+        max_active_queries=args.max_active_queries,
+        db_name=args.db,
+        resume=args.resume,
+    )
+    start = time()
+    results = await runner.run(manifest)
+    print_report(results, time() - start)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
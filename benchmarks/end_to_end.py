@@ -0,0 +1,313 @@
+# Runs FreeImagesAsyncScraper end to end against the local mock server, and reports pages/s,
+# items/s, page latency percentiles, peak RSS, bytes transferred and the sink write rate. The results are saved
+# as JSON, and can be compared with a previous run to catch regressions.
+#
+# Usage: python -m benchmarks.end_to_end [--items N] [--latency S] [--streaming] [--compress]
+#        [--output results.json] [--baseline previous.json]
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from statistics import quantiles
+from time import perf_counter
+from typing import Optional
+
+from benchmarks.mock_server import MockFreeImagesServer
+from parsers import get_parser
+from pipeline import WritePipeline
+from scraper import FreeImagesAsyncScraper
+from writers import DatabaseWriter, IWriter, JsonLinesWriter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Metrics where a higher value is better; for the others, lower is better.
+HIGHER_IS_BETTER = {"pages_per_second", "items_per_second", "sink_rows_per_second"}
+
+
+class MemoryWriter(IWriter):
+    # Counts the rows without storing them, to measure the crawl without a sink.
+    def __init__(self):
+        self.rows = 0
+
+    def write(self, data):
+        self.rows += len(data)
+
+
+class TimedWriter(IWriter):
+    # Wraps a sink and measures the time spent writing, to report its rows/s.
+    def __init__(self, writer: IWriter):
+        self.writer = writer
+        self.rows = 0
+        self.seconds = 0.0
+
+    def write(self, data):
+        self.write_pages([(None, data)])
+
+    def write_pages(self, pages):
+        start = perf_counter()
+        self.writer.write_pages(pages)
+        self.seconds += perf_counter() - start
+        self.rows += sum(len(rows) for _, rows in pages)
+
+    def completed_pages(self, query):
+        return self.writer.completed_pages(query)
+
+    def close(self):
+        self.writer.close()
+
+
+def create_sink(sink: str, directory: str) -> IWriter:
+    if sink == "memory":
+        return MemoryWriter()
+    if sink == "sqlite":
+        return DatabaseWriter(
+            "benchmark", os.path.join(directory, "bench.sqlite3"), profile="ingest"
+        )
+    if sink == "jsonl":
+        return JsonLinesWriter(os.path.join(directory, "bench.jsonl"))
+    raise ValueError(f"Unknown sink: {sink}")
+
+
+def peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def latency_percentiles(latencies: list[float]) -> dict[str, Optional[float]]:
+    if len(latencies) < 2:
+        value = latencies[0] if latencies else None
+        return {"latency_p50": value, "latency_p95": value, "latency_p99": value}
+    cuts = quantiles(latencies, n=100, method="inclusive")
+    return {"latency_p50": cuts[49], "latency_p95": cuts[94], "latency_p99": cuts[98]}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(
+    items: int = 6000,
+    chunk_size: int = 25,
+    latency: float = 0.05,
+    jitter: float = 0.01,
+    error_rate: float = 0.0,
+    items_per_page: int = 60,
+    padding: int = 0,
+    parser: str = "tokenizer",
+    sink: str = "sqlite",
+    streaming: bool = False,
+    compress: bool = False,
+    seed: Optional[int] = 0,
+) -> dict:
+    """
+    Crawl ``items`` results from a fresh mock server and measure the run.
+
+    Returns
+    -------
+    dict
+        The configuration, the environment and the measured results.
+    """
+    config = {
+        "items": items,
+        "chunk_size": chunk_size,
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "items_per_page": items_per_page,
+        "padding": padding,
+        "parser": parser,
+        "sink": sink,
+        "streaming": streaming,
+        "compress": compress,
+        "seed": seed,
+    }
+    page_latencies = []
+
+    server = MockFreeImagesServer(
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        items_per_page=items_per_page,
+        padding=padding,
+        compress=compress,
+        seed=seed,
+    )
+
+    class BenchmarkScraper(FreeImagesAsyncScraper):
+        ITEMS_PER_PAGE = items_per_page
+
+        async def scrape_page(self, page):
+            start = perf_counter()
+            try:
+                return await super().scrape_page(page)
+            finally:
+                page_latencies.append(perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as directory:
+        async with server:
+            BenchmarkScraper.BASE_URL = server.base_url
+            writer = TimedWriter(create_sink(sink, directory))
+            scraper = BenchmarkScraper(
+                items,
+                "benchmark",
+                writer,
+                chunk_size=chunk_size,
+                parser=get_parser(parser),
+                write_pipeline=WritePipeline(writer),
+                streaming=streaming,
+            )
+            # The per-page progress lines would dominate the profile.
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = perf_counter()
+                result = await scraper.scrap()
+                elapsed = perf_counter() - start
+            writer.close()
+
+    pages = len(page_latencies)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": {
+            "items": result.items,
+            "pages": pages,
+            "failed_pages": len(result.failed_pages),
+            "requests": server.requests,
+            "server_errors": server.errors,
+            "elapsed": elapsed,
+            "pages_per_second": pages / elapsed if elapsed else 0.0,
+            "items_per_second": result.items / elapsed if elapsed else 0.0,
+            **latency_percentiles(page_latencies),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "transfer_bytes": result.transfer_bytes,
+            "sink_rows_per_second": (
+                writer.rows / writer.seconds if writer.seconds else None
+            ),
+        },
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.1) -> list[str]:
+    """
+    List the metrics that got worse than the baseline by more than ``tolerance``.
+    """
+    regressions = []
+    for name, value in results["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if name not in HIGHER_IS_BETTER and not name.startswith("latency_"):
+            continue
+        if not value or not previous:
+            continue
+        change = (value - previous) / previous
+        worse = -change if name in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {previous:.4g} -> {value:.4g} ({change:+.1%})")
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    metrics = results["results"]
+    print(
+        f"{metrics['items']} items, {metrics['pages']} pages in {metrics['elapsed']:.2f}s"
+    )
+    print(
+        f"  {metrics['pages_per_second']:.1f} pages/s, "
+        f"{metrics['items_per_second']:.0f} items/s"
+    )
+    if metrics["latency_p50"] is not None:
+        print(
+            f"  page latency p50={metrics['latency_p50'] * 1000:.1f}ms "
+            f"p95={metrics['latency_p95'] * 1000:.1f}ms "
+            f"p99={metrics['latency_p99'] * 1000:.1f}ms"
+        )
+    if metrics["peak_rss_bytes"] is not None:
+        print(f"  peak RSS {metrics['peak_rss_bytes'] / 2**20:.1f} MiB")
+    print(f"  {metrics['transfer_bytes'] / 2**20:.1f} MiB transferred")
+    if metrics["sink_rows_per_second"] is not None:
+        print(f"  sink {metrics['sink_rows_per_second']:.0f} rows/s")
+    if metrics["failed_pages"]:
+        print(f"  {metrics['failed_pages']} pages failed")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--items", type=int, default=6000)
+    argument_parser.add_argument("--chunk-size", type=int, default=25)
+    argument_parser.add_argument("--latency", type=float, default=0.05)
+    argument_parser.add_argument("--jitter", type=float, default=0.01)
+    argument_parser.add_argument("--error-rate", type=float, default=0.0)
+    argument_parser.add_argument("--items-per-page", type=int, default=60)
+    argument_parser.add_argument("--padding", type=int, default=0)
+    argument_parser.add_argument("--parser", default="tokenizer")
+    argument_parser.add_argument(
+        "--sink", choices=["memory", "sqlite", "jsonl"], default="sqlite"
+    )
+    argument_parser.add_argument(
+        "--streaming", action="store_true", help="Parse the pages while reading them."
+    )
+    argument_parser.add_argument(
+        "--compress", action="store_true", help="Serve gzip compressed pages."
+    )
+    argument_parser.add_argument("--seed", type=int, default=0)
+    argument_parser.add_argument("--output", default="benchmark_results.json")
+    argument_parser.add_argument(
+        "--baseline", help="A previous results file to compare with."
+    )
+    argument_parser.add_argument("--tolerance", type=float, default=0.1)
+    args = argument_parser.parse_args(argv)
+
+    results = asyncio.run(
+        run_benchmark(
+            items=args.items,
+            chunk_size=args.chunk_size,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            items_per_page=args.items_per_page,
+            padding=args.padding,
+            parser=args.parser,
+            sink=args.sink,
+            streaming=args.streaming,
+            compress=args.compress,
+            seed=args.seed,
+        )
+    )
+    print_results(results)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"  regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
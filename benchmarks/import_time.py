@@ -0,0 +1,108 @@
+# Measures the cold import time of the entry points with "python -X importtime", each in a
+# fresh interpreter, lists the slowest imports, and checks the totals against a budget.
+#
+# Usage: python -m benchmarks.import_time [module ...] [--top N] [--budget-ms MS]
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds allowed for each entry point, best of a few runs, on a CI runner. "main"
+# only parses the arguments; every run then imports "scraper", most of it aiohttp.
+IMPORT_BUDGETS_MS = {"main": 150.0, "scraper": 450.0}
+
+# "import time: self [us] | cumulative | imported package", nested imports are indented.
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+class ImportTime(NamedTuple):
+    module: str
+    # Milliseconds spent importing the module itself, and with its own imports.
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+def measure_import_time(module: str, python: str = sys.executable) -> list[ImportTime]:
+    """
+    Import a module in a new interpreter, run from the repository root.
+
+    Returns
+    -------
+    list[ImportTime]
+        Every module imported, in the order their imports completed: the module itself
+        comes last. Modules already imported by the interpreter at startup are not listed.
+    """
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            times.append(
+                ImportTime(
+                    name, int(self_us) / 1000, int(cumulative_us) / 1000, len(indent)
+                )
+            )
+    return times
+
+
+def total_import_time(module: str, repeat: int = 3) -> tuple[float, list[ImportTime]]:
+    # The best of a few runs, the others include disk and cache noise.
+    runs = [measure_import_time(module) for _ in range(repeat)]
+    best = min(runs, key=lambda times: times[-1].cumulative_ms)
+    return best[-1].cumulative_ms, best
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument(
+        "modules",
+        nargs="*",
+        default=list(IMPORT_BUDGETS_MS),
+        help="Default: the modules with a budget.",
+    )
+    argument_parser.add_argument("--top", type=int, default=10)
+    argument_parser.add_argument("--repeat", type=int, default=3)
+    argument_parser.add_argument(
+        "--budget-ms",
+        type=float,
+        help="Budget for every module, instead of the default budgets.",
+    )
+    args = argument_parser.parse_args(argv)
+
+    over_budget = []
+    for module in args.modules:
+        total, times = total_import_time(module, args.repeat)
+        budget = args.budget_ms or IMPORT_BUDGETS_MS.get(module)
+        print(
+            f"{module}: {total:.1f} ms"
+            + (f" (budget {budget:.0f} ms)" if budget is not None else "")
+        )
+        for time in sorted(times, key=lambda time: time.self_ms, reverse=True)[
+            : args.top
+        ]:
+            print(
+                f"  {time.module:<40} {time.self_ms:>8.1f} ms {time.cumulative_ms:>8.1f} ms"
+            )
+        if budget is not None and total > budget:
+            over_budget.append(module)
+
+    for module in over_budget:
+        print(f"{module} is over its import time budget")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# Local stand-in for the Free Images search, serving synthetic "grid-article" pages with
+# configurable latency, jitter, error rate and page size.
+#
+# Usage: python -m benchmarks.mock_server [--port 8080] [--latency 0.05] ...
+
+import argparse
+import asyncio
+import gzip
+import random
+from functools import lru_cache
+from typing import Optional
+
+from aiohttp import web
+
+from benchmarks.pages import build_search_page
+
+
+class MockFreeImagesServer:
+    """
+    Parameters
+    ----------
+    latency : float
+        Mean delay before a page is answered, in seconds.
+    jitter : float
+        The delay is drawn uniformly within ``latency`` +/- ``jitter``.
+    error_rate : float
+        Share of the requests answered with a 503.
+    items_per_page : int
+        Results on a full page.
+    total_items : Optional[int]
+        Size of the result set. Pages past it are short or empty. Unlimited by default.
+    padding : int
+        Extra bytes added to the end of every page, to simulate heavier markup.
+    compress : bool
+        Answer with gzip compressed pages when the client accepts them.
+    seed : Optional[int]
+        Seed of the latency and error draws, for repeatable runs.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        items_per_page: int = 60,
+        total_items: Optional[int] = None,
+        padding: int = 0,
+        compress: bool = False,
+        seed: Optional[int] = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.items_per_page = items_per_page
+        self.total_items = total_items
+        self.padding = padding
+        self.compress = compress
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        # Pages are rendered once, so rendering doesn't compete with the scraper for the CPU.
+        self._render = lru_cache(maxsize=4096)(self._render_page)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/search/{query}/{page}", self.search)
+        return app
+
+    async def __aenter__(self) -> "MockFreeImagesServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # With port 0 the system picks a free port.
+        self.port = self._runner.addresses[0][1]
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503, text="Service Unavailable")
+        gzipped = self.compress and "gzip" in request.headers.get("Accept-Encoding", "")
+        body = self._render(
+            request.match_info["query"], int(request.match_info["page"]), gzipped
+        )
+        response = web.Response(body=body, content_type="text/html", charset="utf-8")
+        if gzipped:
+            response.headers["Content-Encoding"] = "gzip"
+        return response
+
+    def _render_page(self, query: str, page: int, gzipped: bool = False) -> bytes:
+        items = self.items_per_page
+        if self.total_items is not None:
+            remaining = self.total_items - (page - 1) * self.items_per_page
+            items = max(0, min(items, remaining))
+        html = build_search_page(query, page, items)
+        if self.padding:
+            html += f"<!-- {'x' * self.padding} -->"
+        return gzip.compress(html.encode()) if gzipped else html.encode()
+
+
+async def serve(server: MockFreeImagesServer) -> None:
+    async with server:
+        print(f"Serving synthetic search pages on {server.base_url}")
+        await asyncio.Event().wait()
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--port", type=int, default=8080)
+    argument_parser.add_argument("--latency", type=float, default=0.05)
+    argument_parser.add_argument("--jitter", type=float, default=0.0)
+    argument_parser.add_argument("--error-rate", type=float, default=0.0)
+    argument_parser.add_argument("--items-per-page", type=int, default=60)
+    argument_parser.add_argument("--total-items", type=int, default=None)
+    argument_parser.add_argument("--padding", type=int, default=0)
+    argument_parser.add_argument("--compress", action="store_true")
+    args = argument_parser.parse_args()
+
+    server = MockFreeImagesServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        items_per_page=args.items_per_page,
+        total_items=args.total_items,
+        padding=args.padding,
+        compress=args.compress,
+        port=args.port,
+    )
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
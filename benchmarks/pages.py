@@ -0,0 +1,46 @@
+# Synthetic Free Images search pages, using the same "grid-article" markup as the live site.
+
+ARTICLE = (
+    '<article class="grid-article"><a class="grid-link" href="/photo/{slug}">'
+    ' <figure class="grid-figure" style="background:#fff"><picture>'
+    '<source srcset="https://images.freeimages.com/images/large-previews/{folder}/{slug}.jpg?fmt=webp&amp;w=500">'
+    '<img alt="{query}" class="grid-thumb" height="{height}" loading="lazy"'
+    ' src="https://images.freeimages.com/images/large-previews/{folder}/{slug}.jpg?fmt=webp&amp;w=500" width="{width}">'
+    '</picture><figcaption class="figcaption">{title}</figcaption></figure> </a>'
+    '<div class="grid-item-overlay absolute z-10 opacity-0"><div class="tags-container absolute px-4 py-3">'
+    '<a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full" href="/search/{query}"> {query} </a>'
+    '<a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full" href="/search/{query}s"> {query}s </a>'
+    '</div><div class="flex h-full items-end px-4 py-3"><h4 class="text-white truncate">{title}</h4></div>'
+    "</div></article>"
+)
+
+HEADER = (
+    "<html><head><title>Free Images</title>"
+    + '<script>window.__data = {"links": ["<a class=\\"grid-link\\" href=\\"/x\\">"]};</script>'
+    * 10
+    + '</head><body><header class="site-header">'
+    + '<a class="nav-link" href="/categories">Categories</a>' * 80
+    + '</header><main><div class="grid-container">'
+)
+
+FOOTER = (
+    "</div></main><footer>"
+    + '<p class="footer-text">Free Images</p><a href="/about">About</a>' * 150
+    + "</footer></body></html>"
+)
+
+
+def build_search_page(query: str, page: int, items: int = 60) -> str:
+    # Returns a search results page holding "items" unique images.
+    articles = "".join(
+        ARTICLE.format(
+            query=query,
+            slug=f"{query}-{page}{index:03d}",
+            folder=f"{(page * 7 + index) % 4096:03x}",
+            title=f"{query.title()} {page}-{index}",
+            width=2000,
+            height=1600,
+        )
+        for index in range(items)
+    )
+    return HEADER + articles + FOOTER
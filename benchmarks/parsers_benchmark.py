@@ -0,0 +1,31 @@
+# Micro-benchmark of the parser backends: pages parsed per second on a synthetic search page.
+#
+# Usage: python -m benchmarks.parsers_benchmark [--pages N]
+
+import argparse
+from time import perf_counter
+
+from benchmarks.pages import build_search_page
+from parsers import PARSERS
+
+
+def benchmark(parser, html_content: str, pages: int) -> float:
+    start = perf_counter()
+    for _ in range(pages):
+        parser.parse(html_content)
+    return pages / (perf_counter() - start)
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--pages", type=int, default=200)
+    args = argument_parser.parse_args()
+
+    html_content = build_search_page("dog", 1)
+    for name, parser_class in PARSERS.items():
+        pages_per_second = benchmark(parser_class(), html_content, args.pages)
+        print(f"{name:>15}: {pages_per_second:10.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Compares SQLite ingest rates: the default profile writing page by page, as the
+# DatabaseWriter does, against the ingest profile bulk loading from an iterator.
+#
+# Usage: python -m benchmarks.storage_benchmark [--rows N]
+
+import argparse
+import os
+import tempfile
+from time import perf_counter
+
+from storage import Database
+
+CREATE = "CREATE TABLE images(url VARCHAR);"
+INSERT = "INSERT INTO images(url) VALUES (?);"
+PAGE_SIZE = 60
+
+
+def generate_rows(count):
+    return (
+        (f"https://www.freeimages.com/photo/image-{index}",) for index in range(count)
+    )
+
+
+def default_per_page(path, count):
+    db = Database(path)
+    db.execute(CREATE)
+    page = []
+    for row in generate_rows(count):
+        page.append(row)
+        if len(page) == PAGE_SIZE:
+            db.executemany(INSERT, page)
+            page = []
+    if page:
+        db.executemany(INSERT, page)
+
+
+def ingest_bulk(path, count):
+    db = Database(path, profile="ingest")
+    db.execute(CREATE)
+    db.bulk_insert(INSERT, generate_rows(count))
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--rows", type=int, default=300_000)
+    args = argument_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, load in (("default", default_per_page), ("ingest", ingest_bulk)):
+            path = os.path.join(directory, f"{name}.sqlite3")
+            start = perf_counter()
+            load(path, args.rows)
+            rows_per_second = args.rows / (perf_counter() - start)
+            print(f"{name:>8}: {rows_per_second:12.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
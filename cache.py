@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import zlib
+from hashlib import sha256
+from time import time
+from typing import NamedTuple, Optional
+
+from queries import (
+    COUNT_PARSED,
+    CREATE_CACHE_SCHEMA,
+    DELETE_LEAST_RECENT_PARSED,
+    DELETE_RESPONSE,
+    INSERT_PARSED,
+    INSERT_RESPONSE,
+    SELECT_LEAST_RECENT_RESPONSE,
+    SELECT_PARSED,
+    SELECT_RESPONSE,
+    SELECT_RESPONSE_SIZE,
+    SELECT_RESPONSES_SIZE,
+    UPDATE_PARSED_ACCESSED_AT,
+    UPDATE_RESPONSE_ACCESSED_AT,
+    UPDATE_RESPONSE_REVALIDATED,
+)
+from records import ImageRecord
+from storage import Database
+
+# Past their cap (one per KiB of the size cap), the oldest parsed pages are trimmed down to
+# PARSED_TRIM of it at once, so the trims are batched.
+PARSED_TRIM = 0.9
+# Access times are kept in memory and written in one transaction every so many reads.
+ACCESS_FLUSH_SIZE = 256
+
+
+class CachedResponse(NamedTuple):
+    # The validators of a cached response. Its body is only read after a 304.
+    url: str
+    file_name: str
+    encoding: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    On-disk cache of search pages, revalidated with conditional requests.
+
+    Bodies are stored zlib-compressed, one file per URL, next to an SQLite index holding
+    their ETag and Last-Modified headers. A cached page is revalidated with
+    If-None-Match / If-Modified-Since, and a 304 answer is served from the cache: only the
+    validators are read before the request, the body is read once the site answered 304.
+    The records parsed from a page are cached too, keyed by the hash of its content and of
+    the parser, so a page that didn't change is not parsed again.
+
+    Reads don't write: the access times that drive the LRU order are written in batches,
+    before every eviction, and on `close`. The methods do blocking file and SQLite I/O and
+    may be called from worker threads, one call at a time; the scraper runs them with
+    ``asyncio.to_thread``.
+
+    Parameters
+    ----------
+    directory : str
+        Where the index and the bodies are stored.
+    max_bytes : int
+        Size cap of the compressed bodies. The least recently used ones are evicted first.
+    ttl : float
+        Entries older than this many seconds are dropped instead of revalidated.
+    """
+
+    def __init__(
+        self,
+        directory: str = ".cache",
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 7 * 24 * 3600,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_parsed_rows = max(1, max_bytes // 1024)
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+
+        self.db = Database(os.path.join(directory, "index.sqlite3"), profile="ingest")
+        with self.db.transaction():
+            for statement in CREATE_CACHE_SCHEMA:
+                self.db.execute(statement)
+        self.size = self.db.execute(SELECT_RESPONSES_SIZE).fetchone()[0]
+        self.parsed_rows = self.db.execute(COUNT_PARSED).fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.parse_hits = 0
+        self.parse_misses = 0
+        self.evictions = 0
+
+        # Access times not written yet, by URL and by content hash.
+        self._accessed: dict[str, float] = {}
+        self._parsed_accessed: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "parse_hits": self.parse_hits,
+            "parse_misses": self.parse_misses,
+            "evictions": self.evictions,
+            "size": self.size,
+        }
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """
+        Return the validators of the cached response of a URL, or None if there is none or
+        it expired. The body is not read, see `revalidated` and `load_body`.
+        """
+        with self._lock:
+            row = self.db.execute(SELECT_RESPONSE, (url,)).fetchone()
+            if row is None:
+                return None
+
+            file_name, encoding, etag, last_modified, stored_at = row
+            if time() - stored_at > self.ttl:
+                self._delete(url, file_name)
+                return None
+
+            self._accessed[url] = time()
+            self._flush_if_full()
+            return CachedResponse(
+                url, file_name, encoding, etag, last_modified, stored_at
+            )
+
+    def load_body(self, entry: CachedResponse) -> Optional[bytes]:
+        """
+        Return the body of a cached response, or None if it is missing or corrupt: the entry
+        is then removed.
+        """
+        with self._lock:
+            return self._load_body(entry)
+
+    def put(
+        self,
+        url: str,
+        body: bytes,
+        encoding: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """
+        Store a response. Responses without validators can't be revalidated and are skipped.
+        """
+        with self._lock:
+            self.misses += 1
+            if not etag and not last_modified:
+                return
+
+            file_name = sha256(url.encode()).hexdigest()
+            data = zlib.compress(body)
+            with open(self._path(file_name), "wb") as file:
+                file.write(data)
+
+            now = time()
+            with self.db.transaction():
+                previous = self.db.execute(SELECT_RESPONSE_SIZE, (url,)).fetchone()
+                self.db.execute(
+                    INSERT_RESPONSE,
+                    (
+                        url,
+                        file_name,
+                        len(data),
+                        encoding,
+                        etag,
+                        last_modified,
+                        now,
+                        now,
+                    ),
+                )
+                self._accessed.pop(url, None)
+                self.size += len(data) - (previous[0] if previous else 0)
+                if self.size > self.max_bytes:
+                    self._evict()
+
+    def revalidated(self, entry: CachedResponse) -> Optional[bytes]:
+        """
+        Record a 304 answer: the cached response is still valid and counts as a hit.
+
+        Returns
+        -------
+        Optional[bytes]
+            The cached body, or None if it is missing or corrupt. The entry is then removed,
+            and the page has to be requested again without validators.
+        """
+        with self._lock:
+            body = self._load_body(entry)
+            if body is None:
+                return None
+            self.hits += 1
+            now = time()
+            self._accessed.pop(entry.url, None)
+            self.db.execute(UPDATE_RESPONSE_REVALIDATED, (now, now, entry.url))
+            return body
+
+    @staticmethod
+    def content_hash(body: bytes, parser: str = "") -> str:
+        # The records of a page depend on the parser too: parser names it, and its version.
+        return sha256(parser.encode() + b"\0" + body).hexdigest()
+
+    def get_parsed(self, content_hash: str) -> Optional[list[ImageRecord]]:
+        with self._lock:
+            row = self.db.execute(SELECT_PARSED, (content_hash,)).fetchone()
+            if row is None:
+                self.parse_misses += 1
+                return None
+            self.parse_hits += 1
+            self._parsed_accessed[content_hash] = time()
+            self._flush_if_full()
+        return [ImageRecord.from_row(record) for record in json.loads(row[0])]
+
+    def put_parsed(self, content_hash: str, records: list[ImageRecord]) -> None:
+        with self._lock:
+            self.db.execute(INSERT_PARSED, (content_hash, json.dumps(records), time()))
+            self._parsed_accessed.pop(content_hash, None)
+            # Replaced rows are counted too, the count is corrected before trimming.
+            self.parsed_rows += 1
+            if self.parsed_rows > self.max_parsed_rows:
+                self._trim_parsed()
+
+    def flush(self) -> None:
+        """
+        Write the access times recorded since the last flush.
+        """
+        with self._lock:
+            self._flush_access_times()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_access_times()
+            self.db.close()
+
+    def _flush_if_full(self) -> None:
+        if len(self._accessed) + len(self._parsed_accessed) >= ACCESS_FLUSH_SIZE:
+            self._flush_access_times()
+
+    def _flush_access_times(self) -> None:
+        if not self._accessed and not self._parsed_accessed:
+            return
+        with self.db.transaction():
+            self.db.executemany(
+                UPDATE_RESPONSE_ACCESSED_AT,
+                [(accessed_at, url) for url, accessed_at in self._accessed.items()],
+            )
+            self.db.executemany(
+                UPDATE_PARSED_ACCESSED_AT,
+                [
+                    (accessed_at, content_hash)
+                    for content_hash, accessed_at in self._parsed_accessed.items()
+                ],
+            )
+        self._accessed.clear()
+        self._parsed_accessed.clear()
+
+    def _evict(self) -> None:
+        # Least recently used bodies go first, until the cache fits its cap again.
+        self._flush_access_times()
+        while self.size > self.max_bytes:
+            row = self.db.execute(SELECT_LEAST_RECENT_RESPONSE).fetchone()
+            if row is None:
+                self.size = 0
+                return
+            self._delete(*row)
+            self.evictions += 1
+
+    def _trim_parsed(self) -> None:
+        # Parsed results are small, but are capped in the same LRU order.
+        self.parsed_rows = self.db.execute(COUNT_PARSED).fetchone()[0]
+        if self.parsed_rows <= self.max_parsed_rows:
+            return
+        self._flush_access_times()
+        excess = self.parsed_rows - int(self.max_parsed_rows * PARSED_TRIM)
+        deleted = self.db.execute(DELETE_LEAST_RECENT_PARSED, (excess,)).rowcount
+        self.parsed_rows -= deleted
+
+    def _load_body(self, entry: CachedResponse) -> Optional[bytes]:
+        try:
+            with open(self._path(entry.file_name), "rb") as file:
+                return zlib.decompress(file.read())
+        except (OSError, zlib.error):
+            self._delete(entry.url, entry.file_name)
+            return None
+
+    def _delete(self, url: str, file_name: str) -> None:
+        size = self.db.execute(SELECT_RESPONSE_SIZE, (url,)).fetchone()
+        self.db.execute(DELETE_RESPONSE, (url,))
+        self._accessed.pop(url, None)
+        if size:
+            self.size -= size[0]
+        try:
+            os.remove(self._path(file_name))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.directory, "bodies", file_name)
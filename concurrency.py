@@ -0,0 +1,144 @@
+from statistics import quantiles
+from time import perf_counter
+from typing import Callable, NamedTuple, Optional
+
+
+class ConcurrencyChange(NamedTuple):
+    previous: int
+    limit: int
+    reason: str
+
+
+class AIMDController:
+    """
+    Adaptive concurrency limit, using additive increase / multiplicative decrease.
+
+    Request outcomes are collected in windows of ``window`` samples. At the end of a window
+    the limit grows by ``increase`` while the median latency stays within
+    ``latency_tolerance`` times the best median seen so far and the error rate stays below
+    ``error_threshold``; otherwise it is multiplied by ``decrease_factor``. A pushback
+    status (429, 503) cuts the limit right away, without waiting for the window to fill.
+
+    The limit is cut at most once per round trip: a pushback, or a window, made of requests
+    that started before the last decrease reports the load that decrease already answered,
+    so it is ignored, and a burst of 429s halves the limit once instead of once per response.
+
+    Parameters
+    ----------
+    max_limit : int
+        Hard cap of the limit, usually the scraper chunk size.
+    min_limit : int
+        The limit never goes below this value.
+    initial_limit : Optional[int]
+        Starting limit. Defaults to a quarter of ``max_limit``.
+    on_change : Optional[Callable[[ConcurrencyChange], None]]
+        Called with the previous limit, the new limit and the reason of every change.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: Optional[int] = None,
+        increase: int = 1,
+        decrease_factor: float = 0.5,
+        window: int = 20,
+        latency_tolerance: float = 1.5,
+        error_threshold: float = 0.1,
+        pushback_statuses: tuple[int, ...] = (429, 503),
+        on_change: Optional[Callable[[ConcurrencyChange], None]] = None,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.pushback_statuses = pushback_statuses
+        self.on_change = on_change
+
+        self.limit = self._clamp(initial_limit or max(min_limit, max_limit // 4))
+        self.baseline_latency: Optional[float] = None
+        self._latencies: list[float] = []
+        self._errors = 0
+        # perf_counter() time of the last decrease.
+        self._decreased_at: Optional[float] = None
+
+    def record(
+        self,
+        latency: float,
+        status: Optional[int] = None,
+        error: bool = False,
+        started_at: Optional[float] = None,
+    ) -> None:
+        """
+        Record the outcome of one request.
+
+        Parameters
+        ----------
+        latency : float
+            Duration of the request, in seconds.
+        status : Optional[int]
+            The HTTP status, if a response was received.
+        error : bool
+            Whether the request failed.
+        started_at : Optional[float]
+            When the request started, as a ``time.perf_counter()`` value. Defaults to
+            ``latency`` seconds ago.
+        """
+        if started_at is None:
+            started_at = perf_counter() - latency
+        if self._decreased_at is not None and started_at < self._decreased_at:
+            # Sent at the limit before the last decrease.
+            return
+
+        if status in self.pushback_statuses:
+            self._reset_window()
+            self._decrease(f"site pushback (HTTP {status})")
+            return
+
+        self._latencies.append(latency)
+        self._errors += error
+        if len(self._latencies) >= self.window:
+            self._adjust()
+
+    def _adjust(self) -> None:
+        error_rate = self._errors / len(self._latencies)
+        p50, p95 = self._percentiles(self._latencies)
+        self._reset_window()
+
+        if self.baseline_latency is None or p50 < self.baseline_latency:
+            self.baseline_latency = p50
+        stats = f"p50={p50 * 1000:.0f}ms p95={p95 * 1000:.0f}ms errors={error_rate:.0%}"
+
+        if error_rate > self.error_threshold:
+            self._decrease(f"error rate up ({stats})")
+        elif p50 > self.baseline_latency * self.latency_tolerance:
+            self._decrease(f"latency up ({stats})")
+        else:
+            self._set_limit(self.limit + self.increase, f"latency flat ({stats})")
+
+    def _decrease(self, reason: str) -> None:
+        self._decreased_at = perf_counter()
+        self._set_limit(int(self.limit * self.decrease_factor), reason)
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        previous = self.limit
+        self.limit = self._clamp(limit)
+        if self.limit != previous and self.on_change is not None:
+            self.on_change(ConcurrencyChange(previous, self.limit, reason))
+
+    def _clamp(self, limit: int) -> int:
+        return max(self.min_limit, min(self.max_limit, limit))
+
+    def _reset_window(self) -> None:
+        self._latencies = []
+        self._errors = 0
+
+    @staticmethod
+    def _percentiles(latencies: list[float]) -> tuple[float, float]:
+        if len(latencies) < 2:
+            return latencies[0], latencies[0]
+        cuts = quantiles(latencies, n=20, method="inclusive")
+        return cuts[9], cuts[18]
@@ -0,0 +1,636 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import uuid
+from itertools import groupby
+from math import ceil
+from operator import attrgetter
+from queue import Empty
+from time import perf_counter, time
+from typing import NamedTuple, Optional, TextIO
+
+import aiohttp
+
+from pipeline import WritePipeline
+from queries import (
+    CLAIM_WORK_QUEUE,
+    COMPLETE_WORK_QUEUE,
+    COUNT_OUTSTANDING_WORK_QUEUE,
+    CREATE_WORK_QUEUE_STATE_INDEX,
+    CREATE_WORK_QUEUE_TABLE,
+    FAIL_EXPIRED_WORK_QUEUE,
+    INSERT_WORK_QUEUE,
+    RELEASE_WORK_QUEUE,
+    RENEW_WORK_QUEUE,
+    SELECT_WORK_QUEUE_PROGRESS,
+    SKIP_WORK_QUEUE,
+)
+from scraper import FreeImagesAsyncScraper, ScrapeResult
+from storage import Database
+from writers import DatabaseWriter, RecentKeys
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+# Longest wait for the other workers to start, before a worker starts claiming on its own.
+START_TIMEOUT = 60.0
+# How often the coordinator checks that its workers are alive while waiting for results.
+RESULTS_POLL_INTERVAL = 1.0
+
+
+class WorkItem(NamedTuple):
+    # A page to crawl, and the number of its items the job asked for.
+    query: str
+    page: int
+    items: int
+
+
+class WorkerResult(NamedTuple):
+    worker_id: str
+    pages: int
+    items: int
+    failed_pages: int
+    elapsed: float
+
+
+def create_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class WorkQueue:
+    """
+    The pages of the queries to crawl, in a table shared by worker processes.
+
+    A worker claims a batch of pages under a lease, and renews it while it crawls them.
+    Claiming is a single UPDATE, so two workers never get the same page, and the pages
+    of a worker whose lease expired, for instance because it crashed, are claimed again
+    by another one. A page that failed, or whose lease expired, ``max_attempts`` times is
+    given up on. The lease times come from the clocks of the workers, which must agree
+    when they run on several hosts.
+
+    Pages go from "pending" to "leased", then to "done", "failed", or "skipped" when
+    they come after the end of the result set.
+
+    The methods may be called from worker threads, one call at a time, so that a write
+    waiting on the file lock doesn't block an event loop.
+
+    Parameters
+    ----------
+    db_name : str
+        The SQLite database holding the queue, usually the one receiving the results.
+    profile : str
+        The database profile, "shared" by default.
+    db : Optional[Database]
+        A database to use instead of opening ``db_name``.
+    lease_seconds : float
+        How long a claimed page stays leased without being renewed.
+    max_attempts : int
+        Claims of a page before it is marked as failed.
+    """
+
+    def __init__(
+        self,
+        db_name: str = "data.sqlite3",
+        profile: str = "shared",
+        db: Optional[Database] = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self.db = db or Database(db_name, profile=profile)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        with self.db.transaction():
+            self.db.execute(CREATE_WORK_QUEUE_TABLE)
+            self.db.execute(CREATE_WORK_QUEUE_STATE_INDEX)
+
+    def enqueue(
+        self,
+        query: str,
+        number_of_items: int,
+        items_per_page: int = FreeImagesAsyncScraper.ITEMS_PER_PAGE,
+    ) -> int:
+        """
+        Queue the pages holding the first ``number_of_items`` results of a query.
+
+        Pages already queued are left as they are, so a job can be submitted again
+        safely, or extended with a larger number of items.
+
+        Returns
+        -------
+        int
+            The number of pages added.
+        """
+        now = time()
+        pages = (
+            (
+                query,
+                page,
+                min(items_per_page, number_of_items - (page - 1) * items_per_page),
+                now,
+            )
+            for page in range(1, ceil(number_of_items / items_per_page) + 1)
+        )
+        with self._lock, self.db.transaction():
+            return self.db.executemany(INSERT_WORK_QUEUE, pages).rowcount
+
+    def claim(
+        self, worker_id: str, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> list[WorkItem]:
+        """
+        Lease up to ``batch_size`` pending pages, or pages whose lease expired.
+
+        Returns
+        -------
+        list[WorkItem]
+            The leased pages, by query and page. Empty when nothing can be claimed.
+        """
+        now = time()
+        with self._lock, self.db.transaction():
+            self.db.execute(FAIL_EXPIRED_WORK_QUEUE, (now, now, self.max_attempts))
+            rows = self.db.execute(
+                CLAIM_WORK_QUEUE,
+                (worker_id, now + self.lease_seconds, now, now, batch_size),
+            ).fetchall()
+        return sorted(WorkItem(*row) for row in rows)
+
+    def renew(self, worker_id: str) -> None:
+        # Extends every lease held by the worker.
+        now = time()
+        with self._lock:
+            self.db.execute(
+                RENEW_WORK_QUEUE, (now + self.lease_seconds, now, worker_id)
+            )
+
+    def complete(self, worker_id: str, items: list[WorkItem]) -> None:
+        # Pages whose lease was lost in the meantime are left to their new owner.
+        now = time()
+        with self._lock:
+            self.db.executemany(
+                COMPLETE_WORK_QUEUE,
+                [(now, item.query, item.page, worker_id) for item in items],
+            )
+
+    def release(self, worker_id: str, item: WorkItem, error: str) -> None:
+        # Puts a failed page back in the queue, unless it is out of attempts.
+        with self._lock:
+            self.db.execute(
+                RELEASE_WORK_QUEUE,
+                (self.max_attempts, error, time(), item.query, item.page, worker_id),
+            )
+
+    def end_results(self, query: str, last_page: int) -> None:
+        # The result set of the query ends at last_page: the pages after it are skipped.
+        with self._lock:
+            self.db.execute(SKIP_WORK_QUEUE, (time(), query, last_page))
+
+    def outstanding(self) -> int:
+        """
+        The number of pages pending or leased, including the leases of other workers.
+        """
+        with self._lock:
+            return self.db.execute(COUNT_OUTSTANDING_WORK_QUEUE).fetchone()[0]
+
+    def progress(self, query: Optional[str] = None) -> dict[str, int]:
+        """
+        The number of pages in each state, for one query or for the whole queue.
+        """
+        with self._lock:
+            return dict(
+                self.db.execute(SELECT_WORK_QUEUE_PROGRESS, (query, query)).fetchall()
+            )
+
+
+class CrawlWorker:
+    """
+    Crawls the pages of a work queue until none is left.
+
+    Each claimed batch is crawled by a FreeImagesAsyncScraper per query, with its own
+    sliding window and write pipeline, and written by a DatabaseWriter to the database
+    holding the queue. Every worker writes to the same canonical "images" table, so the
+    results of all the workers end up merged in one output, without duplicates. A page
+    is only marked done once its rows are committed: when a write fails, the pages of the
+    query are released instead, for another attempt. When the queue is empty but other
+    workers still hold leases, the worker waits, to take their pages over if they expire.
+    The queue is updated from worker threads, since a write may wait on the file lock.
+
+    Parameters
+    ----------
+    db_name : str
+        The SQLite database holding the queue and receiving the results.
+    worker_id : Optional[str]
+        Identifies the worker in the queue. Defaults to the host name and the process id.
+    batch_size : int
+        Pages claimed at a time.
+    chunk_size : int
+        Pages in flight, the chunk size of the scrapers.
+    lease_seconds : float
+        Lease of the claimed pages, renewed every third of it while they are crawled.
+    max_attempts : int
+        Claims of a page before it is marked as failed.
+    poll_interval : float
+        Wait between two claims while only other workers hold pages.
+    base_url : Optional[str]
+        Site to crawl instead of ``FreeImagesAsyncScraper.BASE_URL``, such as a mock server.
+    profile : str
+        The database profile, "shared" by default.
+    """
+
+    def __init__(
+        self,
+        db_name: str = "data.sqlite3",
+        worker_id: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        chunk_size: int = 25,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        poll_interval: float = 1.0,
+        base_url: Optional[str] = None,
+        profile: str = "shared",
+    ):
+        self.db_name = db_name
+        self.worker_id = worker_id or create_worker_id()
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.base_url = base_url
+        self.profile = profile
+
+    def create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self.chunk_size, keepalive_timeout=30, ttl_dns_cache=300
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    async def run(
+        self, session: Optional[aiohttp.ClientSession] = None
+    ) -> WorkerResult:
+        """
+        Claim and crawl batches of pages until the queue is empty.
+
+        Parameters
+        ----------
+        session : Optional[aiohttp.ClientSession]
+            A session to use instead of creating one. It is not closed.
+
+        Returns
+        -------
+        WorkerResult
+            The pages and items this worker stored, the pages it failed, and its run time.
+        """
+        queue = WorkQueue(
+            self.db_name,
+            profile=self.profile,
+            lease_seconds=self.lease_seconds,
+            max_attempts=self.max_attempts,
+        )
+        # The writers use their own connection, from the thread of their write pipeline,
+        # while the queue renews the leases from another worker thread.
+        database = Database(self.db_name, profile=self.profile)
+        with database.transaction():
+            DatabaseWriter.create_schema(database)
+            known_keys = RecentKeys()
+        writers: dict[str, DatabaseWriter] = {}
+
+        pages = items = failed_pages = 0
+        start = perf_counter()
+        owns_session = session is None
+        session = session or self.create_session()
+        try:
+            while True:
+                batch = await asyncio.to_thread(
+                    queue.claim, self.worker_id, self.batch_size
+                )
+                if not batch:
+                    if not await asyncio.to_thread(queue.outstanding):
+                        break
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                heartbeat = asyncio.create_task(self._renew_leases(queue))
+                try:
+                    for query, group in groupby(batch, key=attrgetter("query")):
+                        group = list(group)
+                        if query not in writers:
+                            writers[query] = DatabaseWriter(
+                                query,
+                                db=database,
+                                known_keys=known_keys,
+                                create_schema=False,
+                            )
+                        try:
+                            result, last_page = await self.crawl(
+                                group, writers[query], session
+                            )
+                        except RuntimeError as e:
+                            # The rows of these pages weren't committed.
+                            print(f"Failed to store pages of '{query}': {e}")
+                            await asyncio.to_thread(self._release, queue, group, str(e))
+                            failed_pages += len(group)
+                            continue
+                        pages += await asyncio.to_thread(
+                            self._settle, queue, group, result, last_page
+                        )
+                        items += result.items
+                        failed_pages += len(result.failed_pages)
+                finally:
+                    heartbeat.cancel()
+                    await asyncio.gather(heartbeat, return_exceptions=True)
+        finally:
+            if owns_session:
+                await session.close()
+
+        return WorkerResult(
+            self.worker_id, pages, items, failed_pages, perf_counter() - start
+        )
+
+    async def crawl(
+        self,
+        items: list[WorkItem],
+        writer: DatabaseWriter,
+        session: aiohttp.ClientSession,
+    ) -> tuple[ScrapeResult, Optional[int]]:
+        """
+        Crawl claimed pages of one query, in order.
+
+        Full pages are crawled together. A page the job only wants part of, the last
+        page of the job, is crawled on its own, asked for just those items, so it is
+        trimmed whatever happened to the other pages.
+
+        Returns
+        -------
+        tuple[ScrapeResult, Optional[int]]
+            The results of the scrapers, and the last page of the result set if it was seen.
+
+        Raises
+        ------
+        RuntimeError
+            If the rows could not be written.
+        """
+        items_per_page = FreeImagesAsyncScraper.ITEMS_PER_PAGE
+        full_pages = [item for item in items if item.items >= items_per_page]
+        segments = [full_pages] if full_pages else []
+        segments += [[item] for item in items if item.items < items_per_page]
+
+        stored = transfer_bytes = 0
+        failed_pages: dict[int, str] = {}
+        last_page = None
+        for segment in segments:
+            if last_page is not None and segment[0].page > last_page:
+                break
+            scraper = FreeImagesAsyncScraper(
+                sum(item.items for item in segment),
+                segment[0].query,
+                writer,
+                chunk_size=self.chunk_size,
+                session=session,
+                write_pipeline=WritePipeline(writer),
+            )
+            if self.base_url is not None:
+                scraper.BASE_URL = self.base_url
+            result = await scraper.scrap(item.page for item in segment)
+            stored += result.items
+            failed_pages.update(result.failed_pages)
+            transfer_bytes += result.transfer_bytes
+            if scraper.last_page is not None:
+                last_page = scraper.last_page
+        return ScrapeResult(stored, failed_pages, transfer_bytes), last_page
+
+    def _settle(
+        self,
+        queue: WorkQueue,
+        items: list[WorkItem],
+        result: ScrapeResult,
+        last_page: Optional[int],
+    ) -> int:
+        # Reports the outcome of every claimed page, and returns the number of pages done.
+        if last_page is not None:
+            queue.end_results(items[0].query, last_page)
+        done = [
+            item
+            for item in items
+            if item.page not in result.failed_pages
+            and (last_page is None or item.page <= last_page)
+        ]
+        queue.complete(self.worker_id, done)
+        for item in items:
+            if item.page in result.failed_pages:
+                queue.release(self.worker_id, item, result.failed_pages[item.page])
+        return len(done)
+
+    def _release(self, queue: WorkQueue, items: list[WorkItem], error: str) -> None:
+        for item in items:
+            queue.release(self.worker_id, item, error)
+
+    async def _renew_leases(self, queue: WorkQueue) -> None:
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            await asyncio.to_thread(queue.renew, self.worker_id)
+
+
+def run_worker(
+    settings: dict,
+    barrier: Optional[threading.Barrier] = None,
+    results: Optional[multiprocessing.Queue] = None,
+) -> WorkerResult:
+    """
+    Entry point of a worker process: run a CrawlWorker built from ``settings``.
+
+    The worker waits on ``barrier`` first, so the workers start claiming together instead
+    of the first one started leasing pages the others could have crawled. The result is
+    put on ``results`` when given.
+    """
+    worker = CrawlWorker(**settings)
+    if barrier is not None:
+        try:
+            barrier.wait(START_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+    result = asyncio.run(worker.run())
+    if results is not None:
+        results.put(result)
+    return result
+
+
+class Coordinator:
+    """
+    Shards the crawl of large jobs over worker processes.
+
+    Jobs are submitted as pages to a WorkQueue in the results database, and ``run``
+    starts ``workers`` CrawlWorker processes on this host to crawl them. More hosts can
+    join by running workers against the same database on shared storage, with the
+    "shared" profile, whose file locks work across processes and hosts.
+
+    Parameters
+    ----------
+    db_name : str
+        The SQLite database holding the queue and receiving the results.
+    workers : Optional[int]
+        Worker processes started by ``run``. Defaults to the number of cores.
+    batch_size, chunk_size, lease_seconds, max_attempts, poll_interval, base_url
+        The settings of every worker, see CrawlWorker.
+    """
+
+    def __init__(
+        self,
+        db_name: str = "data.sqlite3",
+        workers: Optional[int] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        chunk_size: int = 25,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        poll_interval: float = 1.0,
+        base_url: Optional[str] = None,
+    ):
+        self.db_name = db_name
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.base_url = base_url
+        self.queue = WorkQueue(
+            db_name, lease_seconds=lease_seconds, max_attempts=max_attempts
+        )
+
+    def submit(self, query: str, number_of_items: int) -> int:
+        """
+        Queue a job. Returns the number of pages added.
+        """
+        return self.queue.enqueue(query, number_of_items)
+
+    def progress(self, query: Optional[str] = None) -> dict[str, int]:
+        return self.queue.progress(query)
+
+    def worker_settings(self) -> dict:
+        return {
+            "db_name": self.db_name,
+            "batch_size": self.batch_size,
+            "chunk_size": self.chunk_size,
+            "lease_seconds": self.lease_seconds,
+            "max_attempts": self.max_attempts,
+            "poll_interval": self.poll_interval,
+            "base_url": self.base_url,
+        }
+
+    def run(self) -> list[WorkerResult]:
+        """
+        Start the worker processes and wait until the queue is empty.
+
+        The processes are spawned rather than forked, so they don't inherit the state of
+        a running event loop or of the writer threads.
+
+        Returns
+        -------
+        list[WorkerResult]
+            The result of every worker that exited normally.
+        """
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(self.workers)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=run_worker,
+                args=(self.worker_settings(), barrier, results),
+                name=f"crawl-worker-{index}",
+            )
+            for index in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+        # The results are read before joining: a process that put a result exits only
+        # once it is read from the pipe.
+        collected = []
+        while len(collected) < len(processes):
+            try:
+                collected.append(results.get(timeout=RESULTS_POLL_INTERVAL))
+            except Empty:
+                if not any(process.is_alive() for process in processes):
+                    # A worker that crashed never puts its result.
+                    break
+        for process in processes:
+            process.join()
+        return collected
+
+
+def print_report(
+    results: list[WorkerResult], progress: dict[str, int], file: TextIO = sys.stdout
+):
+    width = max([len("worker")] + [len(result.worker_id) for result in results])
+    print(
+        f"{'worker':<{width}}  {'pages':>7}  {'items':>9}  {'failed':>6}  {'time':>8}",
+        file=file,
+    )
+    for result in sorted(results):
+        print(
+            f"{result.worker_id:<{width}}  {result.pages:>7}  {result.items:>9}"
+            f"  {result.failed_pages:>6}  {result.elapsed:>7.2f}s",
+            file=file,
+        )
+    pages = sum(result.pages for result in results)
+    elapsed = max((result.elapsed for result in results), default=0.0)
+    print(
+        f"{len(results)} workers, {pages} pages in {elapsed:.2f}s "
+        f"({pages / elapsed if elapsed else 0:.1f} pages/s)",
+        file=file,
+    )
+    print(
+        "queue: "
+        + ", ".join(f"{state} {count}" for state, count in sorted(progress.items())),
+        file=file,
+    )
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Crawl large jobs with several worker processes sharing a work queue "
+        "in the SQLite database."
+    )
+    parser.add_argument("--db", default="data.sqlite3")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="Queue the pages of a query.")
+    submit.add_argument("query")
+    submit.add_argument("number_of_items", type=int)
+
+    work = commands.add_parser(
+        "work", help="Run worker processes until the queue is empty."
+    )
+    work.add_argument("--workers", type=int, default=None)
+    work.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    work.add_argument("--chunk-size", type=int, default=25)
+    work.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    work.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+
+    status = commands.add_parser("status", help="Count the queued pages by state.")
+    status.add_argument("query", nargs="?")
+    args = parser.parse_args(argv)
+
+    if args.command == "submit":
+        pages = WorkQueue(args.db).enqueue(args.query, args.number_of_items)
+        print(f"Queued {pages} pages for '{args.query}'.")
+    elif args.command == "work":
+        coordinator = Coordinator(
+            args.db,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            chunk_size=args.chunk_size,
+            lease_seconds=args.lease_seconds,
+            max_attempts=args.max_attempts,
+        )
+        print_report(coordinator.run(), coordinator.progress())
+    else:
+        progress = WorkQueue(args.db).progress(args.query)
+        for state, count in sorted(progress.items()):
+            print(f"{state:<8} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import asyncio
+import mimetypes
+import os
+from datetime import datetime
+from hashlib import sha256
+from typing import Iterable, NamedTuple, Optional
+from uuid import uuid4
+
+import aiohttp
+from yarl import URL
+
+from helpers import normalize_url
+from metrics import NULL_METRICS, IMetrics
+from queries import (
+    CREATE_DOWNLOADS_SHA256_INDEX,
+    CREATE_DOWNLOADS_TABLE,
+    INSERT_DOWNLOADS,
+    SELECT_DOWNLOADS,
+)
+from retry import FetchError, RetryPolicy
+from storage import Database
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".svg"}
+# Completed downloads are recorded in the manifest in batches of this many rows.
+MANIFEST_BATCH_SIZE = 100
+
+
+class DownloadStats(NamedTuple):
+    # Files written, URLs skipped because they were already complete, downloads whose
+    # content was already on disk, bytes written and the URLs that failed.
+    downloaded: int
+    skipped: int
+    duplicates: int
+    bytes_written: int
+    failed: dict[str, str]
+
+
+class ImageDownloader:
+    """
+    Background stage downloading image files to disk.
+
+    URLs are put on a bounded queue and downloaded by ``concurrency`` workers sharing their
+    own connection pool, separate from the scraper's. Bodies are streamed to a temporary
+    file in chunks while their SHA-256 is computed, then moved to a content-addressed path
+    (``ab/cd/abcd....jpg``), so identical images are stored once whatever their URL. Every
+    completed file is recorded in the ``downloads`` table, and URLs found there with their
+    file still on disk are skipped by later runs.
+
+    The file writes and the manifest inserts run on worker threads, so they never block the
+    event loop the scraper shares, and the manifest rows are inserted in batches, the last
+    one on `close`.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory of the downloaded files.
+    db : Optional[Database]
+        Database holding the manifest. Use a connection of its own, not one shared with a
+        write pipeline thread.
+    db_name : str
+        The SQLite database used when no ``db`` is given.
+    concurrency : int
+        Number of downloads in flight, and size of the connection pool.
+    chunk_size : int
+        Size of the chunks streamed to disk, in bytes.
+    max_pending_urls : int
+        Capacity of the queue, in URLs, before ``put`` is made to wait.
+    retry_policy : Optional[RetryPolicy]
+        How failed downloads are retried.
+    session : Optional[aiohttp.ClientSession]
+        A session to use instead of creating one. It is not closed.
+    metrics : Optional[IMetrics]
+        Receives the depth of the download queue.
+    """
+
+    def __init__(
+        self,
+        directory: str = "images",
+        db: Optional[Database] = None,
+        db_name: str = "data.sqlite3",
+        concurrency: int = 10,
+        chunk_size: int = 64 * 1024,
+        max_pending_urls: int = 1000,
+        retry_policy: Optional[RetryPolicy] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        metrics: Optional[IMetrics] = None,
+    ):
+        self.directory = directory
+        self.metrics = metrics or NULL_METRICS
+        self.db = db or Database(db_name, profile="ingest")
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.max_pending_urls = max_pending_urls
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        self.session = session
+        self._owns_session = False
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+
+        # Completed downloads, by normalized URL, and the URLs already queued in this run.
+        self._completed: dict[str, str] = {}
+        self._seen: set[str] = set()
+        # Digests stored, or being stored, by this run, with a future set to whether the
+        # file got in place: the first download of a content moves its file, the others
+        # wait for it and are duplicates.
+        self._stored_digests: dict[str, asyncio.Future] = {}
+        # Manifest rows not inserted yet.
+        self._manifest_rows: list[tuple] = []
+        self._manifest_lock: Optional[asyncio.Lock] = None
+
+        self.downloaded = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.bytes_written = 0
+        self.failed: dict[str, str] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def stats(self) -> DownloadStats:
+        return DownloadStats(
+            self.downloaded,
+            self.skipped,
+            self.duplicates,
+            self.bytes_written,
+            dict(self.failed),
+        )
+
+    def create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.concurrency
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    async def __aenter__(self) -> "ImageDownloader":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """
+        Load the manifest, then start the download workers.
+        """
+        if self.is_running:
+            return
+        with self.db.transaction():
+            self.db.execute(CREATE_DOWNLOADS_TABLE)
+            self.db.execute(CREATE_DOWNLOADS_SHA256_INDEX)
+        self._completed = dict(self.db.execute(SELECT_DOWNLOADS).fetchall())
+        self._seen = set()
+        self._stored_digests = {}
+        self._manifest_rows = []
+        self._manifest_lock = asyncio.Lock()
+        os.makedirs(os.path.join(self.directory, "tmp"), exist_ok=True)
+
+        if self.session is None:
+            self.session = self.create_session()
+            self._owns_session = True
+        self._queue = asyncio.Queue(maxsize=self.max_pending_urls)
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self.concurrency)
+        ]
+
+    async def put(self, urls: Iterable[str]) -> None:
+        """
+        Queue image URLs for download, waiting while the queue is full.
+
+        Raises
+        ------
+        RuntimeError
+            If the downloader isn't running.
+        """
+        if not self.is_running:
+            raise RuntimeError("The image downloader is not running.")
+        for url in urls:
+            await self._queue.put(url)
+        self.metrics.set_gauge("scraper_download_queue_urls", self._queue.qsize())
+
+    async def close(self) -> None:
+        """
+        Wait for every queued download, record the last ones in the manifest, then stop the
+        workers and close an owned session.
+        """
+        if not self.is_running:
+            return
+        try:
+            for _ in self._workers:
+                await self._queue.put(None)
+            await asyncio.gather(*self._workers)
+            await self._flush_manifest()
+        finally:
+            for worker in self._workers:
+                worker.cancel()
+            self._workers = []
+            self._queue = None
+            if self._owns_session:
+                await self.session.close()
+                self.session = None
+                self._owns_session = False
+
+    async def _work(self) -> None:
+        while True:
+            url = await self._queue.get()
+            if url is None:
+                return
+            try:
+                await self.download(url)
+            except Exception as e:
+                # A failed URL never stops its worker, so the queue always drains.
+                print(f"Failed to download {url}: {e}")
+                self.failed[url] = str(e)
+
+    async def download(self, url: str) -> Optional[str]:
+        """
+        Download one image, unless it is already complete.
+
+        Returns
+        -------
+        Optional[str]
+            The path of the file relative to ``directory``, or None if the URL was skipped.
+
+        Raises
+        ------
+        FetchError
+            If the download still fails after the last attempt.
+        """
+        url_key = normalize_url(url)
+        if url_key in self._seen:
+            self.skipped += 1
+            return None
+        self._seen.add(url_key)
+        path = self._completed.get(url_key)
+        if path is not None and await asyncio.to_thread(
+            os.path.exists, os.path.join(self.directory, path)
+        ):
+            self.skipped += 1
+            return None
+
+        policy = self.retry_policy
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=policy.timeout)
+        for attempt in range(1, policy.max_attempts + 1):
+            try:
+                async with self.session.get(url, timeout=timeout) as response:
+                    response.raise_for_status()
+                    digest, size, temp_path = await self._stream(response)
+                    extension = self._extension(url, response.content_type)
+                break
+            except aiohttp.ClientResponseError as cre:
+                error = FetchError(url, f"HTTP {cre.status}", cre.status)
+                if cre.status not in policy.retry_statuses:
+                    raise error from cre
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = FetchError(url, repr(e))
+            if attempt == policy.max_attempts:
+                raise error
+            await asyncio.sleep(policy.backoff(attempt))
+
+        path = os.path.join(digest[:2], digest[2:4], digest + extension)
+        stored = await self._store_once(
+            digest, temp_path, os.path.join(self.directory, path)
+        )
+        if stored:
+            self.downloaded += 1
+            self.bytes_written += size
+        else:
+            # Same content as a file already on disk, under another URL.
+            self.duplicates += 1
+
+        timestamp = datetime.timestamp(datetime.now())
+        self._manifest_rows.append((url_key, url, digest, path, size, timestamp))
+        self._completed[url_key] = path
+        if len(self._manifest_rows) >= MANIFEST_BATCH_SIZE:
+            await self._flush_manifest()
+        return path
+
+    async def _store_once(self, digest: str, temp_path: str, full_path: str) -> bool:
+        # A duplicate of a content being stored waits for the first download, so it is never
+        # recorded in the manifest before the file is in place. If the first one failed,
+        # the next one stores its own file.
+        while digest in self._stored_digests:
+            if await asyncio.shield(self._stored_digests[digest]):
+                await asyncio.to_thread(os.remove, temp_path)
+                return False
+        # Claimed before any await, so concurrent downloads of the same content never
+        # both move their file in place.
+        in_place = asyncio.get_running_loop().create_future()
+        self._stored_digests[digest] = in_place
+        try:
+            stored = await asyncio.to_thread(self._store, temp_path, full_path)
+        except BaseException:
+            del self._stored_digests[digest]
+            in_place.set_result(False)
+            raise
+        in_place.set_result(True)
+        return stored
+
+    @staticmethod
+    def _store(temp_path: str, full_path: str) -> bool:
+        # Moves a downloaded file to its final path, unless the content is already there.
+        if os.path.exists(full_path):
+            os.remove(temp_path)
+            return False
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(temp_path, full_path)
+        return True
+
+    async def _flush_manifest(self) -> None:
+        async with self._manifest_lock:
+            rows, self._manifest_rows = self._manifest_rows, []
+            if rows:
+                await asyncio.to_thread(self._insert_manifest_rows, rows)
+
+    def _insert_manifest_rows(self, rows: list[tuple]) -> None:
+        with self.db.transaction():
+            self.db.executemany(INSERT_DOWNLOADS, rows)
+
+    async def _stream(self, response: aiohttp.ClientResponse) -> tuple[str, int, str]:
+        # Writes the body chunk by chunk to a temporary file, hashing it on the way, so a
+        # file is never held in memory and never appears under its final path half written.
+        temp_path = os.path.join(self.directory, "tmp", f"{uuid4().hex}.part")
+        hasher = sha256()
+        size = 0
+        file = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            try:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    hasher.update(chunk)
+                    await asyncio.to_thread(file.write, chunk)
+                    size += len(chunk)
+            finally:
+                await asyncio.to_thread(file.close)
+        except BaseException:
+            await asyncio.to_thread(os.remove, temp_path)
+            raise
+        return hasher.hexdigest(), size, temp_path
+
+    @staticmethod
+    def _extension(url: str, content_type: str) -> str:
+        extension = os.path.splitext(URL(url).path)[1].lower()
+        if extension in IMAGE_EXTENSIONS:
+            return extension
+        extension = mimetypes.guess_extension(content_type or "")
+        return extension if extension in IMAGE_EXTENSIONS else ""
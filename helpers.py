@@ -1,4 +1,47 @@
+import importlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
 def chunks(lst, n):
     # A helper function for splitting the tasks in chunks.
     for i in range(0, len(lst), n):
         yield lst[i : i + n]
+
+
+def import_optional(module, feature):
+    # Optional dependencies are only imported by the features that need them.
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(
+            f"{feature} needs the optional '{module}' package: pip install {module}"
+        )
+
+
+def normalize_url(url):
+    # Canonical form of a URL, used as the deduplication key: lowercase scheme and host,
+    # no default port, no fragment, no trailing slash and sorted query parameters.
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rpartition(":")[2]) in (("http", "80"), ("https", "443")):
+        netloc = netloc.rpartition(":")[0]
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+# Query parameters of the image CDN that resize or re-encode an image.
+RESIZE_PARAMETERS = {"fmt", "w", "h"}
+
+
+def full_size_image_url(url):
+    # The search results show resized previews ("...jpg?fmt=webp&w=500"); without the resize
+    # parameters the CDN serves the image at the largest size it makes public.
+    parts = urlsplit(url)
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name not in RESIZE_PARAMETERS
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
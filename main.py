@@ -1,38 +1,177 @@
+import argparse
 import asyncio
+import os
 from time import time
+from typing import Mapping, Optional
 
-from scraper import FreeImagesAsyncScraper
-from writers import DatabaseWriter
+# Only the standard library is imported up front, so that "--help" and invalid arguments
+# return at once. The scraper, its dependencies and the sink are imported by run().
 
+DEFAULT_QUERY = "dog"
+DEFAULT_NUMBER_OF_ITEMS = 1000
+DEFAULT_SINK = "data.sqlite3"
+DEFAULT_CONCURRENCY = 25
 
-async def main():
-    start = time()
+# Every option can also be set with an environment variable, for scheduled jobs.
+ENVIRONMENT_VARIABLES = {
+    "query": "SCRAPER_QUERY",
+    "items": "SCRAPER_ITEMS",
+    "sink": "SCRAPER_SINK",
+    "concurrency": "SCRAPER_CONCURRENCY",
+}
+
+SQLITE_EXTENSIONS = (".sqlite3", ".sqlite", ".db")
+JSONL_EXTENSIONS = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+    return number
 
-    use_default_values = (
-        input("Do you want to use default values? (y/n): ").lower() == "y"
+
+def parse_args(
+    argv: Optional[list[str]] = None, environ: Optional[Mapping[str, str]] = None
+) -> argparse.Namespace:
+    """
+    Read the options from the command line, then from the environment, then the defaults.
+
+    Raises
+    ------
+    SystemExit
+        If an option, or the environment variable standing for it, is invalid.
+    """
+    environ = os.environ if environ is None else environ
+    parser = argparse.ArgumentParser(
+        description="Scrape the images of one query. Every option can also be set "
+        "with its environment variable.",
+    )
+    parser.add_argument(
+        "query",
+        nargs="?",
+        help=f"The search query (${ENVIRONMENT_VARIABLES['query']}, "
+        f"default: {DEFAULT_QUERY}).",
     )
+    parser.add_argument(
+        "-n",
+        "--items",
+        type=positive_int,
+        help=f"Number of images (${ENVIRONMENT_VARIABLES['items']}, "
+        f"default: {DEFAULT_NUMBER_OF_ITEMS}).",
+    )
+    parser.add_argument(
+        "--sink",
+        help="Output file: a SQLite database (.sqlite3, .sqlite, .db), JSON Lines "
+        "(.jsonl, .jsonl.gz, .jsonl.zst), Parquet (.parquet) or a list of URLs "
+        f"(.txt) (${ENVIRONMENT_VARIABLES['sink']}, default: {DEFAULT_SINK}).",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=positive_int,
+        help=f"Pages in flight (${ENVIRONMENT_VARIABLES['concurrency']}, "
+        f"default: {DEFAULT_CONCURRENCY}).",
+    )
+    args = parser.parse_args(argv)
 
-    if use_default_values:
-        number_of_items = 1000
-        query = "dog"
-    else:
-        number_of_items = int(input("Enter the number of images: "))
-        query = input("Enter the query: ")
+    defaults = {
+        "query": (str, DEFAULT_QUERY),
+        "items": (positive_int, DEFAULT_NUMBER_OF_ITEMS),
+        "sink": (str, DEFAULT_SINK),
+        "concurrency": (positive_int, DEFAULT_CONCURRENCY),
+    }
+    for option, (convert, default) in defaults.items():
+        if getattr(args, option) is not None:
+            continue
+        variable = ENVIRONMENT_VARIABLES[option]
+        value = environ.get(variable)
+        if not value:
+            setattr(args, option, default)
+            continue
+        try:
+            setattr(args, option, convert(value))
+        except (ValueError, argparse.ArgumentTypeError):
+            parser.error(f"invalid ${variable}: {value}")
+    if sink_format(args.sink) is None:
+        parser.error(f"unknown sink format: {args.sink}")
+    return args
 
-    writer = DatabaseWriter()
-    scraper = FreeImagesAsyncScraper(number_of_items, query, writer)
 
-    print(f"Running scraper on {number_of_items} items. Query: {query}")
+def sink_format(sink: str) -> Optional[str]:
+    # The writer to use for an output file, from its extension.
+    name = sink.lower()
+    if name.endswith(SQLITE_EXTENSIONS):
+        return "sqlite"
+    if name.endswith(JSONL_EXTENSIONS):
+        return "jsonl"
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith(".txt"):
+        return "text"
+    return None
 
-    items_scraped = await scraper.scrap()
-    time_elapsed = f"{time() - start:.2f}"
 
-    table_name = writer.table_name
+def create_writer(sink: str, query: str):
+    # The writers are imported here: pyarrow, for instance, is only needed for Parquet.
+    sink_type = sink_format(sink)
+    if sink_type == "sqlite":
+        from writers import DatabaseWriter
+
+        return DatabaseWriter(query, db_name=sink, profile="ingest")
+    if sink_type == "jsonl":
+        from writers import JsonLinesWriter
+
+        return JsonLinesWriter(sink)
+    if sink_type == "parquet":
+        from writers import ParquetWriter
 
+        return ParquetWriter(sink)
+    if sink_type == "text":
+        from writers import FileWriter
+
+        return FileWriter(sink)
+    raise ValueError(f"Unknown sink format: {sink}")
+
+
+async def run(args: argparse.Namespace):
+    from pipeline import WritePipeline
+    from scraper import FreeImagesAsyncScraper
+
+    start = time()
+
+    with create_writer(args.sink, args.query) as writer:
+        scraper = FreeImagesAsyncScraper(
+            args.items,
+            args.query,
+            writer,
+            chunk_size=args.concurrency,
+            write_pipeline=WritePipeline(writer),
+        )
+
+        print(f"Running scraper on {args.items} items. Query: {args.query}")
+
+        result = await scraper.scrap()
+    time_elapsed = f"{time() - start:.2f}"
+
+    if hasattr(writer, "run_id"):
+        destination = f"the '{writer.table_name}' table (run {writer.run_id})"
+    else:
+        destination = f"'{args.sink}'"
     print(
-        f"Successfully scraped and saved {items_scraped} images into the '{table_name}' table. Time elapsed: {time_elapsed}s"
+        f"Successfully scraped and saved {result.items} images into {destination}. Time elapsed: {time_elapsed}s"
     )
 
+    if result.failed_pages:
+        print(f"{len(result.failed_pages)} pages failed:")
+        for page, reason in sorted(result.failed_pages.items()):
+            print(f"  page {page}: {reason}")
+    return result
+
+
+async def main(argv: Optional[list[str]] = None):
+    await run(parse_args(argv))
+
 
 if __name__ == "__main__":
     asyncio.run(main())
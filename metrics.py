@@ -0,0 +1,251 @@
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Callable, ContextManager, Optional
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+# Metrics recorded by the scraper, the write pipeline and the downloader.
+#   scraper_fetch_requests_total{status}  counter    HTTP attempts, by status ("error" without response)
+#   scraper_fetch_bytes_total             counter    Response bytes read, compressed unless the session decompresses
+#   scraper_fetch_seconds                 histogram  Duration of an HTTP attempt
+#   scraper_first_result_seconds          histogram  Time to the first record of a page, when streaming
+#   scraper_parse_seconds                 histogram  Parse time of a page, when not streaming
+#   scraper_pages_total{outcome}          counter    Pages scraped ("ok") or given up on ("failed")
+#   scraper_in_flight_pages               gauge      Pages being fetched or parsed
+#   scraper_reorder_buffer_pages          gauge      Finished pages waiting for an earlier one
+#   scraper_write_batch_rows              histogram  Rows per write batch
+#   scraper_write_batch_seconds           histogram  Duration of a write batch
+#   scraper_write_queue_pages             gauge      Pages waiting in the write queue
+#   scraper_download_queue_urls           gauge      URLs waiting in the download queue
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (1, 10, 60, 100, 500, 1000, 5000, 10000, 50000)
+HISTOGRAM_BUCKETS = {"scraper_write_batch_rows": ROW_BUCKETS}
+
+
+class IMetrics(ABC):
+    """
+    Receives the measurements of a run. Implement it to forward them to another system.
+
+    ``enabled`` is False for the null implementation, so callers can skip the work of
+    preparing a measurement that would be thrown away.
+    """
+
+    enabled = True
+
+    @abstractmethod
+    def increment(
+        self, name: str, value: float = 1, labels: Optional[dict] = None
+    ) -> None:
+        """Add to a counter."""
+
+    @abstractmethod
+    def observe(self, name: str, value: float, labels: Optional[dict] = None) -> None:
+        """Record a value in a histogram."""
+
+    @abstractmethod
+    def set_gauge(self, name: str, value: float, labels: Optional[dict] = None) -> None:
+        """Set the current value of a gauge."""
+
+    def span(self, name: str, **attributes) -> ContextManager:
+        """Context manager wrapping a unit of work, such as fetching a page."""
+        return nullcontext()
+
+
+class NullMetrics(IMetrics):
+    # Default implementation: every call is a no-op, so instrumentation costs a method call.
+    enabled = False
+    _span = nullcontext()
+
+    def increment(self, name, value=1, labels=None):
+        pass
+
+    def observe(self, name, value, labels=None):
+        pass
+
+    def set_gauge(self, name, value, labels=None):
+        pass
+
+    def span(self, name, **attributes):
+        return self._span
+
+
+NULL_METRICS = NullMetrics()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry(IMetrics):
+    """
+    In-memory counters, gauges and histograms, exported in the Prometheus text format.
+
+    Metrics can be recorded from any thread. Spans are forwarded to ``span_hook`` when one
+    is given, for instance an OpenTelemetry tracer:
+    ``MetricsRegistry(span_hook=lambda name, attributes: tracer.start_as_current_span(name, attributes=attributes))``.
+
+    Parameters
+    ----------
+    span_hook : Optional[Callable[[str, dict], ContextManager]]
+        Called with the name and the attributes of every span; returns its context manager.
+    buckets : Optional[dict[str, tuple[float, ...]]]
+        Histogram bucket bounds by metric name, added to ``HISTOGRAM_BUCKETS``. Other
+        histograms use ``LATENCY_BUCKETS``.
+    """
+
+    def __init__(
+        self,
+        span_hook: Optional[Callable[[str, dict], ContextManager]] = None,
+        buckets: Optional[dict[str, tuple[float, ...]]] = None,
+    ):
+        self.span_hook = span_hook
+        self.buckets = {**HISTOGRAM_BUCKETS, **(buckets or {})}
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.gauges: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, _Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, labels=None):
+        key = self._key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = self._key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(
+                    self.buckets.get(name, LATENCY_BUCKETS)
+                )
+            histogram.observe(value)
+
+    def set_gauge(self, name, value, labels=None):
+        key = self._key(labels)
+        with self._lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def span(self, name, **attributes):
+        if self.span_hook is None:
+            return NullMetrics._span
+        return self.span_hook(name, attributes)
+
+    def value(self, name: str, labels: Optional[dict] = None) -> Optional[float]:
+        # The current value of a counter or a gauge, or the count of a histogram.
+        key = self._key(labels)
+        with self._lock:
+            for metrics in (self.counters, self.gauges):
+                if key in metrics.get(name, {}):
+                    return metrics[name][key]
+            histogram = self.histograms.get(name, {}).get(key)
+            return histogram.count if histogram else None
+
+    def render_prometheus(self) -> str:
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted(metrics):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(metrics[name].items()):
+                        lines.append(f"{name}{_labels(key)} {_number(value)}")
+            for name in sorted(self.histograms):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        bucket_key = key + (("le", _number(bound)),)
+                        lines.append(f"{name}_bucket{_labels(bucket_key)} {cumulative}")
+                    inf_key = key + (("le", "+Inf"),)
+                    lines.append(f"{name}_bucket{_labels(inf_key)} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(key)} {_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _key(labels: Optional[dict]) -> tuple:
+        return tuple(sorted(labels.items())) if labels else ()
+
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in key)
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class PrometheusExporter:
+    """
+    Serves a registry on ``/metrics`` for a Prometheus server to scrape.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(
+        self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional["web.AppRunner"] = None
+
+    async def handle(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(
+            body=self.registry.render_prometheus().encode(),
+            headers={"Content-Type": self.CONTENT_TYPE},
+        )
+
+    async def __aenter__(self) -> "PrometheusExporter":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        # The aiohttp server is only imported when metrics are exported.
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,394 @@
+import re
+from abc import ABC, abstractmethod
+from html import unescape
+from html.parser import HTMLParser
+from typing import Optional
+
+from records import ImageRecord, clean_text, intern_tags, parse_dimension
+
+# The search results are the grid articles: "article.grid-article". Each one holds the link to
+# the image page ("a.grid-link[href]"), the thumbnail, a caption and links to its tags.
+ARTICLE_TAG, ARTICLE_CLASS = "article", "grid-article"
+LINK_TAG, LINK_CLASS = "a", "grid-link"
+TAG_LINK_PREFIX = "/search/"
+# The footer, or the end of the main content, comes after the results grid.
+GRID_END_PATTERN = re.compile(r"<footer[\s>]|</main\s*>", re.IGNORECASE)
+# Part of the key of the parsed records in the response cache: bump it when the records
+# the parsers produce change, so the records parsed before are not reused.
+PARSE_FORMAT_VERSION = 1
+
+
+class IParser(ABC):
+    @abstractmethod
+    def parse(self, html_content: str, base_url: str = "") -> list[ImageRecord]:
+        """Return one record per search result, with its page link prefixed by base_url."""
+
+    def incremental(
+        self, base_url: str = "", expected_items: Optional[int] = None
+    ) -> "GridFeed":
+        """Return a parse of one page that is fed the text as it arrives."""
+        return GridFeed(self, base_url, expected_items)
+
+
+class GridFeed:
+    # Incremental parse of one page. The incremental backends parse the text as it is fed,
+    # and set grid_closed once the results grid is over: the grid ended after some results,
+    # or expected_items results were found. The rest of the page can then be skipped.
+    # This default buffers the text and parses it on close.
+    def __init__(
+        self, parser: IParser, base_url: str = "", expected_items: Optional[int] = None
+    ):
+        self.parser = parser
+        self.base_url = base_url
+        self.expected_items = expected_items
+        self.records: list[ImageRecord] = []
+        self.grid_closed = False
+        self._chunks = []
+
+    def feed(self, text: str) -> None:
+        self._chunks.append(text)
+
+    def close(self) -> list[ImageRecord]:
+        self.records = self.parser.parse("".join(self._chunks), self.base_url)
+        self._chunks = []
+        return self.records
+
+    def _check_grid(self, grid_ended: bool) -> None:
+        if self.records and (
+            grid_ended
+            or (
+                self.expected_items is not None
+                and len(self.records) >= self.expected_items
+            )
+        ):
+            self.grid_closed = True
+
+
+class _RecordBuilder:
+    # Collects the fields of one grid article while it is being parsed.
+    __slots__ = (
+        "url",
+        "img_src",
+        "srcset",
+        "width",
+        "height",
+        "alt",
+        "caption",
+        "tags",
+    )
+
+    def __init__(self):
+        self.url = self.img_src = self.srcset = self.alt = self.caption = None
+        self.width = self.height = None
+        self.tags = []
+
+    def link(self, attrs, base_url):
+        # Returns whether the link is a tag link, whose text is then the tag name.
+        href = _get_attr(attrs, "href")
+        if not href:
+            return False
+        if _has_class(attrs, LINK_CLASS):
+            if self.url is None:
+                self.url = base_url + href
+            return False
+        return href.startswith(TAG_LINK_PREFIX)
+
+    def image(self, attrs):
+        if self.img_src is None:
+            self.img_src = _get_attr(attrs, "src")
+            self.width = parse_dimension(_get_attr(attrs, "width"))
+            self.height = parse_dimension(_get_attr(attrs, "height"))
+            self.alt = clean_text(_get_attr(attrs, "alt"))
+
+    def source(self, attrs):
+        srcset = _get_attr(attrs, "srcset")
+        if self.srcset is None and srcset and srcset.split():
+            self.srcset = srcset.split(",")[0].split()[0]
+
+    def build(self):
+        if self.url is None:
+            return None
+        return ImageRecord(
+            self.url,
+            self.img_src or self.srcset,
+            self.width,
+            self.height,
+            self.caption or self.alt,
+            intern_tags(dict.fromkeys(tag for tag in self.tags if tag)),
+        )
+
+
+class BeautifulSoupParser(IParser):
+    # Reference backend: builds the whole document tree and runs CSS selectors.
+    # It is the slowest backend, but it is kept as the baseline for the other ones.
+    SELECTOR = f"{ARTICLE_TAG}.{ARTICLE_CLASS}"
+
+    def parse(self, html_content: str, base_url: str = "") -> list[ImageRecord]:
+        # bs4 is only imported when this backend is used, it is slow to import.
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html_content, "html.parser")
+        records = []
+        for article in soup.select(self.SELECTOR):
+            builder = _RecordBuilder()
+            for element in article.find_all(["a", "img", "source", "figcaption"]):
+                attrs = list(element.attrs.items())
+                attrs = [
+                    (key, " ".join(value) if isinstance(value, list) else value)
+                    for key, value in attrs
+                ]
+                if element.name == "a":
+                    if builder.link(attrs, base_url):
+                        builder.tags.append(clean_text(element.get_text()))
+                elif element.name == "img":
+                    builder.image(attrs)
+                elif element.name == "source":
+                    builder.source(attrs)
+                elif builder.caption is None:
+                    builder.caption = clean_text(element.get_text())
+            record = builder.build()
+            if record is not None:
+                records.append(record)
+        return records
+
+
+class _GridRecordTokenizer(HTMLParser):
+    def __init__(self, base_url=""):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.records = []
+        # One entry per open article: its record builder, or None for other articles.
+        self._articles = []
+        self._builders = []
+        # Text being collected, for a caption or a tag link, and where it goes.
+        self._text = None
+        self._text_tag = None
+        # Whether the footer, or the end of the main content, was reached.
+        self.grid_ended = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "footer":
+            self.grid_ended = True
+        if tag == ARTICLE_TAG:
+            builder = _RecordBuilder() if _has_class(attrs, ARTICLE_CLASS) else None
+            self._articles.append(builder)
+            if builder is not None:
+                self._builders.append(builder)
+            return
+        if not self._builders:
+            return
+        builder = self._builders[-1]
+        if tag == LINK_TAG:
+            if builder.link(attrs, self.base_url):
+                self._start_text(tag)
+        elif tag == "img":
+            builder.image(attrs)
+        elif tag == "source":
+            builder.source(attrs)
+        elif tag == "figcaption" and builder.caption is None:
+            self._start_text(tag)
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "main":
+            self.grid_ended = True
+        if tag == self._text_tag and self._builders:
+            text = clean_text("".join(self._text))
+            builder = self._builders[-1]
+            if tag == LINK_TAG:
+                builder.tags.append(text)
+            elif builder.caption is None:
+                builder.caption = text
+            self._text = self._text_tag = None
+        elif tag == ARTICLE_TAG and self._articles:
+            builder = self._articles.pop()
+            if builder is not None:
+                self._builders.pop()
+                record = builder.build()
+                if record is not None:
+                    self.records.append(record)
+
+    def _start_text(self, tag):
+        self._text = []
+        self._text_tag = tag
+
+
+class _GridRecordTokenizerFeed(GridFeed):
+    def __init__(self, parser, base_url="", expected_items=None):
+        super().__init__(parser, base_url, expected_items)
+        self._tokenizer = _GridRecordTokenizer(base_url)
+        self.records = self._tokenizer.records
+
+    def feed(self, text):
+        self._tokenizer.feed(text)
+        self._check_grid(self._tokenizer.grid_ended)
+
+    def close(self):
+        self._tokenizer.close()
+        return self.records
+
+
+class StreamingParser(IParser):
+    # Incremental backend built on the standard library tokenizer. It never builds
+    # a tree and only reacts to the tags of the grid articles.
+    def parse(self, html_content: str, base_url: str = "") -> list[ImageRecord]:
+        tokenizer = _GridRecordTokenizer(base_url)
+        tokenizer.feed(html_content)
+        tokenizer.close()
+        return tokenizer.records
+
+    def incremental(self, base_url="", expected_items=None):
+        return _GridRecordTokenizerFeed(self, base_url, expected_items)
+
+
+class TokenizerParser(IParser):
+    # Default backend: a regex tag scanner that skips everything except the tags of the
+    # grid articles. Comments, scripts and styles are matched as a whole so their content
+    # can't be mistaken for markup.
+    TOKEN_PATTERN = re.compile(
+        r"<!--.*?-->"
+        r"|<(script|style)\b.*?</\1\s*>"
+        rf"|<(/?)({ARTICLE_TAG}|{LINK_TAG}|img|source|figcaption)(?=[\s/>])((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+        re.IGNORECASE | re.DOTALL,
+    )
+    ATTR_PATTERN = re.compile(
+        r"""([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?"""
+    )
+    MARKUP_PATTERN = re.compile(r"<[^>]*>")
+    CLOSING_PATTERNS = {
+        tag: re.compile(rf"</{tag}\s*>", re.IGNORECASE)
+        for tag in (LINK_TAG, "figcaption")
+    }
+    ARTICLE_END_PATTERN = re.compile(rf"</{ARTICLE_TAG}\s*>", re.IGNORECASE)
+
+    def parse(self, html_content: str, base_url: str = "") -> list[ImageRecord]:
+        feed = _TokenizerFeed(self, base_url)
+        feed.scan(html_content)
+        return feed.records
+
+    def incremental(self, base_url="", expected_items=None):
+        return _TokenizerFeed(self, base_url, expected_items)
+
+    def _attrs(self, raw_attrs):
+        return [
+            (name.lower(), unescape(double or single or bare or ""))
+            for name, double, single, bare in self.ATTR_PATTERN.findall(raw_attrs)
+        ]
+
+    def _text(self, html_content, start, tag):
+        # The text up to the closing tag, without the markup nested in it.
+        closing = self.CLOSING_PATTERNS[tag].search(html_content, start)
+        text = html_content[start : closing.start() if closing else len(html_content)]
+        return clean_text(unescape(self.MARKUP_PATTERN.sub("", text)))
+
+
+class _TokenizerFeed(GridFeed):
+    # The text is scanned up to the end of the last complete article; the rest waits for
+    # the next chunk, so the lookahead for the text of a tag never runs out of input.
+    def __init__(self, parser, base_url="", expected_items=None):
+        super().__init__(parser, base_url, expected_items)
+        self._buffer = ""
+        self._articles = []
+        self._builders = []
+
+    def feed(self, text):
+        if self.grid_closed:
+            return
+        # A closing tag split over two chunks is found once the second one arrives.
+        start = max(0, len(self._buffer) - len(ARTICLE_TAG) - 16)
+        self._buffer += text
+        end = None
+        for end in self.parser.ARTICLE_END_PATTERN.finditer(self._buffer, start):
+            pass
+        if end is not None:
+            self.scan(self._buffer[: end.end()])
+            self._buffer = self._buffer[end.end() :]
+        self._check_grid(
+            not self._articles and GRID_END_PATTERN.search(self._buffer) is not None
+        )
+
+    def close(self):
+        if not self.grid_closed:
+            self.scan(self._buffer)
+        self._buffer = ""
+        return self.records
+
+    def scan(self, html_content):
+        # Tokenizes text holding whole articles, carrying the open articles over.
+        parser = self.parser
+        base_url = self.base_url
+        records = self.records
+        articles = self._articles
+        builders = self._builders
+        for match in parser.TOKEN_PATTERN.finditer(html_content):
+            closing, tag, raw_attrs = match.group(2, 3, 4)
+            if tag is None:
+                continue
+            tag = tag.lower()
+            if tag == ARTICLE_TAG:
+                if not closing:
+                    builder = (
+                        _RecordBuilder()
+                        if _has_class(parser._attrs(raw_attrs), ARTICLE_CLASS)
+                        else None
+                    )
+                    articles.append(builder)
+                    if builder is not None:
+                        builders.append(builder)
+                elif articles:
+                    builder = articles.pop()
+                    if builder is not None:
+                        builders.pop()
+                        record = builder.build()
+                        if record is not None:
+                            records.append(record)
+            elif builders and not closing:
+                builder = builders[-1]
+                if tag == LINK_TAG:
+                    if builder.link(parser._attrs(raw_attrs), base_url):
+                        builder.tags.append(
+                            parser._text(html_content, match.end(), tag)
+                        )
+                elif tag == "img":
+                    builder.image(parser._attrs(raw_attrs))
+                elif tag == "source":
+                    builder.source(parser._attrs(raw_attrs))
+                elif builder.caption is None:
+                    builder.caption = parser._text(html_content, match.end(), tag)
+        return records
+
+
+def _get_attr(attrs, name):
+    for key, value in attrs:
+        if key == name:
+            return value
+    return None
+
+
+def _has_class(attrs, class_name):
+    classes = _get_attr(attrs, "class")
+    return bool(classes) and class_name in classes.split()
+
+
+def parse_html_bytes(
+    parser: IParser, body: bytes, encoding: str, base_url: str = ""
+) -> list[ImageRecord]:
+    # Entry point for the parse workers: the page travels as bytes and is decoded in the worker.
+    return parser.parse(body.decode(encoding, errors="replace"), base_url)
+
+
+PARSERS = {
+    "tokenizer": TokenizerParser,
+    "streaming": StreamingParser,
+    "beautifulsoup": BeautifulSoupParser,
+}
+
+
+def get_parser(name: str = "tokenizer") -> IParser:
+    try:
+        return PARSERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown parser backend: {name}")
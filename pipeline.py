@@ -0,0 +1,179 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import TYPE_CHECKING, Optional
+
+from metrics import NULL_METRICS, IMetrics
+
+if TYPE_CHECKING:
+    from writers import IWriter
+
+
+class WritePipeline:
+    """
+    Background write stage between the scraper and an IWriter sink.
+
+    Pages are put on a bounded asyncio queue and grouped into large batches, by row count
+    or time window, before being handed to a dedicated writer thread. The writer sees one
+    ``write_pages`` call per batch, so a DatabaseWriter commits one transaction per batch
+    instead of one per page, and the event loop never blocks on the sink. When the queue is full,
+    ``put`` waits, which slows the scraper down to the speed of the sink.
+
+    One pipeline can also be shared by several writers, for instance one per query in a
+    batch run: each page is then put with its own writer, and every writer receives its
+    pages of the batch, in order, on the same thread.
+
+    Parameters
+    ----------
+    writer : Optional["IWriter"]
+        The default sink receiving the batches. It is used unchanged.
+    batch_rows : int
+        Flush a batch once it holds at least this many rows.
+    flush_interval : float
+        Flush a batch once its first row has waited this many seconds.
+    max_pending_pages : int
+        Capacity of the queue, in pages, before the scraper is made to wait.
+    metrics : Optional[IMetrics]
+        Receives the size and duration of every batch, and the depth of the queue.
+    """
+
+    def __init__(
+        self,
+        writer: Optional["IWriter"] = None,
+        batch_rows: int = 5000,
+        flush_interval: float = 0.5,
+        max_pending_pages: int = 64,
+        metrics: Optional[IMetrics] = None,
+    ):
+        self.writer = writer
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.max_pending_pages = max_pending_pages
+        self.metrics = metrics or NULL_METRICS
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self._thread: Optional[ThreadPoolExecutor] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._consumer is not None
+
+    async def __aenter__(self) -> "WritePipeline":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """
+        Start the queue consumer and the writer thread.
+        """
+        if self.is_running:
+            return
+        self._error = None
+        self._queue = asyncio.Queue(maxsize=self.max_pending_pages)
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        self._consumer = asyncio.create_task(self._consume())
+
+    async def put(
+        self, rows: list, page: Optional[int] = None, writer: Optional["IWriter"] = None
+    ) -> None:
+        """
+        Queue the rows of a page, waiting while the queue is full.
+
+        A page number, when given, is passed to the writer with the rows so it can
+        checkpoint the page in the same transaction. The rows go to ``writer``, or to the
+        pipeline's default writer.
+
+        Raises
+        ------
+        RuntimeError
+            If the pipeline isn't running or the writer thread failed.
+        """
+        self._raise_on_error()
+        if not self.is_running:
+            raise RuntimeError("The write pipeline is not running.")
+        writer = writer or self.writer
+        if writer is None:
+            raise RuntimeError("The write pipeline has no writer for these rows.")
+        if rows or page is not None:
+            await self._queue.put((writer, page, rows))
+
+    async def close(self) -> None:
+        """
+        Flush every queued row, then stop the consumer and the writer thread.
+
+        Raises
+        ------
+        RuntimeError
+            If the writer thread failed while writing a batch.
+        """
+        if not self.is_running:
+            return
+        await self._queue.put(None)
+        try:
+            await self._consumer
+        finally:
+            self._thread.shutdown(wait=True)
+            self._consumer = None
+            self._thread = None
+            self._queue = None
+        self._raise_on_error()
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            batch_rows = len(item[2])
+            deadline = loop.time() + self.flush_interval
+            while batch_rows < self.batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                batch_rows += len(item[2])
+
+            if self._error is not None:
+                # Keep draining so producers never wait on a dead consumer; the error
+                # is raised to them on the next put or on close.
+                continue
+            self.metrics.set_gauge("scraper_write_queue_pages", self._queue.qsize())
+            started_at = perf_counter()
+            try:
+                await loop.run_in_executor(self._thread, self._write_batch, batch)
+            except Exception as e:
+                self._error = e
+            self.metrics.observe("scraper_write_batch_rows", batch_rows)
+            self.metrics.observe(
+                "scraper_write_batch_seconds", perf_counter() - started_at
+            )
+
+    @staticmethod
+    def _write_batch(batch: list[tuple]) -> None:
+        # One write_pages call per writer, in the order the writers first appear.
+        pages_by_writer: dict["IWriter", list[tuple]] = {}
+        for writer, page, rows in batch:
+            pages_by_writer.setdefault(writer, []).append((page, rows))
+        for writer, pages in pages_by_writer.items():
+            writer.write_pages(pages)
+
+    def _raise_on_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(
+                f"The write pipeline failed: {self._error}"
+            ) from self._error
@@ -1,4 +1,246 @@
-CREATE_IMAGES_TABLE = (
-    lambda table_name: f"CREATE TABLE IF NOT EXISTS {table_name}(url VARCHAR);"
+# Canonical images table: one row per image, keyed by the normalized URL.
+CREATE_IMAGES_TABLE = """CREATE TABLE IF NOT EXISTS images(
+    id INTEGER PRIMARY KEY,
+    url VARCHAR NOT NULL,
+    url_key VARCHAR NOT NULL,
+    preview_url VARCHAR,
+    width INTEGER,
+    height INTEGER,
+    title VARCHAR
+);"""
+# Metadata columns added after the first release, with their types, for older databases.
+IMAGES_METADATA_COLUMNS = {
+    "preview_url": "VARCHAR",
+    "width": "INTEGER",
+    "height": "INTEGER",
+    "title": "VARCHAR",
+}
+SELECT_IMAGES_COLUMNS = "PRAGMA table_info(images);"
+CREATE_IMAGES_URL_KEY_INDEX = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS images_url_key ON images(url_key);"
 )
-INSERT_IMAGES = lambda table_name: f"INSERT INTO {table_name}(url) VALUES (?);"
+# An image stored before, for instance as a bare URL, gets the metadata it was missing.
+# Stored metadata is kept, and rows with nothing to fill in are not rewritten.
+INSERT_IMAGES = """INSERT INTO images(url, url_key, preview_url, width, height, title)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(url_key) DO UPDATE SET
+    preview_url = COALESCE(images.preview_url, excluded.preview_url),
+    width = COALESCE(images.width, excluded.width),
+    height = COALESCE(images.height, excluded.height),
+    title = COALESCE(images.title, excluded.title)
+WHERE (images.preview_url IS NULL AND excluded.preview_url IS NOT NULL)
+    OR (images.width IS NULL AND excluded.width IS NOT NULL)
+    OR (images.height IS NULL AND excluded.height IS NOT NULL)
+    OR (images.title IS NULL AND excluded.title IS NOT NULL);"""
+
+# Tags, stored once by name, and the images they are attached to.
+CREATE_TAGS_TABLE = """CREATE TABLE IF NOT EXISTS tags(
+    id INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL UNIQUE
+);"""
+INSERT_TAGS = "INSERT OR IGNORE INTO tags(name) VALUES (?);"
+CREATE_IMAGE_TAGS_TABLE = """CREATE TABLE IF NOT EXISTS image_tags(
+    image_id INTEGER NOT NULL REFERENCES images(id),
+    tag_id INTEGER NOT NULL REFERENCES tags(id),
+    PRIMARY KEY(image_id, tag_id)
+) WITHOUT ROWID;"""
+CREATE_IMAGE_TAGS_TAG_INDEX = (
+    "CREATE INDEX IF NOT EXISTS image_tags_tag_id ON image_tags(tag_id);"
+)
+INSERT_IMAGE_TAGS = """INSERT OR IGNORE INTO image_tags(image_id, tag_id)
+SELECT images.id, tags.id FROM images, tags WHERE images.url_key = ? AND tags.name = ?;"""
+
+# Every scraper run, and the images it found.
+CREATE_RUNS_TABLE = """CREATE TABLE IF NOT EXISTS runs(
+    id INTEGER PRIMARY KEY,
+    query VARCHAR,
+    started_at REAL NOT NULL
+);"""
+INSERT_RUN = "INSERT INTO runs(query, started_at) VALUES (?, ?);"
+CREATE_RUNS_QUERY_INDEX = (
+    "CREATE INDEX IF NOT EXISTS runs_query ON runs(query, started_at);"
+)
+CREATE_RUNS_STARTED_AT_INDEX = (
+    "CREATE INDEX IF NOT EXISTS runs_started_at ON runs(started_at);"
+)
+CREATE_RUN_IMAGES_TABLE = """CREATE TABLE IF NOT EXISTS run_images(
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    image_id INTEGER NOT NULL REFERENCES images(id),
+    PRIMARY KEY(run_id, image_id)
+) WITHOUT ROWID;"""
+INSERT_RUN_IMAGES = """INSERT OR IGNORE INTO run_images(run_id, image_id)
+SELECT ?, id FROM images WHERE url_key = ?;"""
+
+# Reads of the stored results. The runs matching the filters ({where}) are listed first, then
+# the images of each run are paged through its primary key, after the last image id read.
+SELECT_RUNS_PAGE = """SELECT id, query, started_at FROM runs
+WHERE {where} AND id > ?
+ORDER BY id
+LIMIT ?;"""
+SELECT_RUN_IMAGES_PAGE = """SELECT images.id, images.url, images.preview_url, images.width, images.height, images.title
+FROM run_images JOIN images ON images.id = run_images.image_id
+WHERE run_images.run_id = ? AND run_images.image_id > ?
+ORDER BY run_images.image_id
+LIMIT ?;"""
+# Indexes used by the reads, by name, created by a reader on databases that lack them.
+READ_INDEXES = {
+    "runs_query": CREATE_RUNS_QUERY_INDEX,
+    "runs_started_at": CREATE_RUNS_STARTED_AT_INDEX,
+}
+SELECT_INDEX_NAMES = "SELECT name FROM sqlite_master WHERE type = 'index';"
+COUNT_RUN_IMAGES = "SELECT COUNT(*) FROM run_images;"
+COUNT_FILTERED_RUN_IMAGES = """SELECT COUNT(*) FROM run_images
+WHERE run_id IN (SELECT id FROM runs WHERE {where});"""
+COUNT_IMAGES = "SELECT COUNT(*) FROM images;"
+COUNT_FILTERED_IMAGES = """SELECT COUNT(DISTINCT image_id) FROM run_images
+WHERE run_id IN (SELECT id FROM runs WHERE {where});"""
+SELECT_RUNS_SUMMARY = """SELECT runs.id, runs.query, runs.started_at,
+    (SELECT COUNT(*) FROM run_images WHERE run_images.run_id = runs.id)
+FROM runs
+WHERE {where}
+ORDER BY runs.id;"""
+
+# Pages completed per query, so an interrupted crawl can be resumed.
+CREATE_CHECKPOINTS_TABLE = """CREATE TABLE IF NOT EXISTS checkpoints(
+    query VARCHAR NOT NULL,
+    page INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY(query, page)
+) WITHOUT ROWID;"""
+INSERT_CHECKPOINTS = """INSERT OR REPLACE INTO checkpoints(query, page, items, completed_at)
+VALUES (?, ?, ?, ?);"""
+SELECT_CHECKPOINTS = "SELECT page, items FROM checkpoints WHERE query = ?;"
+
+# Image files downloaded to disk, stored by the hash of their content.
+CREATE_DOWNLOADS_TABLE = """CREATE TABLE IF NOT EXISTS downloads(
+    url_key VARCHAR PRIMARY KEY,
+    url VARCHAR NOT NULL,
+    sha256 VARCHAR NOT NULL,
+    path VARCHAR NOT NULL,
+    size INTEGER NOT NULL,
+    completed_at REAL NOT NULL
+) WITHOUT ROWID;"""
+CREATE_DOWNLOADS_SHA256_INDEX = (
+    "CREATE INDEX IF NOT EXISTS downloads_sha256 ON downloads(sha256);"
+)
+INSERT_DOWNLOADS = """INSERT OR REPLACE INTO downloads(url_key, url, sha256, path, size, completed_at)
+VALUES (?, ?, ?, ?, ?, ?);"""
+SELECT_DOWNLOADS = "SELECT url_key, path FROM downloads;"
+
+CREATE_SCHEMA = [
+    CREATE_IMAGES_TABLE,
+    CREATE_IMAGES_URL_KEY_INDEX,
+    CREATE_TAGS_TABLE,
+    CREATE_IMAGE_TAGS_TABLE,
+    CREATE_IMAGE_TAGS_TAG_INDEX,
+    CREATE_RUNS_TABLE,
+    CREATE_RUNS_QUERY_INDEX,
+    CREATE_RUNS_STARTED_AT_INDEX,
+    CREATE_RUN_IMAGES_TABLE,
+    CREATE_CHECKPOINTS_TABLE,
+]
+
+# Pages of the queries crawled by worker processes. A worker claims pages under a lease, which
+# it renews while it crawls them; the pages of a worker whose lease expired are claimed again.
+CREATE_WORK_QUEUE_TABLE = """CREATE TABLE IF NOT EXISTS work_queue(
+    query VARCHAR NOT NULL,
+    page INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    state VARCHAR NOT NULL DEFAULT 'pending',
+    worker VARCHAR,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error VARCHAR,
+    updated_at REAL NOT NULL,
+    UNIQUE(query, page)
+);"""
+CREATE_WORK_QUEUE_STATE_INDEX = """CREATE INDEX IF NOT EXISTS work_queue_state
+ON work_queue(state, lease_expires_at);"""
+INSERT_WORK_QUEUE = """INSERT OR IGNORE INTO work_queue(query, page, items, updated_at)
+VALUES (?, ?, ?, ?);"""
+# Expired leases of pages out of attempts are given up on, instead of being claimed again.
+FAIL_EXPIRED_WORK_QUEUE = """UPDATE work_queue
+SET state = 'failed', worker = NULL, lease_expires_at = NULL, error = 'lease expired', updated_at = ?
+WHERE state = 'leased' AND lease_expires_at <= ? AND attempts >= ?;"""
+# One statement, so two workers can never claim the same page.
+CLAIM_WORK_QUEUE = """UPDATE work_queue
+SET state = 'leased', worker = ?, lease_expires_at = ?, attempts = attempts + 1, updated_at = ?
+WHERE rowid IN (
+    SELECT rowid FROM work_queue
+    WHERE state = 'pending' OR (state = 'leased' AND lease_expires_at <= ?)
+    ORDER BY rowid
+    LIMIT ?
+)
+RETURNING query, page, items;"""
+RENEW_WORK_QUEUE = """UPDATE work_queue SET lease_expires_at = ?, updated_at = ?
+WHERE worker = ? AND state = 'leased';"""
+COMPLETE_WORK_QUEUE = """UPDATE work_queue
+SET state = 'done', worker = NULL, lease_expires_at = NULL, error = NULL, updated_at = ?
+WHERE query = ? AND page = ? AND worker = ? AND state = 'leased';"""
+RELEASE_WORK_QUEUE = """UPDATE work_queue
+SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+    worker = NULL, lease_expires_at = NULL, error = ?, updated_at = ?
+WHERE query = ? AND page = ? AND worker = ? AND state = 'leased';"""
+SKIP_WORK_QUEUE = """UPDATE work_queue
+SET state = 'skipped', worker = NULL, lease_expires_at = NULL, updated_at = ?
+WHERE query = ? AND page > ? AND state IN ('pending', 'leased');"""
+COUNT_OUTSTANDING_WORK_QUEUE = (
+    "SELECT COUNT(*) FROM work_queue WHERE state IN ('pending', 'leased');"
+)
+SELECT_WORK_QUEUE_PROGRESS = """SELECT state, COUNT(*) FROM work_queue
+WHERE ? IS NULL OR query = ?
+GROUP BY state;"""
+
+# Response cache index: the search pages stored on disk, with their validators, and the
+# records parsed from them, keyed by the hash of the page content. Both are evicted in
+# least recently used order.
+CREATE_RESPONSES_TABLE = """CREATE TABLE IF NOT EXISTS responses(
+    url VARCHAR PRIMARY KEY,
+    file_name VARCHAR NOT NULL,
+    size INTEGER NOT NULL,
+    encoding VARCHAR NOT NULL,
+    etag VARCHAR,
+    last_modified VARCHAR,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);"""
+CREATE_RESPONSES_ACCESS_INDEX = (
+    "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses(accessed_at);"
+)
+CREATE_PARSED_TABLE = """CREATE TABLE IF NOT EXISTS parsed(
+    content_hash VARCHAR PRIMARY KEY,
+    records TEXT NOT NULL,
+    accessed_at REAL NOT NULL
+);"""
+CREATE_PARSED_ACCESS_INDEX = (
+    "CREATE INDEX IF NOT EXISTS parsed_accessed_at ON parsed(accessed_at);"
+)
+CREATE_CACHE_SCHEMA = [
+    CREATE_RESPONSES_TABLE,
+    CREATE_RESPONSES_ACCESS_INDEX,
+    CREATE_PARSED_TABLE,
+    CREATE_PARSED_ACCESS_INDEX,
+]
+SELECT_RESPONSES_SIZE = "SELECT COALESCE(SUM(size), 0) FROM responses;"
+SELECT_RESPONSE = """SELECT file_name, encoding, etag, last_modified, stored_at
+FROM responses WHERE url = ?;"""
+SELECT_RESPONSE_SIZE = "SELECT size FROM responses WHERE url = ?;"
+INSERT_RESPONSE = """INSERT OR REPLACE INTO responses(url, file_name, size, encoding, etag, last_modified, stored_at, accessed_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?);"""
+UPDATE_RESPONSE_ACCESSED_AT = "UPDATE responses SET accessed_at = ? WHERE url = ?;"
+UPDATE_RESPONSE_REVALIDATED = (
+    "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?;"
+)
+SELECT_LEAST_RECENT_RESPONSE = (
+    "SELECT url, file_name FROM responses ORDER BY accessed_at LIMIT 1;"
+)
+DELETE_RESPONSE = "DELETE FROM responses WHERE url = ?;"
+COUNT_PARSED = "SELECT COUNT(*) FROM parsed;"
+SELECT_PARSED = "SELECT records FROM parsed WHERE content_hash = ?;"
+INSERT_PARSED = """INSERT OR REPLACE INTO parsed(content_hash, records, accessed_at)
+VALUES (?, ?, ?);"""
+UPDATE_PARSED_ACCESSED_AT = "UPDATE parsed SET accessed_at = ? WHERE content_hash = ?;"
+# The oldest parsed pages, through the accessed_at index.
+DELETE_LEAST_RECENT_PARSED = """DELETE FROM parsed WHERE content_hash IN
+(SELECT content_hash FROM parsed ORDER BY accessed_at LIMIT ?);"""
@@ -0,0 +1,307 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Iterator, NamedTuple, Optional
+
+from queries import (
+    COUNT_FILTERED_IMAGES,
+    COUNT_FILTERED_RUN_IMAGES,
+    COUNT_IMAGES,
+    COUNT_RUN_IMAGES,
+    READ_INDEXES,
+    SELECT_INDEX_NAMES,
+    SELECT_RUN_IMAGES_PAGE,
+    SELECT_RUNS_PAGE,
+    SELECT_RUNS_SUMMARY,
+)
+from storage import Database
+
+DEFAULT_BATCH_SIZE = 1000
+# Runs listed at a time while looking for the next rows.
+RUNS_BATCH_SIZE = 100
+
+
+class StoredImage(NamedTuple):
+    # An image found by a run, with the query and the start time of the run.
+    run_id: int
+    image_id: int
+    url: str
+    preview_url: Optional[str]
+    width: Optional[int]
+    height: Optional[int]
+    title: Optional[str]
+    query: Optional[str]
+    started_at: float
+
+
+class ResultCursor(NamedTuple):
+    # Position after the last row read: rows are ordered by run, then by image.
+    run_id: int
+    image_id: int
+
+
+class ResultPage(NamedTuple):
+    rows: list[StoredImage]
+    # Where the next page starts, or None after the last page.
+    next_cursor: Optional[ResultCursor]
+
+
+class RunSummary(NamedTuple):
+    run_id: int
+    query: Optional[str]
+    started_at: float
+    images: int
+
+
+class ResultSummary(NamedTuple):
+    # Distinct images and image rows of the matching runs, and the runs themselves.
+    images: int
+    rows: int
+    runs: list[RunSummary]
+
+
+class ResultFilter(NamedTuple):
+    query: Optional[str] = None
+    run_id: Optional[int] = None
+    since: Optional[float] = None
+    until: Optional[float] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return self == ResultFilter()
+
+    def where(self) -> tuple[str, list]:
+        # The condition on the runs table, and its parameters.
+        clauses, params = [], []
+        for clause, value in (
+            ("query = ?", self.query),
+            ("id = ?", self.run_id),
+            ("started_at >= ?", self.since),
+            ("started_at < ?", self.until),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return " AND ".join(clauses) or "1", params
+
+
+class DatabaseReader:
+    """
+    Read API over the results stored by DatabaseWriter.
+
+    Rows are the images found by each run, ordered by run and then by image, and can be
+    filtered by query, by run, and by the start time of the run (``since`` included,
+    ``until`` excluded, as timestamps). They are read with keyset pagination: every
+    batch is one short query resuming after the last row read, through the primary key
+    of ``run_images`` and the indexes of ``runs``, so memory stays bounded by the batch
+    size and no cursor is kept open between batches, even while a writer is adding rows.
+
+    The reader has its own read-only connection, so it can be used alongside a write
+    pipeline, never takes the write lock, and works on read-only files. The read indexes
+    missing from databases created before they existed are added once, when the file
+    can be written.
+    The ``a``-prefixed variants run the same reads on a worker thread, so they can be
+    awaited from the scraper's event loop.
+
+    Parameters
+    ----------
+    db_name : str
+        The SQLite database written by DatabaseWriter. It must exist.
+    profile : str
+        The database profile.
+    db : Optional[Database]
+        A database to use instead of opening ``db_name``.
+
+    Raises
+    ------
+    RuntimeError
+        If the database can't be opened, for instance because it doesn't exist.
+    """
+
+    def __init__(self, db_name="data.sqlite3", profile="default", db=None):
+        self.db = db or Database(db_name, profile=profile, read_only=True)
+        self._create_missing_indexes(profile)
+        # Calls from worker threads share the connection one at a time.
+        self._lock = threading.Lock()
+
+    def iter_images(
+        self,
+        query: Optional[str] = None,
+        run_id: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        after: Optional[ResultCursor] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> Iterator[StoredImage]:
+        """
+        Stream the matching rows, reading ``batch_size`` rows at a time.
+
+        Parameters
+        ----------
+        after : Optional[ResultCursor]
+            Start after this row, for instance the cursor of a previous page.
+        """
+        filters = ResultFilter(query, run_id, since, until)
+        cursor = after
+        while True:
+            rows = self._read_rows(filters, cursor, batch_size)
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            cursor = ResultCursor(rows[-1].run_id, rows[-1].image_id)
+
+    def page(
+        self,
+        query: Optional[str] = None,
+        run_id: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        after: Optional[ResultCursor] = None,
+        limit: int = 100,
+    ) -> ResultPage:
+        """
+        Read one page of at most ``limit`` matching rows, starting after ``after``.
+
+        Returns
+        -------
+        ResultPage
+            The rows, and the cursor to pass as ``after`` for the next page, or None
+            when there are no more rows.
+        """
+        filters = ResultFilter(query, run_id, since, until)
+        # One extra row tells whether there is a next page.
+        rows = self._read_rows(filters, after, limit + 1)
+        if len(rows) <= limit:
+            return ResultPage(rows, None)
+        rows = rows[:limit]
+        return ResultPage(rows, ResultCursor(rows[-1].run_id, rows[-1].image_id))
+
+    def count(
+        self,
+        query: Optional[str] = None,
+        run_id: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> int:
+        """
+        The number of matching rows, counted by SQLite without reading them.
+        """
+        filters = ResultFilter(query, run_id, since, until)
+        with self._lock:
+            if filters.is_empty:
+                return self.db.execute(COUNT_RUN_IMAGES).fetchone()[0]
+            where, params = filters.where()
+            sql = COUNT_FILTERED_RUN_IMAGES.format(where=where)
+            return self.db.execute(sql, params).fetchone()[0]
+
+    def summary(
+        self,
+        query: Optional[str] = None,
+        run_id: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> ResultSummary:
+        """
+        Count the distinct images and the rows of the matching runs, and list the runs
+        with their number of images.
+        """
+        filters = ResultFilter(query, run_id, since, until)
+        where, params = filters.where()
+        with self._lock:
+            runs = [
+                RunSummary(*row)
+                for row in self.db.execute(
+                    SELECT_RUNS_SUMMARY.format(where=where), params
+                ).fetchall()
+            ]
+            if filters.is_empty:
+                images = self.db.execute(COUNT_IMAGES).fetchone()[0]
+            else:
+                sql = COUNT_FILTERED_IMAGES.format(where=where)
+                images = self.db.execute(sql, params).fetchone()[0]
+        return ResultSummary(images, sum(run.images for run in runs), runs)
+
+    async def aiter_images(
+        self,
+        query: Optional[str] = None,
+        run_id: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        after: Optional[ResultCursor] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> AsyncIterator[StoredImage]:
+        """
+        Like `iter_images`, with every batch read on a worker thread.
+        """
+        filters = ResultFilter(query, run_id, since, until)
+        cursor = after
+        while True:
+            rows = await asyncio.to_thread(self._read_rows, filters, cursor, batch_size)
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            cursor = ResultCursor(rows[-1].run_id, rows[-1].image_id)
+
+    async def apage(self, *args, **kwargs) -> ResultPage:
+        return await asyncio.to_thread(self.page, *args, **kwargs)
+
+    async def acount(self, *args, **kwargs) -> int:
+        return await asyncio.to_thread(self.count, *args, **kwargs)
+
+    async def asummary(self, *args, **kwargs) -> ResultSummary:
+        return await asyncio.to_thread(self.summary, *args, **kwargs)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _create_missing_indexes(self, profile: str) -> None:
+        names = {name for (name,) in self.db.execute(SELECT_INDEX_NAMES)}
+        missing = [sql for name, sql in READ_INDEXES.items() if name not in names]
+        if not missing:
+            return
+        # The read-only connection can't create them, a short-lived one does.
+        writable = self.db
+        if self.db.read_only:
+            writable = Database(self.db.db_name, profile=profile)
+        try:
+            with writable.transaction():
+                for sql in missing:
+                    writable.execute(sql)
+        except RuntimeError as e:
+            # A read-only file is read without them, more slowly.
+            print(f"Failed to create the read indexes: {e}")
+        finally:
+            if writable is not self.db:
+                writable.close()
+
+    def _read_rows(
+        self, filters: ResultFilter, after: Optional[ResultCursor], limit: int
+    ) -> list[StoredImage]:
+        # Up to limit rows after the cursor: the rest of the cursor's run, then the
+        # images of the following matching runs, in order.
+        where, params = filters.where()
+        runs_sql = SELECT_RUNS_PAGE.format(where=where)
+        resume_run_id, resume_image_id = after if after else (None, 0)
+        last_run_id = after.run_id - 1 if after else 0
+        rows: list[StoredImage] = []
+        with self._lock:
+            while len(rows) < limit:
+                runs = self.db.execute(
+                    runs_sql, (*params, last_run_id, RUNS_BATCH_SIZE)
+                ).fetchall()
+                if not runs:
+                    break
+                for run_id, query, started_at in runs:
+                    last_run_id = run_id
+                    first_image_id = resume_image_id if run_id == resume_run_id else 0
+                    images = self.db.execute(
+                        SELECT_RUN_IMAGES_PAGE,
+                        (run_id, first_image_id, limit - len(rows)),
+                    ).fetchall()
+                    rows.extend(
+                        StoredImage(run_id, *image, query, started_at)
+                        for image in images
+                    )
+                    if len(rows) >= limit:
+                        break
+        return rows
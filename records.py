@@ -0,0 +1,53 @@
+import sys
+from typing import NamedTuple, Optional, Union
+
+
+class ImageRecord(NamedTuple):
+    # One search result. A NamedTuple has no per-instance dict, so a record costs little more
+    # than its strings, and tag names are interned so repeated tags share one string.
+    url: str
+    preview_url: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    title: Optional[str] = None
+    tags: tuple[str, ...] = ()
+
+    @classmethod
+    def from_row(cls, row) -> "ImageRecord":
+        # Rebuilds a record from its JSON form, a plain list.
+        url, preview_url, width, height, title, tags = row
+        return cls(url, preview_url, width, height, title, intern_tags(tags))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ImageRecord":
+        return cls(
+            data["url"],
+            data.get("preview_url"),
+            data.get("width"),
+            data.get("height"),
+            data.get("title"),
+            intern_tags(data.get("tags") or ()),
+        )
+
+
+def intern_tags(tags) -> tuple[str, ...]:
+    return tuple(sys.intern(tag) for tag in tags)
+
+
+def as_record(row: Union[ImageRecord, str]) -> ImageRecord:
+    # Writers also accept bare URLs, as stored before records existed.
+    return ImageRecord(row) if isinstance(row, str) else row
+
+
+def parse_dimension(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def clean_text(text: Optional[str]) -> Optional[str]:
+    # Collapses the whitespace of a text node; empty texts become None.
+    if text is None:
+        return None
+    return " ".join(text.split()) or None
@@ -0,0 +1,165 @@
+import asyncio
+import random
+from email.utils import parsedate_to_datetime
+from time import monotonic, time
+from typing import Optional
+
+
+class FetchError(Exception):
+    """Raised when a page could not be fetched after every retry."""
+
+    def __init__(self, url: str, reason: str, status: Optional[int] = None):
+        super().__init__(f"{url}: {reason}")
+        self.url = url
+        self.reason = reason
+        self.status = status
+
+
+class RetryPolicy:
+    """
+    How failed requests are retried.
+
+    Parameters
+    ----------
+    max_attempts : int
+        Total number of attempts per request, the first one included: at least 1.
+    base_delay : float
+        Backoff before the first retry, doubled on every following retry.
+    max_delay : float
+        Upper bound of a single backoff, including a Retry-After value.
+    timeout : float
+        Total timeout of a single attempt, in seconds.
+    retry_statuses : tuple[int, ...]
+        HTTP statuses worth retrying. Any other error status fails immediately.
+    pushback_statuses : tuple[int, ...]
+        Statuses that mean the site is pushing back, which open the circuit breaker.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        timeout: float = 15.0,
+        retry_statuses: tuple[int, ...] = (429, 500, 502, 503, 504),
+        pushback_statuses: tuple[int, ...] = (429, 503),
+    ):
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1: {max_attempts}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.retry_statuses = retry_statuses
+        self.pushback_statuses = pushback_statuses
+
+    def backoff(self, attempt: int) -> float:
+        # Exponential backoff with full jitter, so retrying requests don't come back in bursts.
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def retry_after(self, headers) -> Optional[float]:
+        # The Retry-After header holds either a number of seconds or an HTTP date.
+        value = headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.max_delay)
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: ``rate`` requests per second on average, with bursts of up
+    to ``burst`` requests.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated_at = monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateLimiter:
+    """One token bucket per host."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, TokenBucket] = {}
+
+    async def acquire(self, host: str) -> None:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        await bucket.acquire()
+
+
+class CircuitBreaker:
+    """
+    Slows the whole crawl down when the site pushes back.
+
+    After ``failure_threshold`` consecutive failures, or as soon as the site answers with a
+    pushback status, the circuit opens: every request waits until the cooldown, or the
+    Retry-After delay, has passed. Each further failure while open doubles the cooldown,
+    up to ``max_cooldown``. A success closes the circuit again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        cooldown: float = 5.0,
+        max_cooldown: float = 60.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self._current_cooldown = cooldown
+        self._open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return monotonic() < self._open_until
+
+    async def wait(self) -> None:
+        delay = self._open_until - monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._current_cooldown = self.cooldown
+
+    def record_failure(
+        self, pushback: bool = False, delay: Optional[float] = None
+    ) -> None:
+        self.failures += 1
+        if pushback or self.failures >= self.failure_threshold:
+            self._open(delay)
+
+    def _open(self, delay: Optional[float]) -> None:
+        if delay is None:
+            delay = self._current_cooldown
+            self._current_cooldown = min(self.max_cooldown, self._current_cooldown * 2)
+        self._open_until = max(self._open_until, monotonic() + delay)
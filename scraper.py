@@ -1,12 +1,52 @@
 import asyncio
+import codecs
+import multiprocessing
+import os
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from math import ceil
-from typing import Any, Coroutine, Union
+from time import perf_counter
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    TYPE_CHECKING,
+    Optional,
+)
 
 import aiohttp
-from bs4 import BeautifulSoup
+from yarl import URL
 
-from helpers import chunks
-from writers import IWriter
+from concurrency import AIMDController
+from helpers import full_size_image_url
+from metrics import NULL_METRICS, IMetrics
+from parsers import PARSE_FORMAT_VERSION, IParser, TokenizerParser, parse_html_bytes
+from pipeline import WritePipeline
+from records import ImageRecord
+from retry import CircuitBreaker, FetchError, RateLimiter, RetryPolicy
+from transfer import ACCEPT_ENCODING, ContentDecoder
+
+if TYPE_CHECKING:
+    # Only used in annotations: the cache, the downloader and the writers, with their
+    # storage dependencies, are imported by the callers that use them.
+    from cache import CachedResponse, ResponseCache
+    from downloader import ImageDownloader
+    from writers import IWriter
+
+
+class ScrapeResult(NamedTuple):
+    # Total of items stored for the query, the pages that failed, mapped to the reason, and
+    # the bytes of the responses read, as transferred when the scraper decodes them itself.
+    items: int
+    failed_pages: dict[int, str]
+    transfer_bytes: int = 0
 
 
 class FreeImagesAsyncScraper:
@@ -17,8 +57,28 @@ class FreeImagesAsyncScraper:
         self,
         number_of_items: int,
         query: str,
-        writer: IWriter,
+        writer: "IWriter",
         chunk_size: int = 25,
+        session: Optional[aiohttp.ClientSession] = None,
+        limit_per_host: Optional[int] = None,
+        keepalive_timeout: float = 30,
+        ttl_dns_cache: int = 300,
+        parser: Optional[IParser] = None,
+        parse_executor: Optional[str] = None,
+        parse_workers: Optional[int] = None,
+        write_pipeline: Optional[WritePipeline] = None,
+        resume: bool = False,
+        completed_pages: Optional[dict[int, int]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        concurrency_controller: Optional[AIMDController] = None,
+        request_semaphore: Optional[asyncio.Semaphore] = None,
+        response_cache: Optional["ResponseCache"] = None,
+        downloader: Optional["ImageDownloader"] = None,
+        metrics: Optional[IMetrics] = None,
+        streaming: bool = False,
+        stream_chunk_size: int = 16384,
     ):
         # Number of items to scrap.
         self.number_of_items = number_of_items
@@ -36,10 +96,436 @@ class FreeImagesAsyncScraper:
         # The items per page in the free images website is 60. So we always divide by that number.
         self.max_pages = ceil(number_of_items / self.ITEMS_PER_PAGE)
 
-    @staticmethod
-    async def fetch(url: str) -> Coroutine[Any, Any, str]:
+        # Connector settings used when the scraper creates its own session.
+        # The per-host limit defaults to the chunk size, so every concurrent page gets a pooled connection.
+        self.limit_per_host = limit_per_host or chunk_size
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+
+        # Parser backend used to extract the image links from a search page.
+        self.parser = parser or TokenizerParser()
+
+        # Failed requests are retried with backoff, optionally rate limited per host, and the circuit
+        # breaker slows every request down when the site pushes back. Pages that still fail are
+        # reported in the run result.
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.failed_pages: dict[int, str] = {}
+
+        # The last page of the result set, once a short page has been seen.
+        self._last_page: Optional[int] = None
+
+        # Optional adaptive concurrency. The controller sets how many pages are in flight from the observed
+        # latency, error rate and pushback; the chunk size stays the hard cap.
+        self.concurrency_controller = concurrency_controller
+
+        # Optional limit of requests in flight shared with other scrapers, e.g. the global limit of a batch run.
+        # Waiters are woken in order, so the scrapers sharing it get their turns fairly.
+        self.request_semaphore = request_semaphore
+
+        # Optional on-disk response cache. Cached pages are revalidated with conditional requests, and a page
+        # whose content didn't change reuses its parsed records instead of being parsed again.
+        self.response_cache = response_cache
+
+        # Optional download stage. The image of every written record, without the preview resizing, is also queued for download, and a downloader that is
+        # already running is left running when the scraper closes, like the write pipeline.
+        self.downloader = downloader
+        self._owns_downloader = False
+
+        # Counters, histograms and spans of the run. The default implementation does nothing.
+        self.metrics = metrics or NULL_METRICS
+
+        # Optional streaming mode: the body is read in chunks, decoded as it arrives and fed to an
+        # incremental parse, and the rest of the page is skipped once the results grid has closed.
+        # Pages are parsed on the event loop and never whole, so it can't be combined with a parse
+        # executor or a response cache.
+        if streaming and (parse_executor or response_cache):
+            raise ValueError(
+                "Streaming can't be combined with a parse executor or a response cache."
+            )
+        self.streaming = streaming
+        self.stream_chunk_size = stream_chunk_size
+
+        # Bytes of the responses read during the run.
+        self.transfer_bytes = 0
+
+        # Resumed runs skip the pages the writer has already checkpointed for this query. The
+        # checkpoints can be loaded by the caller instead, when the writer's connection is
+        # busy with other writes.
+        self.resume = resume
+        self.completed_pages = completed_pages
+
+        # Optional background write stage. When set, pages go through its queue instead of calling the writer
+        # on the event loop. A pipeline that is already running is left running when the scraper closes.
+        self.write_pipeline = write_pipeline
+        self._owns_pipeline = False
+
+        # Optional executor mode: "process" or "thread" sends the raw HTML to a worker pool instead of
+        # parsing it on the event loop. The pool is sized to the number of cores unless told otherwise.
+        if parse_executor not in (None, "process", "thread"):
+            raise ValueError(f"Unknown parse executor: {parse_executor}")
+        self.parse_executor = parse_executor
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self._executor: Optional[Executor] = None
+
+        # The HTTP session shared by every request of a run. An injected session is never closed by the scraper.
+        self.session = session
+        self._owns_session = False
+        self._is_open = False
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """
+        Create a pooled aiohttp ClientSession using the scraper connector settings.
+
+        Returns
+        -------
+        aiohttp.ClientSession
+            A session whose connector keeps connections alive and caches DNS lookups between pages.
+            It leaves the bodies compressed: the scraper decodes them itself, and counts the bytes
+            actually transferred.
+        """
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.ttl_dns_cache,
+        )
+        return aiohttp.ClientSession(connector=connector, auto_decompress=False)
+
+    def create_executor(self) -> Executor:
+        """
+        Create the worker pool used to parse pages off the event loop.
+
+        Returns
+        -------
+        Executor
+            A process pool, or a thread pool for parsers that release the GIL.
+        """
+        if self.parse_executor == "thread":
+            return ThreadPoolExecutor(max_workers=self.parse_workers)
+        # The processes are spawned: forking a process with a running event loop and
+        # worker threads can deadlock the children.
+        return ProcessPoolExecutor(
+            max_workers=self.parse_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    async def __aenter__(self) -> "FreeImagesAsyncScraper":
+        if self.session is None:
+            self.session = self.create_session()
+            self._owns_session = True
+        if self.parse_executor and self._executor is None:
+            self._executor = self.create_executor()
+        if self.write_pipeline is not None and not self.write_pipeline.is_running:
+            await self.write_pipeline.start()
+            self._owns_pipeline = True
+        if self.downloader is not None and not self.downloader.is_running:
+            await self.downloader.start()
+            self._owns_downloader = True
+        self._is_open = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the HTTP session if it was created by the scraper, and shut down the parse workers.
+        A write pipeline or a downloader started by the scraper is flushed and stopped first.
+        """
+        try:
+            if self._owns_pipeline:
+                self._owns_pipeline = False
+                await self.write_pipeline.close()
+        finally:
+            try:
+                if self._owns_downloader:
+                    self._owns_downloader = False
+                    await self.downloader.close()
+            finally:
+                if self._owns_session and self.session is not None:
+                    await self.session.close()
+                    self.session = None
+                self._owns_session = False
+                if self._executor is not None:
+                    self._executor.shutdown(cancel_futures=True)
+                    self._executor = None
+                self._is_open = False
+
+    async def fetch_raw(self, url: str) -> Coroutine[Any, Any, tuple[bytes, str]]:
+        """
+        Asynchronously fetch the raw body of a given URL using the shared aiohttp ClientSession.
+
+        The session must be opened first, either with ``async with scraper`` or by injecting one.
+        Connection errors, timeouts and retryable statuses are retried following the retry
+        policy, honouring Retry-After, the per-host rate limit and the circuit breaker.
+        With a response cache, a cached page is requested conditionally and a 304 answer
+        returns the cached body, which is only read from the disk then.
+
+        Parameters
+        ----------
+        url : str
+            The URL for the HTTP GET request.
+
+        Returns
+        -------
+        Coroutine[Any, Any, tuple[bytes, str]]
+            A coroutine representing the response body and its character encoding.
+
+        Raises
+        ------
+        FetchError
+            If the request still fails after the last attempt, or fails with a status
+            that isn't worth retrying.
+        """
+        cached = None
+        if self.response_cache is not None:
+            cached = await asyncio.to_thread(self.response_cache.get, url)
+        return await self._request(url, self._read_body, cached)
+
+    async def fetch_records(self, url: str) -> Coroutine[Any, Any, list[ImageRecord]]:
+        """
+        Asynchronously fetch a search page and parse it while it is being read.
+
+        The body is read in chunks of `stream_chunk_size` bytes, decompressed and decoded
+        with the declared charset as they arrive, and fed to an incremental parse. Once the
+        results grid has closed, the rest of the page is neither read nor parsed; the
+        connection is then closed instead of going back to the pool. Requests are retried
+        like in `fetch_raw`.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the search page.
+
+        Returns
+        -------
+        Coroutine[Any, Any, list[ImageRecord]]
+            A coroutine representing the records of the page.
+
+        Raises
+        ------
+        FetchError
+            If the request still fails after the last attempt, or the body can't be decoded.
+        """
+        return await self._request(url, self._stream_records)
+
+    async def _request(
+        self,
+        url: str,
+        read: Callable[[str, aiohttp.ClientResponse], Awaitable[Any]],
+        cached: Optional["CachedResponse"] = None,
+    ) -> Any:
+        # The retry loop shared by the fetch methods. read() turns a successful response
+        # into the result; a 304 for a cached page returns the cached body instead.
+        if self.session is None:
+            raise RuntimeError(
+                "The scraper session is not open. Use 'async with scraper' or call scrap()."
+            )
+
+        policy = self.retry_policy
+        timeout = aiohttp.ClientTimeout(total=policy.timeout)
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        if cached is not None:
+            headers.update(cached.conditional_headers())
+        for attempt in range(1, policy.max_attempts + 1):
+            await self.circuit_breaker.wait()
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire(URL(url).host)
+
+            # Latency is measured once the shared request slot is held, so waiting
+            # for it doesn't count as the site slowing down.
+            async with self._request_slot():
+                delay = None
+                # Every attempt is recorded once, when it ends: it counts as failed unless
+                # it succeeded or the site rejected the request, so an error raised by
+                # read() reaches the circuit breaker too.
+                status = None
+                failed: Optional[bool] = True
+                pushback = cancelled = False
+                started_at = perf_counter()
+                try:
+                    async with self.session.get(
+                        url, timeout=timeout, headers=headers
+                    ) as response:
+                        status = response.status
+                        if status == 304 and cached is not None:
+                            body = await asyncio.to_thread(
+                                self.response_cache.revalidated, cached
+                            )
+                            if body is not None:
+                                failed = False
+                                return body, cached.encoding
+                            # The cached body is gone: the page is requested again at
+                            # once, without the validators.
+                            failed, delay, cached = None, 0, None
+                            headers = {"Accept-Encoding": ACCEPT_ENCODING}
+                            error = FetchError(url, "cached body missing", status)
+                        if status in policy.retry_statuses:
+                            delay = policy.retry_after(response.headers)
+                            pushback = status in policy.pushback_statuses
+                            error = FetchError(url, f"HTTP {status}", status)
+                        else:
+                            response.raise_for_status()
+                            result = await read(url, response)
+                            failed = False
+                            return result
+                except aiohttp.ClientResponseError as cre:
+                    status, failed = cre.status, None
+                    raise FetchError(url, f"HTTP {cre.status}", cre.status) from cre
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = FetchError(url, repr(e))
+                except asyncio.CancelledError:
+                    cancelled = True
+                    raise
+                finally:
+                    if not cancelled:
+                        self._record_attempt(
+                            started_at, status, failed, pushback, delay
+                        )
+
+            print(
+                f"An error occurred during the HTTP request (attempt {attempt}): {error}"
+            )
+            if attempt < policy.max_attempts:
+                await asyncio.sleep(
+                    delay if delay is not None else policy.backoff(attempt)
+                )
+
+        raise error
+
+    async def _read_body(
+        self, url: str, response: aiohttp.ClientResponse
+    ) -> tuple[bytes, str]:
+        body = await response.read()
+        self._record_transfer(len(body))
+        try:
+            body = self._content_decoder(url, response).decode(body)
+        except ValueError as e:
+            raise FetchError(url, str(e))
+        encoding = response.get_encoding()
+        if self.response_cache is not None:
+            await asyncio.to_thread(
+                self.response_cache.put,
+                url,
+                body,
+                encoding,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+            )
+        return body, encoding
+
+    async def _stream_records(
+        self, url: str, response: aiohttp.ClientResponse
+    ) -> list[ImageRecord]:
+        started_at = perf_counter()
+        content_decoder = self._content_decoder(url, response)
+        # The declared charset only: detecting it would need the whole body.
+        try:
+            text_decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(
+                errors="replace"
+            )
+        except LookupError:
+            text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        feed = self.parser.incremental(self.BASE_URL, self.ITEMS_PER_PAGE)
+        first_result = False
+        try:
+            async for chunk in response.content.iter_chunked(self.stream_chunk_size):
+                self._record_transfer(len(chunk))
+                feed.feed(text_decoder.decode(content_decoder.decode(chunk)))
+                if not first_result and feed.records:
+                    first_result = True
+                    self.metrics.observe(
+                        "scraper_first_result_seconds", perf_counter() - started_at
+                    )
+                if feed.grid_closed:
+                    break
+            else:
+                feed.feed(text_decoder.decode(b"", final=True))
+        except ValueError as e:
+            raise FetchError(url, str(e))
+        return feed.close()
+
+    def _content_decoder(
+        self, url: str, response: aiohttp.ClientResponse
+    ) -> ContentDecoder:
+        # A session that decompresses on its own, such as an injected one, needs no decoder.
+        if getattr(self.session, "auto_decompress", True):
+            return ContentDecoder()
+        try:
+            return ContentDecoder(response.headers.get("Content-Encoding"))
+        except (ImportError, ValueError) as e:
+            raise FetchError(url, str(e))
+
+    def _record_transfer(self, size: int) -> None:
+        self.transfer_bytes += size
+        self.metrics.increment("scraper_fetch_bytes_total", size)
+
+    def _request_slot(self) -> AsyncContextManager:
+        if self.request_semaphore is None:
+            return nullcontext()
+        return self.request_semaphore
+
+    def _record_attempt(
+        self,
+        started_at: float,
+        status: Optional[int],
+        failed: Optional[bool],
+        pushback: bool = False,
+        delay: Optional[float] = None,
+    ) -> None:
+        # failed is None when the site rejected the request: the site is up, but the
+        # attempt is no success either.
+        if failed:
+            self.circuit_breaker.record_failure(pushback, delay)
+        elif failed is not None:
+            self.circuit_breaker.record_success()
+        self._record_request(started_at, status, bool(failed))
+
+    def _record_request(
+        self, started_at: float, status: Optional[int] = None, error: bool = False
+    ) -> None:
+        latency = perf_counter() - started_at
+        if self.concurrency_controller is not None:
+            self.concurrency_controller.record(latency, status, error, started_at)
+        if self.metrics.enabled:
+            self.metrics.observe("scraper_fetch_seconds", latency)
+            self.metrics.increment(
+                "scraper_fetch_requests_total",
+                labels={"status": str(status) if status else "error"},
+            )
+
+    @contextmanager
+    def _measure_parse(self, page: int) -> Iterator[None]:
+        with self.metrics.span("parse", page=page):
+            started_at = perf_counter()
+            try:
+                yield
+            finally:
+                self.metrics.observe(
+                    "scraper_parse_seconds", perf_counter() - started_at
+                )
+
+    @property
+    def last_page(self) -> Optional[int]:
+        """
+        The last page of the result set, once the latest run has seen a short page.
         """
-        Asynchronously fetch data from a given URL using an aiohttp ClientSession.
+        return self._last_page
+
+    @property
+    def concurrency_limit(self) -> int:
+        """
+        The number of pages kept in flight: the controller limit when concurrency is
+        adaptive, capped by the chunk size.
+        """
+        if self.concurrency_controller is None:
+            return self.chunk_size
+        return min(self.concurrency_controller.limit, self.chunk_size)
+
+    async def fetch(self, url: str) -> Coroutine[Any, Any, str]:
+        """
+        Asynchronously fetch data from a given URL using the shared aiohttp ClientSession.
 
         This method sends an HTTP GET request to the specified URL and returns the response text.
 
@@ -52,20 +538,22 @@ class FreeImagesAsyncScraper:
         -------
         Coroutine[Any, Any, str]
             A coroutine representing the response text.
+
+        Raises
+        ------
+        FetchError
+            If the request failed after every retry.
         """
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    response.raise_for_status()
-                    return await response.text()
-        except aiohttp.ClientError as ce:
-            print(f"An error occurred during the HTTP request: {ce}")
+        body, encoding = await self.fetch_raw(url)
+        return body.decode(encoding, errors="replace")
 
-    def parse(self, html_content: str) -> Union[list[str], list]:
+    def parse(self, html_content: str) -> list[ImageRecord]:
         """
         Parse the data.
 
         This function is responsible for parsing the HTML content and extracting relevant information.
+        The extraction itself is delegated to the configured parser backend, which reads the page link,
+        the preview URL, the dimensions, the title and the tags of every result in one pass.
 
         Parameters
         ----------
@@ -74,24 +562,46 @@ class FreeImagesAsyncScraper:
 
         Returns
         -------
-        Union[list[str], list]
-            A list of dictionaries containing parsed data. Each dictionary has a key 'address' representing a parsed link.
+        list[ImageRecord]
+            One record per result, with its absolute page URL.
         """
-        soup = BeautifulSoup(html_content, "html.parser")
-        urls = [
-            a["href"]
-            for a in soup.select("article.grid-article a.grid-link[href]")
-            if a.get("href")
-        ]
+        if not html_content:
+            return []
 
-        return [self.BASE_URL + url for url in urls]
+        return self.parser.parse(html_content, self.BASE_URL)
 
-    async def scrape_page(self, page: int) -> Coroutine[Any, Any, list[str] | list]:
+    async def parse_in_executor(self, body: bytes, encoding: str) -> list[ImageRecord]:
+        """
+        Parse a raw page body in the worker pool.
+
+        The body is sent as bytes, which are cheaper to pickle than the decoded text.
+        The event loop keeps issuing requests while the workers parse.
+
+        Parameters
+        ----------
+        body : bytes
+            The raw HTML content.
+        encoding : str
+            The character encoding of the body.
+
+        Returns
+        -------
+        list[ImageRecord]
+            The records found in the page, with absolute page URLs.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, parse_html_bytes, self.parser, body, encoding, self.BASE_URL
+        )
+
+    async def scrape_page(self, page: int) -> Coroutine[Any, Any, list[ImageRecord]]:
         """
         Asynchronously scrape and parse a specific page of search results.
 
         This method constructs the URL for the specified page, fetches the HTML content,
-        and then parses the content to extract relevant information.
+        and then parses the content to extract relevant information. With a response cache,
+        a page whose content was already parsed reuses the cached records. In streaming mode,
+        the page is parsed while it is being read, see `fetch_records`.
 
         Parameters
         ----------
@@ -100,24 +610,67 @@ class FreeImagesAsyncScraper:
 
         Returns
         -------
-        Coroutine[Any, Any, list[str] | list]
-            If successful, returns a list of dictionaries containing parsed information
-            from the page.
+        Coroutine[Any, Any, list[ImageRecord]]
+            If successful, returns the records parsed from the page.
         """
         url = f"{self.BASE_URL}/search/{self.query}/{page}"
-        html_content = await self.fetch(url)
-        print(f"Successfully scraped page {page}.")
-        return self.parse(html_content)
+        with self.metrics.span("scrape_page", query=self.query, page=page):
+            if self.streaming:
+                # The parse overlaps the read, so it is measured as part of the fetch.
+                with self.metrics.span("fetch", url=url):
+                    records = await self.fetch_records(url)
+                print(f"Successfully scraped page {page}.")
+                return records
+
+            if self._executor is None and self.response_cache is None:
+                with self.metrics.span("fetch", url=url):
+                    html_content = await self.fetch(url)
+                print(f"Successfully scraped page {page}.")
+                with self._measure_parse(page):
+                    return self.parse(html_content)
+
+            with self.metrics.span("fetch", url=url):
+                body, encoding = await self.fetch_raw(url)
+            print(f"Successfully scraped page {page}.")
+            if self.response_cache is None:
+                with self._measure_parse(page):
+                    return await self.parse_in_executor(body, encoding)
+
+            content_hash = self.response_cache.content_hash(
+                body,
+                f"{type(self.parser).__name__}/{PARSE_FORMAT_VERSION}/{self.BASE_URL}",
+            )
+            records = await asyncio.to_thread(
+                self.response_cache.get_parsed, content_hash
+            )
+            if records is None:
+                with self._measure_parse(page):
+                    if self._executor is None:
+                        records = self.parse(body.decode(encoding, errors="replace"))
+                    else:
+                        records = await self.parse_in_executor(body, encoding)
+                await asyncio.to_thread(
+                    self.response_cache.put_parsed, content_hash, records
+                )
+            return records
 
-    def write_to_storage(self, task: Union[list[str], list]) -> None:
+    async def write_to_storage(
+        self, task: list[ImageRecord], page: Optional[int] = None
+    ) -> None:
         """
-        Write a list of URLs to the storage.
+        Write the records of a page to the storage.
+
+        With a write pipeline the records are queued for the background writer, waiting if the
+        sink has fallen behind. Otherwise they are written directly.
 
         Parameters
         ----------
-        task : Union[list[str], list]
-            A list containing URLs to be written to the storage. Typically, each task
-            represents a batch of URLs, often with a size of 60.
+        task : list[ImageRecord]
+            The records to be written to the storage. Typically, each task
+            represents a page of results, often with a size of 60.
+        page : Optional[int]
+            The page the records come from. When given, the writer checkpoints the page as
+            complete together with its records.
 
         Returns
         -------
@@ -125,38 +678,79 @@ class FreeImagesAsyncScraper:
             This method does not return any value.
 
         """
-        self.writer.write(task)
-
-    def generate_tasks(
-        self,
-    ) -> list[Coroutine[Any, Any, Coroutine[Any, Any, list[str] | list]]]:
+        if self.write_pipeline is None:
+            self.writer.write_pages([(page, task)])
+        else:
+            await self.write_pipeline.put(task, page, self.writer)
+
+    def pending_pages(
+        self, completed_pages: Optional[dict[int, int]] = None
+    ) -> Iterator[int]:
         """
-        Generate a list of coroutines representing tasks to scrape pages.
+        Lazily list the pages to scrape, skipping the ones already completed.
+
+        Parameters
+        ----------
+        completed_pages : Optional[dict[int, int]]
+            The checkpointed pages, mapped to the number of items they stored.
 
         Returns
         -------
-        list[Coroutine[Any, Any, Coroutine[Any, Any, list[str] | list]]]
-            A list of coroutines, each representing a task to scrape a specific page.
+        Iterator[int]
+            The page numbers still to scrape, in order.
+        """
+        completed_pages = completed_pages or {}
+        return (
+            page for page in range(1, self.max_pages + 1) if page not in completed_pages
+        )
+
+    async def generate_tasks(
+        self, pages: Optional[Iterable[int]] = None
+    ) -> AsyncIterator[
+        tuple[int, Coroutine[Any, Any, Coroutine[Any, Any, list[ImageRecord]]]]
+    ]:
+        """
+        Lazily generate the tasks to scrape pages.
+
+        Parameters
+        ----------
+        pages : Optional[Iterable[int]]
+            The pages to scrape. Defaults to every page from 1 to `max_pages`.
+
+        Yields
+        ------
+        tuple[int, Coroutine[Any, Any, Coroutine[Any, Any, list[ImageRecord]]]]
+            The page number, and the coroutine scraping it.
 
         Notes
         -----
-        This method creates a list of coroutines by invoking the `scrape_page` coroutine
-        for each page within the specified range. These coroutines collectively represent
-        the tasks for scraping multiple pages.
+        A coroutine is only created when the scheduler asks for the next task, that is when
+        it has a free slot, so memory doesn't grow with the number of pages. The generator
+        stops on its own once the end of the result set has been reached.
         """
-        tasks = [self.scrape_page(page) for page in range(1, self.max_pages + 1)]
-        return tasks
+        if pages is None:
+            pages = range(1, self.max_pages + 1)
+        for page in pages:
+            if self._last_page is not None and page > self._last_page:
+                return
+            yield page, self.scrape_page(page)
 
     async def process_tasks_in_chunks(
-        self, tasks: list[Coroutine[Any, Any, Coroutine[Any, Any, list[str] | list]]]
+        self,
+        tasks: AsyncIterable[
+            tuple[int, Coroutine[Any, Any, Coroutine[Any, Any, list[ImageRecord]]]]
+        ],
+        processed_items_count: int = 0,
     ) -> int:
         """
-        Asynchronously process and write tasks in chunks to the storage.
+        Asynchronously process and write tasks to the storage using a sliding window.
 
         Parameters
         ----------
-        tasks : list[Coroutine[Any, Any, Coroutine[Any, Any, list[str] | list]]]
-            A list of coroutines, each representing a task.
+        tasks : AsyncIterable[tuple[int, Coroutine[Any, Any, Coroutine[Any, Any, list[ImageRecord]]]]]
+            The page numbers and the coroutines scraping them, in page order.
+        processed_items_count : int
+            Items already stored by a previous run, which count towards `number_of_items`.
 
         Returns
         -------
@@ -165,43 +759,162 @@ class FreeImagesAsyncScraper:
 
         Notes
         -----
-        This method asynchronously processes tasks in chunks, where each chunk is a subset of
-        the provided tasks. It writes the processed data to the storage, ensuring that the
-        order is maintained. The total count of processed items is returned.
-        """
-        processed_items_count = 0
-        for chunk in chunks(tasks, self.chunk_size):
-            processed_tasks = await asyncio.gather(*chunk)
-            for task in processed_tasks:
-                data = (
-                    task
-                    if processed_items_count + len(task) <= self.number_of_items
-                    else task[: self.number_of_items - processed_items_count]
-                )
-                self.write_to_storage(data)
-                processed_items_count += len(data)
+        Up to `concurrency_limit` tasks are kept in flight at all times: as soon as any of them
+        finishes, the next task is pulled from `tasks` and started. Results that finish out of
+        order wait in a small reorder buffer, so the storage still receives the pages in order.
+        A page with fewer than `ITEMS_PER_PAGE` results marks the end of the result set: the
+        pages after it are cancelled or dropped, and no new ones are started. Once
+        `number_of_items` is reached, the tasks still in flight are cancelled. A page is only
+        checkpointed when it is written whole, so a page trimmed to reach the target is
+        fetched again by a resumed run.
+        """
+        pending_tasks = aiter(tasks)
+        in_flight: dict[asyncio.Task, tuple[int, int]] = {}
+        reorder_buffer: dict[int, tuple[int, list[ImageRecord]]] = {}
+        next_task_index = 0
+        next_write_index = 0
+        self._last_page = None
+
+        async def fill_window() -> None:
+            nonlocal next_task_index
+            # The reorder buffer counts against a second window, so a single slow page
+            # can't make the buffered results grow without bound.
+            while (
+                len(in_flight) < self.concurrency_limit
+                and len(in_flight) + len(reorder_buffer) < 2 * self.chunk_size
+            ):
+                try:
+                    page, coroutine = await anext(pending_tasks)
+                except StopAsyncIteration:
+                    return
+                in_flight[asyncio.ensure_future(coroutine)] = (next_task_index, page)
+                next_task_index += 1
+
+        def end_results_at(last_page: int) -> None:
+            if self._last_page is not None and self._last_page <= last_page:
+                return
+            self._last_page = last_page
+            for running_task, (_, page) in list(in_flight.items()):
+                if page > last_page:
+                    running_task.cancel()
+                    del in_flight[running_task]
+            for task_index, (page, _) in list(reorder_buffer.items()):
+                if page > last_page:
+                    del reorder_buffer[task_index]
 
-                if processed_items_count >= self.number_of_items:
-                    break
+        try:
+            if processed_items_count < self.number_of_items:
+                await fill_window()
+            while in_flight and processed_items_count < self.number_of_items:
+                self.metrics.set_gauge("scraper_in_flight_pages", len(in_flight))
+                self.metrics.set_gauge(
+                    "scraper_reorder_buffer_pages", len(reorder_buffer)
+                )
+                done, _ = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for finished_task in done:
+                    if finished_task not in in_flight:
+                        continue
+                    task_index, page = in_flight.pop(finished_task)
+                    try:
+                        task = finished_task.result()
+                    except FetchError as fe:
+                        # The page is reported in the run result, and left without a
+                        # checkpoint so a resumed run fetches it again.
+                        print(f"Failed to scrape page {page}: {fe}")
+                        self.failed_pages[page] = str(fe)
+                        self.metrics.increment(
+                            "scraper_pages_total", labels={"outcome": "failed"}
+                        )
+                        task = None
+                    else:
+                        self.metrics.increment(
+                            "scraper_pages_total", labels={"outcome": "ok"}
+                        )
+                    if self._last_page is not None and page > self._last_page:
+                        continue
+                    reorder_buffer[task_index] = (page, task)
+                    if task is not None and len(task) < self.ITEMS_PER_PAGE:
+                        end_results_at(page)
+
+                while (
+                    next_write_index in reorder_buffer
+                    and processed_items_count < self.number_of_items
+                ):
+                    page, task = reorder_buffer.pop(next_write_index)
+                    next_write_index += 1
+                    if task is None:
+                        continue
+                    data = task[: self.number_of_items - processed_items_count]
+                    await self.write_to_storage(
+                        data, page if len(data) == len(task) else None
+                    )
+                    if self.downloader is not None:
+                        await self.downloader.put(
+                            full_size_image_url(record.preview_url)
+                            for record in data
+                            if record.preview_url
+                        )
+                    processed_items_count += len(data)
+
+                if processed_items_count < self.number_of_items:
+                    await fill_window()
+        finally:
+            for running_task in in_flight:
+                running_task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            if hasattr(pending_tasks, "aclose"):
+                await pending_tasks.aclose()
 
         return processed_items_count
 
-    async def scrap(self):
+    async def scrap(self, pages: Optional[Iterable[int]] = None) -> ScrapeResult:
         """
         Asynchronously initiate the scraping process.
 
+        Parameters
+        ----------
+        pages : Optional[Iterable[int]]
+            The pages to scrape, in order, for instance the pages a worker claimed from a
+            work queue. Defaults to every page from 1 to `max_pages`.
+
         Returns
         -------
-        int
-            The total count of processed items during the scraping process.
+        ScrapeResult
+            The total count of processed items during the scraping process, and the pages
+            that could not be fetched.
 
         Notes
         -----
         This method orchestrates the scraping process by generating tasks and processing them
-        in chunks using asyncio. It returns the total count of processed items.
+        through a sliding window of concurrent pages.
+        When the scraper is not open yet, it is opened for the run and closed afterwards.
+        A resumed run only fetches the pages that were not checkpointed, and the items of
+        the completed pages count towards the total.
         """
-        tasks = self.generate_tasks()
-
-        processed_items_count = await self.process_tasks_in_chunks(tasks)
-
-        return processed_items_count
+        if not self._is_open:
+            async with self:
+                return await self.scrap(pages)
+
+        self.failed_pages = {}
+        self.transfer_bytes = 0
+        if not self.resume:
+            completed_pages = {}
+        elif self.completed_pages is not None:
+            completed_pages = self.completed_pages
+        else:
+            completed_pages = self.writer.completed_pages(self.query)
+        if pages is None:
+            pages = self.pending_pages(completed_pages)
+        else:
+            pages = (page for page in pages if page not in completed_pages)
+        tasks = self.generate_tasks(pages)
+
+        processed_items_count = await self.process_tasks_in_chunks(
+            tasks, min(sum(completed_pages.values()), self.number_of_items)
+        )
+
+        return ScrapeResult(
+            processed_items_count, dict(self.failed_pages), self.transfer_bytes
+        )
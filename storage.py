@@ -1,57 +1,239 @@
-import json
+import io
+import os
 import sqlite3
+from contextlib import contextmanager
+from itertools import islice
+from urllib.parse import quote
+
+from helpers import import_optional
+
+# Connection profiles. "default" keeps the SQLite defaults. "ingest" trades a little durability
+# (the last transactions can be lost on power failure, never corrupted) for write throughput.
+# "shared" is for several processes, possibly on several hosts, writing to the same file: it
+# keeps the rollback journal, since WAL needs memory shared by every process, transactions
+# take the write lock up front, and a locked database is waited on instead of failing.
+PROFILES = {
+    "default": {
+        "cached_statements": 128,
+        "begin": "BEGIN",
+        "pragmas": {},
+    },
+    "ingest": {
+        "cached_statements": 1024,
+        "begin": "BEGIN",
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -65536,
+            "temp_store": "MEMORY",
+        },
+    },
+    "shared": {
+        "cached_statements": 1024,
+        "begin": "BEGIN IMMEDIATE",
+        "pragmas": {
+            "busy_timeout": 60000,
+            "synchronous": "NORMAL",
+            "cache_size": -65536,
+            "temp_store": "MEMORY",
+        },
+    },
+}
 
 
 class Database:
-    def __init__(self, db_name="data.sqlite3"):
+    def __init__(
+        self, db_name="data.sqlite3", profile="default", mmap_size=None, read_only=False
+    ):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown database profile: {profile}")
         self.db_name = db_name
+        self.profile = profile
+        self.mmap_size = mmap_size
+        # A read-only database must exist, and is never written, nor locked for writing.
+        self.read_only = read_only
         self._connection = None
+        self._transaction_depth = 0
 
     def connect(self) -> sqlite3.Connection:
         if self._connection is None:
+            settings = PROFILES[self.profile]
             try:
-                self._connection = sqlite3.connect(self.db_name)
+                # The connection may be used from a background writer thread, one thread at a time.
+                if self.read_only:
+                    path = quote(os.path.abspath(self.db_name))
+                    target, uri = f"file:{path}?mode=ro", True
+                else:
+                    target, uri = self.db_name, False
+                self._connection = sqlite3.connect(
+                    target,
+                    check_same_thread=False,
+                    cached_statements=settings["cached_statements"],
+                    uri=uri,
+                )
+                pragmas = dict(settings["pragmas"])
+                if self.read_only:
+                    # The journal mode is the writers' choice.
+                    pragmas.pop("journal_mode", None)
+                if self.mmap_size is not None:
+                    pragmas["mmap_size"] = self.mmap_size
+                for name, value in pragmas.items():
+                    self._connection.execute(f"PRAGMA {name}={value}")
             except sqlite3.Error as e:
                 raise RuntimeError(f"Failed to connect to database: {e}")
         return self._connection
 
-    def execute(self, query, params=None):
-        with self.connect() as conn:
+    @contextmanager
+    def transaction(self):
+        # Explicit, possibly long-lived transaction. The execute calls made inside it
+        # don't commit; everything is committed once at the end, or rolled back on error.
+        conn = self.connect()
+        if self._transaction_depth:
+            self._transaction_depth += 1
             try:
-                cursor = conn.cursor()
-                if params:
-                    cursor.execute(query, params)
-                else:
-                    cursor.execute(query)
-                conn.commit()
-                return cursor
-            except sqlite3.Error as e:
-                conn.rollback()
-                raise RuntimeError(f"Failed to execute query: {e}")
+                yield conn
+            finally:
+                self._transaction_depth -= 1
+            return
+
+        try:
+            conn.execute(PROFILES[self.profile]["begin"])
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to begin transaction: {e}")
+        self._transaction_depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._transaction_depth = 0
+
+    def execute(self, query, params=None):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            self._commit(conn)
+            return cursor
+        except sqlite3.Error as e:
+            self._rollback(conn)
+            raise RuntimeError(f"Failed to execute query: {e}")
 
     def executemany(self, sql, values):
-        with self.connect() as conn:
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(sql, values)
+            self._commit(conn)
+            return cursor
+        except sqlite3.Error as e:
+            self._rollback(conn)
+            raise RuntimeError(f"Failed to execute query: {e}")
+
+    def bulk_insert(self, sql, rows, batch_size=100_000) -> int:
+        # Streams rows from any iterable straight into executemany, one transaction per
+        # batch, without materializing the rows in a list. Returns the number of rows read.
+        rows = iter(rows)
+        count = 0
+
+        def counted(batch):
+            nonlocal count
+            for row in batch:
+                count += 1
+                yield row
+
+        while True:
+            batch_start = count
             try:
-                cursor = conn.cursor()
-                cursor.executemany(sql, values)
-                conn.commit()
-                return cursor
+                with self.transaction() as conn:
+                    conn.executemany(sql, counted(islice(rows, batch_size)))
             except sqlite3.Error as e:
-                conn.rollback()
                 raise RuntimeError(f"Failed to execute query: {e}")
+            if count - batch_start < batch_size:
+                return count
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _commit(self, conn):
+        if not self._transaction_depth:
+            conn.commit()
+
+    def _rollback(self, conn):
+        if not self._transaction_depth:
+            conn.rollback()
 
 
 class FileStorage:
-    def __init__(self, file_name="data.json"):
+    def __init__(self, file_name="data.txt"):
         self.file_name = file_name
+        self._file = None
 
     def write(self, data):
-        with open(self.file_name, "a") as file:
-            file.write(data)
+        # The file is opened once, in append mode, and kept open until close().
+        if self._file is None:
+            self._file = open_text_stream(self.file_name, "a")
+        self._file.write(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
 
     def read(self):
+        # The file holds one entry per line.
+        return list(self.iter_lines())
+
+    def iter_lines(self):
+        # Streams the entries, without loading the whole file.
         try:
             with open(self.file_name, "r") as file:
-                return json.load(file)
+                for line in file:
+                    line = line.rstrip("\n")
+                    if line:
+                        yield line
         except FileNotFoundError:
             raise FileNotFoundError(f"File not found: {self.file_name}")
+
+
+# Compression of the text streams, inferred from the file extension unless given.
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+BUFFER_SIZE = 1024 * 1024
+
+
+def open_text_stream(file_name, mode="r", compression=None):
+    # Opens a text file, plain, gzip or zstd compressed, behind one large buffer.
+    # Appending to a compressed file adds a new frame, which the readers handle transparently.
+    if compression is None:
+        compression = next(
+            (name for ext, name in COMPRESSIONS.items() if file_name.endswith(ext)),
+            None,
+        )
+    if compression is None:
+        return open(file_name, mode, buffering=BUFFER_SIZE, encoding="utf-8")
+    if compression == "gzip":
+        import gzip
+
+        stream = gzip.open(file_name, mode + "b")
+    elif compression == "zstd":
+        zstandard = import_optional("zstandard", "zstd compression")
+        raw = open(file_name, mode + "b")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                raw, read_across_frames=True, closefd=True
+            )
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+    else:
+        raise ValueError(f"Unknown compression: {compression}")
+    if mode == "r":
+        return io.TextIOWrapper(io.BufferedReader(stream, BUFFER_SIZE), "utf-8")
+    return io.TextIOWrapper(io.BufferedWriter(stream, BUFFER_SIZE), "utf-8")
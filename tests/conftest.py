@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture
+def html_content():
+    return """<html>
+                <body>
+                    <article class="grid-article"><a class="grid-link" href="/photo/dog-1383342"> <figure class="grid-figure" style="background:#fff"><picture><source srcset="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500"><img alt="dog" class="grid-thumb" height="1600" loading="lazy" src="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500" width="2000"></picture><figcaption class="figcaption">cuteeeeyy</figcaption></figure> </a><div class="grid-item-overlay absolute z-10 opacity-0 top-0 left-0 right-0 bottom-0 pointer-events-none transition-opacity"><div class="flex flex-col justify-between group absolute w-full h-full"><div class="thumb-overlay-container flex h-full w-full"><div class="w-full h-full bg-gradient-to-t from-black-op-0.6 to-transparent relative"><div class="tags-container absolute px-4 py-3"><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dog"> dog </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dogg"> dogg </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/doggy"> doggy </a></div><div class="flex h-full items-end px-4 py-3"><h4 class="text-white truncate">Dog</h4></div></div></div></div></div></article>
+                    <article class="grid-article"><a class="grid-link" href="/photo/dog-1383342"> <figure class="grid-figure" style="background:#fff"><picture><source srcset="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500"><img alt="dog" class="grid-thumb" height="1600" loading="lazy" src="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500" width="2000"></picture><figcaption class="figcaption">cuteeeeyy</figcaption></figure> </a><div class="grid-item-overlay absolute z-10 opacity-0 top-0 left-0 right-0 bottom-0 pointer-events-none transition-opacity"><div class="flex flex-col justify-between group absolute w-full h-full"><div class="thumb-overlay-container flex h-full w-full"><div class="w-full h-full bg-gradient-to-t from-black-op-0.6 to-transparent relative"><div class="tags-container absolute px-4 py-3"><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dog"> dog </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dogg"> dogg </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/doggy"> doggy </a></div><div class="flex h-full items-end px-4 py-3"><h4 class="text-white truncate">Dog</h4></div></div></div></div></div></article>
+                    <article class="grid-article"><a class="grid-link" href="/photo/dog-1383342"> <figure class="grid-figure" style="background:#fff"><picture><source srcset="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500"><img alt="dog" class="grid-thumb" height="1600" loading="lazy" src="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500" width="2000"></picture><figcaption class="figcaption">cuteeeeyy</figcaption></figure> </a><div class="grid-item-overlay absolute z-10 opacity-0 top-0 left-0 right-0 bottom-0 pointer-events-none transition-opacity"><div class="flex flex-col justify-between group absolute w-full h-full"><div class="thumb-overlay-container flex h-full w-full"><div class="w-full h-full bg-gradient-to-t from-black-op-0.6 to-transparent relative"><div class="tags-container absolute px-4 py-3"><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dog"> dog </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dogg"> dogg </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/doggy"> doggy </a></div><div class="flex h-full items-end px-4 py-3"><h4 class="text-white truncate">Dog</h4></div></div></div></div></div></article>
+                </body>
+    </html>
+"""
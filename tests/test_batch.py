@@ -0,0 +1,117 @@
+import asyncio
+import io
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from batch import BatchRunner, ManifestEntry, print_report, read_manifest
+from benchmarks.pages import build_search_page
+from scraper import FreeImagesAsyncScraper
+from storage import Database
+from writers import DatabaseWriter
+
+
+def test_read_manifest():
+    lines = ["# query,items", "dog,120", "", "cat", " red car , 60 "]
+
+    assert read_manifest(lines, default_items=10) == [
+        ManifestEntry("dog", 120),
+        ManifestEntry("cat", 10),
+        ManifestEntry("red car", 60),
+    ]
+
+
+@pytest.mark.parametrize("line", ["dog,many", "dog,0"])
+def test_read_manifest_invalid_count(line):
+    with pytest.raises(ValueError):
+        read_manifest([line])
+
+
+def test_read_manifest_duplicate_query():
+    with pytest.raises(ValueError):
+        read_manifest(["dog,60", "cat", " dog "])
+
+
+@pytest_asyncio.fixture
+async def search_server():
+    # serves 3 full pages of results per query, and tracks the requests in flight
+    stats = {"running": 0, "peak": 0, "requests": []}
+
+    async def search(request):
+        stats["running"] += 1
+        stats["peak"] = max(stats["peak"], stats["running"])
+        await asyncio.sleep(0.005)
+        stats["running"] -= 1
+        page = int(request.match_info["page"])
+        stats["requests"].append((request.match_info["query"], page))
+        items = 60 if page <= 3 else 0
+        return web.Response(
+            text=build_search_page(request.match_info["query"], page, items),
+            content_type="text/html",
+        )
+
+    app = web.Application()
+    app.router.add_get("/search/{query}/{page}", search)
+    server = TestServer(app)
+    await server.start_server()
+    base_url = str(server.make_url("")).rstrip("/")
+    with patch.object(FreeImagesAsyncScraper, "BASE_URL", base_url):
+        yield stats
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_run_shares_one_engine(search_server, tmp_path):
+    db_name = str(tmp_path / "batch.sqlite3")
+    runner = BatchRunner(concurrency=3, per_query_concurrency=2, db_name=db_name)
+    manifest = [
+        ManifestEntry("dog", 120),
+        ManifestEntry("cat", 180),
+        ManifestEntry("bird", 600),
+    ]
+
+    results = await runner.run(manifest)
+
+    # per-query totals, in manifest order; the last query runs out of results
+    assert [(result.query, result.items) for result in results] == [
+        ("dog", 120),
+        ("cat", 180),
+        ("bird", 180),
+    ]
+    assert all(result.elapsed > 0 and not result.failed_pages for result in results)
+
+    # the global limit held across all the queries
+    assert search_server["peak"] <= 3
+
+    # every query has its own run in the shared database
+    rows = Database(db_name).execute(
+        "SELECT query, COUNT(*) FROM runs JOIN run_images ON run_images.run_id = runs.id"
+        " GROUP BY runs.id ORDER BY runs.id"
+    )
+    assert rows.fetchall() == [("dog", 120), ("cat", 180), ("bird", 180)]
+
+    report = io.StringIO()
+    print_report(results, 1.0, file=report)
+    assert "3 queries, 480 images" in report.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_batch_resume_skips_checkpointed_pages(search_server, tmp_path):
+    db_name = str(tmp_path / "batch.sqlite3")
+    # an earlier run stored the first two pages of "dog"
+    DatabaseWriter("dog", db_name).write_pages(
+        [
+            (page, [f"https://a.com/dog/{page}/{i}" for i in range(60)])
+            for page in (1, 2)
+        ]
+    )
+    runner = BatchRunner(concurrency=3, db_name=db_name, resume=True)
+
+    results = await runner.run([ManifestEntry("dog", 180), ManifestEntry("cat", 60)])
+
+    # the checkpoints were read before the crawl, and their items are counted
+    assert [result.items for result in results] == [180, 60]
+    assert sorted(search_server["requests"]) == [("cat", 1), ("dog", 3)]
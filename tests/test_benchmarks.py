@@ -0,0 +1,84 @@
+import aiohttp
+import pytest
+
+from benchmarks.end_to_end import compare, run_benchmark
+from benchmarks.import_time import (
+    IMPORT_BUDGETS_MS,
+    measure_import_time,
+    total_import_time,
+)
+from benchmarks.mock_server import MockFreeImagesServer
+
+
+@pytest.mark.asyncio
+async def test_mock_server_pages_and_errors():
+    async with MockFreeImagesServer(latency=0, total_items=90) as server:
+        async with aiohttp.ClientSession() as session:
+            # the result set ends with a short page, then empty ones
+            for page, expected in ((1, 60), (2, 30), (3, 0)):
+                url = f"{server.base_url}/search/dog/{page}"
+                async with session.get(url) as response:
+                    html = await response.text()
+                assert html.count('class="grid-article"') == expected
+
+            server.error_rate = 1.0
+            async with session.get(f"{server.base_url}/search/dog/1") as response:
+                assert response.status == 503
+    assert server.requests == 4 and server.errors == 1
+
+
+@pytest.mark.parametrize("sink", ["memory", "sqlite"])
+@pytest.mark.asyncio
+async def test_end_to_end_benchmark(sink):
+    results = await run_benchmark(items=300, latency=0, jitter=0, sink=sink)
+
+    metrics = results["results"]
+    assert results["config"]["items"] == 300
+    assert metrics["items"] == 300 and metrics["pages"] == 5
+    assert metrics["pages_per_second"] > 0 and metrics["items_per_second"] > 0
+    assert metrics["latency_p50"] <= metrics["latency_p95"] <= metrics["latency_p99"]
+    assert metrics["sink_rows_per_second"] > 0
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"items_per_second": 1000.0, "latency_p95": 0.1}}
+    results = {"results": {"items_per_second": 850.0, "latency_p95": 0.105}}
+
+    # throughput fell by 15%, latency only rose by 5%
+    regressions = compare(results, baseline, tolerance=0.1)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("items_per_second")
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS_MS))
+def test_import_time_is_within_budget(module):
+    total, times = total_import_time(module)
+
+    assert times[-1].module == module
+    assert total <= IMPORT_BUDGETS_MS[module]
+
+
+def test_cli_imports_the_scraper_after_parsing_arguments():
+    modules = {time.module for time in measure_import_time("main")}
+
+    assert not modules & {"aiohttp", "bs4", "sqlite3", "scraper", "writers"}
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    modules = {time.module for time in measure_import_time("scraper")}
+
+    # bs4 is only imported by its parser backend, the aiohttp server by the exporter,
+    # the cache and the downloader by their callers, and the sinks, with sqlite3 and
+    # gzip, by the run that writes to them
+    assert "aiohttp" in modules
+    assert not modules & {
+        "bs4",
+        "aiohttp.web",
+        "cache",
+        "downloader",
+        "writers",
+        "storage",
+        "sqlite3",
+        "gzip",
+    }
@@ -0,0 +1,196 @@
+import os
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from benchmarks.pages import build_search_page
+from cache import ResponseCache
+from records import ImageRecord
+from scraper import FreeImagesAsyncScraper
+from writers import IWriter
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "cache"))
+
+
+def test_put_and_get(cache):
+    cache.put("https://example.com/1", b"<html>1</html>", "utf-8", etag='"v1"')
+
+    entry = cache.get("https://example.com/1")
+
+    # the validators come first, as conditional headers, and the body comes back whole
+    assert entry.encoding == "utf-8"
+    assert entry.conditional_headers() == {"If-None-Match": '"v1"'}
+    assert cache.load_body(entry) == b"<html>1</html>"
+    assert cache.get("https://example.com/2") is None
+
+
+def test_validators_are_read_without_the_body(cache):
+    cache.put("https://example.com/1", b"body", "utf-8", etag="1")
+
+    with patch("cache.open") as open_file:
+        entry = cache.get("https://example.com/1")
+    assert entry.etag == "1"
+    open_file.assert_not_called()
+
+    # a body lost since is only noticed after the 304, and the entry is dropped
+    os.remove(cache._path(entry.file_name))
+    assert cache.revalidated(entry) is None
+    assert cache.get("https://example.com/1") is None
+    assert cache.hits == 0
+
+
+def test_responses_without_validators_are_not_stored(cache):
+    cache.put("https://example.com/1", b"<html>1</html>", "utf-8")
+
+    assert cache.get("https://example.com/1") is None
+    assert cache.misses == 1
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"), ttl=60)
+    with patch("cache.time", return_value=1000.0):
+        cache.put("https://example.com/1", b"body", "utf-8", last_modified="date")
+
+    # past the TTL the entry is removed instead of revalidated
+    with patch("cache.time", return_value=1061.0):
+        assert cache.get("https://example.com/1") is None
+    assert cache.size == 0
+
+
+def test_lru_eviction(tmp_path):
+    body = os.urandom(1000)
+    cache = ResponseCache(str(tmp_path / "cache"), max_bytes=2500, ttl=float("inf"))
+    with patch("cache.time", side_effect=[1.0, 2.0, 3.0, 4.0, 5.0, 6.0]):
+        cache.put("https://example.com/1", body, "utf-8", etag="1")
+        cache.put("https://example.com/2", body, "utf-8", etag="2")
+        # reading the first entry makes the second one the least recently used
+        assert cache.get("https://example.com/1") is not None
+        cache.put("https://example.com/3", body, "utf-8", etag="3")
+
+    assert cache.evictions == 1
+    assert cache.size <= 2500
+    assert cache.get("https://example.com/2") is None
+    assert cache.get("https://example.com/1") is not None
+    assert cache.get("https://example.com/3") is not None
+
+
+def test_parsed_records_by_content_hash(cache):
+    content_hash = cache.content_hash(b"<html></html>")
+    record = ImageRecord(
+        "https://example.com/a", "https://cdn/a.jpg", 10, 20, "A", ("x",)
+    )
+
+    assert cache.get_parsed(content_hash) is None
+    cache.put_parsed(content_hash, [record])
+
+    assert cache.get_parsed(content_hash) == [record]
+    assert cache.parse_hits == 1 and cache.parse_misses == 1
+
+    # the same page parsed by another parser, or another parse format, is another entry
+    assert cache.content_hash(b"<html></html>", "TokenizerParser/1") != content_hash
+
+
+def test_cache_survives_reopening(tmp_path):
+    ResponseCache(str(tmp_path / "cache")).put(
+        "https://example.com/1", b"body", "utf-8", etag="1"
+    )
+
+    cache = ResponseCache(str(tmp_path / "cache"))
+
+    assert cache.size > 0
+    assert cache.load_body(cache.get("https://example.com/1")) == b"body"
+
+
+def test_parsed_records_are_trimmed_in_lru_order(tmp_path):
+    # a 10 KiB cap keeps 10 parsed pages, and trims down to 9 once it is exceeded
+    cache = ResponseCache(str(tmp_path / "cache"), max_bytes=10 * 1024)
+    hashes = [cache.content_hash(str(i).encode()) for i in range(11)]
+    with patch("cache.time", side_effect=range(1, 13)):
+        for content_hash in hashes[:10]:
+            cache.put_parsed(content_hash, [])
+        # reading the first page makes the second one the least recently used
+        assert cache.get_parsed(hashes[0]) == []
+        cache.put_parsed(hashes[10], [])
+
+    assert cache.parsed_rows == 9
+    assert cache.get_parsed(hashes[0]) == []
+    assert cache.get_parsed(hashes[1]) is None
+    assert cache.get_parsed(hashes[2]) is None
+    assert cache.get_parsed(hashes[3]) == []
+
+
+def test_access_times_are_written_in_batches(cache):
+    cache.put("https://example.com/1", b"body", "utf-8", etag="1")
+    updates = []
+    cache.db.connect().set_trace_callback(updates.append)
+
+    # reads only record the access time in memory, until the cache is flushed
+    for _ in range(3):
+        assert cache.get("https://example.com/1") is not None
+    assert not any(statement.startswith("UPDATE") for statement in updates)
+
+    cache.flush()
+    assert sum(statement.startswith("UPDATE") for statement in updates) == 1
+
+
+@pytest_asyncio.fixture
+async def etag_server():
+    # serves 2 pages of results with an ETag, answering 304 when it matches
+    requests = []
+
+    async def search(request):
+        page = int(request.match_info["page"])
+        etag = f'"page-{page}"'
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            text=build_search_page("dog", page, 60 if page <= 2 else 0),
+            content_type="text/html",
+            headers={"ETag": etag},
+        )
+
+    app = web.Application()
+    app.router.add_get("/search/{query}/{page}", search)
+    server = TestServer(app)
+    await server.start_server()
+    base_url = str(server.make_url("")).rstrip("/")
+    with patch.object(FreeImagesAsyncScraper, "BASE_URL", base_url):
+        yield requests
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_scraper_revalidates_cached_pages(etag_server, tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"))
+    stored = []
+
+    class ListWriter(IWriter):
+        @staticmethod
+        def write(data):
+            stored.extend(data)
+
+    async def run():
+        scraper = FreeImagesAsyncScraper(
+            120, "dog", ListWriter(), chunk_size=2, response_cache=cache
+        )
+        return await scraper.scrap()
+
+    first = await run()
+    first_run = list(stored)
+    stored.clear()
+    second = await run()
+
+    # the second run is answered with 304s and reuses the parsed records
+    assert first.items == second.items == 120
+    assert stored == first_run
+    assert etag_server == [None, None, '"page-1"', '"page-2"']
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+    assert cache.parse_hits == 2 and cache.parse_misses == 2
@@ -0,0 +1,90 @@
+from time import perf_counter
+
+from concurrency import AIMDController
+
+
+def record_window(controller, latency, count=None, **kwargs):
+    # records a full window of identical requests
+    for _ in range(count or controller.window):
+        controller.record(latency, **kwargs)
+
+
+def test_increases_while_latency_is_flat():
+    changes = []
+    controller = AIMDController(
+        max_limit=10, initial_limit=2, window=5, on_change=changes.append
+    )
+
+    for _ in range(3):
+        record_window(controller, 0.1, status=200)
+
+    # one step up per window
+    assert controller.limit == 5
+    assert [change.limit for change in changes] == [3, 4, 5]
+    assert changes[0].reason.startswith("latency flat")
+
+
+def test_never_exceeds_the_hard_cap():
+    controller = AIMDController(max_limit=3, initial_limit=3, window=5)
+
+    record_window(controller, 0.1, status=200)
+
+    assert controller.limit == 3
+
+
+def test_backs_off_when_latency_rises():
+    changes = []
+    controller = AIMDController(
+        max_limit=20, initial_limit=8, window=5, on_change=changes.append
+    )
+
+    # the baseline is set by a fast window, then the site slows down
+    record_window(controller, 0.1, status=200)
+    record_window(controller, 0.5, status=200)
+
+    assert controller.limit == 4
+    assert changes[-1].reason.startswith("latency up")
+
+
+def test_backs_off_on_errors():
+    controller = AIMDController(max_limit=20, initial_limit=8, window=10)
+
+    record_window(controller, 0.1, count=8, status=200)
+    record_window(controller, 0.1, count=2, error=True)
+
+    assert controller.limit == 4
+
+
+def test_pushback_cuts_the_limit_immediately():
+    changes = []
+    controller = AIMDController(
+        max_limit=20, min_limit=2, initial_limit=8, on_change=changes.append
+    )
+
+    controller.record(0.1, status=429, started_at=0.0)
+
+    assert controller.limit == 4
+    assert changes == [(8, 4, "site pushback (HTTP 429)")]
+
+
+def test_one_decrease_per_round_trip():
+    controller = AIMDController(max_limit=32, initial_limit=32, window=5)
+
+    # a whole window of requests in flight gets 429 together: they were all sent at the
+    # old limit, so only the first one cuts it
+    for _ in range(25):
+        controller.record(0.1, status=429, started_at=0.0)
+    assert controller.limit == 16
+
+    # a request sent after the decrease is pushed back again
+    controller.record(0.1, status=503, started_at=perf_counter())
+    assert controller.limit == 8
+
+
+def test_pushback_is_held_at_the_minimum():
+    controller = AIMDController(max_limit=20, min_limit=2, initial_limit=3)
+
+    controller.record(0.1, status=429)
+    controller.record(0.1, status=429, started_at=perf_counter())
+
+    assert controller.limit == 2
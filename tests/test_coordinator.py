@@ -0,0 +1,220 @@
+import asyncio
+import os
+import threading
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+
+import coordinator
+from benchmarks.mock_server import MockFreeImagesServer
+from coordinator import Coordinator, CrawlWorker, WorkItem, WorkQueue
+from storage import Database
+from writers import DatabaseWriter
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=10)
+
+
+def count_images(db_name):
+    return Database(db_name).execute("SELECT COUNT(*) FROM images;").fetchone()[0]
+
+
+def test_enqueue_splits_a_job_into_pages(queue):
+    # the last page only holds the rest of the items
+    assert queue.enqueue("dog", 130) == 3
+    # submitting the job again adds nothing
+    assert queue.enqueue("dog", 130) == 0
+
+    assert queue.claim("a", batch_size=10) == [
+        WorkItem("dog", 1, 60),
+        WorkItem("dog", 2, 60),
+        WorkItem("dog", 3, 10),
+    ]
+
+
+def test_workers_claim_distinct_batches(queue):
+    queue.enqueue("dog", 300)
+
+    first = queue.claim("a", batch_size=2)
+    second = queue.claim("b", batch_size=2)
+
+    assert [item.page for item in first] == [1, 2]
+    assert [item.page for item in second] == [3, 4]
+    assert queue.progress() == {"pending": 1, "leased": 4}
+
+
+def test_expired_lease_is_reclaimed(queue):
+    queue.enqueue("dog", 120)
+    now = 1000.0
+
+    # worker "a" claims the pages, then stops renewing its lease
+    with patch.object(coordinator, "time", return_value=now):
+        claimed = queue.claim("a")
+        assert queue.claim("b") == []
+    with patch.object(coordinator, "time", return_value=now + 11):
+        assert queue.claim("b") == claimed
+
+        # the late completion of "a" is ignored, the pages now belong to "b"
+        queue.complete("a", claimed)
+        assert queue.progress() == {"leased": 2}
+        queue.complete("b", claimed)
+        assert queue.progress() == {"done": 2}
+
+
+def test_renewed_lease_is_kept(queue):
+    queue.enqueue("dog", 60)
+
+    with patch.object(coordinator, "time", return_value=1000.0):
+        queue.claim("a")
+    with patch.object(coordinator, "time", return_value=1008.0):
+        queue.renew("a")
+    with patch.object(coordinator, "time", return_value=1015.0):
+        assert queue.claim("b") == []
+
+
+def test_page_fails_after_max_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"), max_attempts=2)
+    queue.enqueue("dog", 60)
+
+    # a failed page goes back to the queue until it is out of attempts
+    item = queue.claim("a")[0]
+    queue.release("a", item, "HTTP 503")
+    assert queue.progress() == {"pending": 1}
+    item = queue.claim("b")[0]
+    queue.release("b", item, "HTTP 503")
+
+    assert queue.progress() == {"failed": 1}
+    assert queue.claim("c") == []
+    assert queue.outstanding() == 0
+
+
+def test_end_results_skips_later_pages(queue):
+    queue.enqueue("dog", 300)
+    queue.enqueue("cat", 60)
+    queue.claim("a", batch_size=3)
+
+    queue.end_results("dog", 2)
+
+    assert queue.progress("dog") == {"leased": 2, "skipped": 3}
+    assert queue.progress("cat") == {"pending": 1}
+
+
+@pytest.mark.asyncio
+async def test_worker_takes_over_pages_of_crashed_worker(tmp_path):
+    db_name = str(tmp_path / "crawl.sqlite3")
+    queue = WorkQueue(db_name, lease_seconds=0.2)
+    queue.enqueue("dog", 200)
+    # a worker claims two pages, then crashes
+    queue.claim("crashed", batch_size=2)
+
+    async with MockFreeImagesServer(latency=0, total_items=150) as server:
+        worker = CrawlWorker(
+            db_name,
+            worker_id="survivor",
+            batch_size=2,
+            lease_seconds=0.2,
+            poll_interval=0.05,
+            base_url=server.base_url,
+        )
+        result = await worker.run()
+
+    # page 3 is short, so page 4 is skipped, and pages 1 and 2 are crawled again
+    assert result.pages == 3
+    assert result.items == 150
+    assert queue.progress() == {"done": 3, "skipped": 1}
+    assert count_images(db_name) == 150
+
+
+class MissingPageServer(MockFreeImagesServer):
+    # answers 404 for page 2
+    async def search(self, request):
+        if request.match_info["page"] == "2":
+            return web.Response(status=404)
+        return await super().search(request)
+
+
+@pytest.mark.asyncio
+async def test_short_last_page_is_trimmed_when_a_page_fails(tmp_path):
+    db_name = str(tmp_path / "crawl.sqlite3")
+    queue = WorkQueue(db_name, max_attempts=1)
+    queue.enqueue("dog", 150)
+
+    async with MissingPageServer(latency=0) as server:
+        worker = CrawlWorker(db_name, max_attempts=1, base_url=server.base_url)
+        result = await worker.run()
+
+    # the job only wants 30 items of page 3, even though page 2 is missing
+    assert result.items == 90
+    assert count_images(db_name) == 90
+    assert queue.progress() == {"done": 2, "failed": 1}
+
+
+@pytest.mark.asyncio
+async def test_pages_are_released_when_the_write_fails(tmp_path, monkeypatch):
+    db_name = str(tmp_path / "crawl.sqlite3")
+    queue = WorkQueue(db_name, max_attempts=1)
+    queue.enqueue("dog", 120)
+
+    def failing_write(self, pages):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(DatabaseWriter, "write_pages", failing_write)
+    async with MockFreeImagesServer(latency=0) as server:
+        worker = CrawlWorker(db_name, max_attempts=1, base_url=server.base_url)
+        result = await worker.run()
+
+    # nothing was stored, so no page is marked done
+    assert result.pages == 0 and result.failed_pages == 2
+    assert queue.progress() == {"failed": 2}
+    assert count_images(db_name) == 0
+
+
+@pytest.fixture
+def mock_server_url():
+    # the server runs in a thread, so worker processes can reach it while the test waits
+    loop = asyncio.new_event_loop()
+    server = MockFreeImagesServer(latency=0.1)
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server.base_url
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(server.close())
+    loop.close()
+
+
+def crawl(db_name, base_url, workers, number_of_items):
+    # every worker keeps 2 pages in flight, so a single one is bound by the latency
+    coordinator = Coordinator(
+        db_name,
+        workers=workers,
+        batch_size=4,
+        chunk_size=2,
+        poll_interval=0.05,
+        base_url=base_url,
+    )
+    coordinator.submit("dog", number_of_items)
+    results = coordinator.run()
+    assert len(results) == workers
+    assert coordinator.progress() == {"done": number_of_items // 60}
+    pages = sum(result.pages for result in results)
+    return pages / max(result.elapsed for result in results)
+
+
+def test_page_throughput_scales_with_workers(tmp_path, mock_server_url):
+    workers = max(2, min(4, os.cpu_count() or 1))
+    number_of_items = 60 * 16 * workers
+
+    single = crawl(
+        str(tmp_path / "single.sqlite3"), mock_server_url, 1, number_of_items
+    )
+    sharded_db = str(tmp_path / "sharded.sqlite3")
+    sharded = crawl(sharded_db, mock_server_url, workers, number_of_items)
+
+    # the results of all the workers are merged in one table
+    assert count_images(sharded_db) == number_of_items
+    assert sharded >= 0.75 * workers * single
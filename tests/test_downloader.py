@@ -0,0 +1,161 @@
+import os
+from hashlib import sha256
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from downloader import ImageDownloader
+from storage import Database
+
+IMAGES = {
+    "a.jpg": os.urandom(200_000),
+    "b.png": os.urandom(1000),
+}
+# same content as a.jpg, under another URL
+IMAGES["copy.jpg"] = IMAGES["a.jpg"]
+
+
+@pytest_asyncio.fixture
+async def image_server():
+    requests = []
+
+    async def image(request):
+        name = request.match_info["name"]
+        requests.append(name)
+        if name not in IMAGES:
+            raise web.HTTPNotFound()
+        return web.Response(body=IMAGES[name], content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/images/{name}", image)
+    server = TestServer(app)
+    await server.start_server()
+    yield str(server.make_url("/images/")), requests
+    await server.close()
+
+
+def make_downloader(tmp_path):
+    return ImageDownloader(
+        str(tmp_path / "images"),
+        db=Database(str(tmp_path / "test.sqlite3")),
+        concurrency=2,
+        chunk_size=4096,
+    )
+
+
+@pytest.mark.asyncio
+async def test_download_to_content_addressed_paths(image_server, tmp_path):
+    base_url, _ = image_server
+
+    async with make_downloader(tmp_path) as downloader:
+        await downloader.put([base_url + name for name in ("a.jpg", "b.png")])
+
+    # every file is stored under the hash of its content
+    for name, content in (("a.jpg", IMAGES["a.jpg"]), ("b.png", IMAGES["b.png"])):
+        digest = sha256(content).hexdigest()
+        path = tmp_path / "images" / digest[:2] / digest[2:4] / (digest + name[-4:])
+        assert path.read_bytes() == content
+    assert downloader.stats().downloaded == 2
+    assert not os.listdir(tmp_path / "images" / "tmp")
+
+
+@pytest.mark.asyncio
+async def test_identical_content_is_written_once(image_server, tmp_path):
+    base_url, _ = image_server
+
+    async with make_downloader(tmp_path) as downloader:
+        path = await downloader.download(base_url + "a.jpg")
+        copy_path = await downloader.download(base_url + "copy.jpg")
+
+    # both URLs are in the manifest, pointing at the same file
+    assert path == copy_path
+    assert downloader.downloaded == 1 and downloader.duplicates == 1
+    rows = downloader.db.execute("SELECT path FROM downloads;").fetchall()
+    assert rows == [(path,), (path,)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_downloads_of_the_same_content(image_server, tmp_path):
+    base_url, _ = image_server
+
+    # both workers download the same content at the same time, one file is stored
+    async with make_downloader(tmp_path) as downloader:
+        await downloader.put([base_url + "a.jpg", base_url + "copy.jpg"])
+
+    assert downloader.downloaded == 1 and downloader.duplicates == 1
+    assert downloader.bytes_written == len(IMAGES["a.jpg"])
+    assert not os.listdir(tmp_path / "images" / "tmp")
+
+
+@pytest.mark.asyncio
+async def test_duplicates_wait_for_the_first_file(image_server, tmp_path):
+    base_url, _ = image_server
+    store = ImageDownloader._store
+    calls = []
+
+    def store_once_failing(temp_path, full_path):
+        calls.append(full_path)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return store(temp_path, full_path)
+
+    # the first move of the content fails, the other download then stores its own file
+    with patch.object(ImageDownloader, "_store", staticmethod(store_once_failing)):
+        async with make_downloader(tmp_path) as downloader:
+            await downloader.put([base_url + "a.jpg", base_url + "copy.jpg"])
+
+    assert len(downloader.failed) == 1
+    assert downloader.downloaded == 1 and downloader.duplicates == 0
+    rows = downloader.db.execute("SELECT path FROM downloads;").fetchall()
+    assert len(rows) == 1
+    assert (tmp_path / "images" / rows[0][0]).read_bytes() == IMAGES["a.jpg"]
+
+
+@pytest.mark.asyncio
+async def test_manifest_rows_are_inserted_in_batches(image_server, tmp_path):
+    base_url, _ = image_server
+    downloader = make_downloader(tmp_path)
+    await downloader.start()
+
+    await downloader.download(base_url + "b.png")
+    count = "SELECT COUNT(*) FROM downloads;"
+    assert downloader.db.execute(count).fetchone()[0] == 0
+
+    # the last batch is inserted on close
+    await downloader.close()
+    assert downloader.db.execute(count).fetchone()[0] == 1
+
+
+@pytest.mark.asyncio
+async def test_reruns_skip_complete_files(image_server, tmp_path):
+    base_url, requests = image_server
+    urls = [base_url + "a.jpg", base_url + "b.png"]
+
+    async with make_downloader(tmp_path) as downloader:
+        await downloader.put(urls)
+    requests.clear()
+
+    # a missing file is downloaded again, the complete one is skipped
+    first_path = downloader.db.execute(
+        "SELECT path FROM downloads WHERE url = ?;", (urls[0],)
+    ).fetchone()[0]
+    os.remove(tmp_path / "images" / first_path)
+    async with make_downloader(tmp_path) as downloader:
+        await downloader.put(urls)
+
+    assert requests == ["a.jpg"]
+    assert downloader.downloaded == 1 and downloader.skipped == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_downloads_are_reported(image_server, tmp_path):
+    base_url, _ = image_server
+
+    async with make_downloader(tmp_path) as downloader:
+        await downloader.put([base_url + "missing.jpg"])
+
+    assert list(downloader.failed) == [base_url + "missing.jpg"]
+    assert "HTTP 404" in downloader.failed[base_url + "missing.jpg"]
@@ -1,4 +1,4 @@
-from helpers import chunks
+from helpers import chunks, full_size_image_url, normalize_url
 
 
 def test_chunks():
@@ -18,3 +18,25 @@ def test_chunks():
 
     # assert that the actual result from the 'chunks' function matches the expected chunks
     assert result_chunks == expected_chunks
+
+
+def test_normalize_url():
+    # variants of the same url share one key
+    variants = [
+        "https://www.freeimages.com/photo/dog-1383342",
+        "HTTPS://WWW.FreeImages.com/photo/dog-1383342/",
+        "https://www.freeimages.com:443/photo/dog-1383342#top",
+    ]
+    assert {normalize_url(url) for url in variants} == {variants[0]}
+
+    # query parameters are sorted, but not dropped
+    assert normalize_url("https://a.com/p?b=2&a=1") == "https://a.com/p?a=1&b=2"
+    assert normalize_url("https://a.com/p?a=1") != normalize_url("https://a.com/p?a=2")
+
+
+def test_full_size_image_url():
+    # the resize parameters of a preview are dropped, the other ones are kept
+    preview = "https://images.freeimages.com/images/large-previews/0a1/dog-1.jpg?fmt=webp&w=500&v=2"
+    assert full_size_image_url(preview) == (
+        "https://images.freeimages.com/images/large-previews/0a1/dog-1.jpg?v=2"
+    )
@@ -0,0 +1,64 @@
+import pytest
+
+import main
+from benchmarks.mock_server import MockFreeImagesServer
+from scraper import FreeImagesAsyncScraper
+from writers import JsonLinesWriter
+
+
+def test_defaults():
+    args = main.parse_args([], environ={})
+
+    assert (args.query, args.items, args.sink, args.concurrency) == (
+        "dog",
+        1000,
+        "data.sqlite3",
+        25,
+    )
+
+
+def test_arguments_take_precedence_over_the_environment():
+    environ = {
+        "SCRAPER_QUERY": "cat",
+        "SCRAPER_ITEMS": "120",
+        "SCRAPER_SINK": "out.jsonl.gz",
+        "SCRAPER_CONCURRENCY": "4",
+    }
+
+    # unset options come from the environment
+    args = main.parse_args(["bird", "--items", "60"], environ=environ)
+
+    assert (args.query, args.items, args.sink, args.concurrency) == (
+        "bird",
+        60,
+        "out.jsonl.gz",
+        4,
+    )
+
+
+@pytest.mark.parametrize(
+    "argv, environ",
+    [
+        (["--items", "0"], {}),
+        ([], {"SCRAPER_CONCURRENCY": "many"}),
+        (["--sink", "out.csv"], {}),
+    ],
+)
+def test_invalid_options_exit(argv, environ):
+    with pytest.raises(SystemExit):
+        main.parse_args(argv, environ=environ)
+
+
+@pytest.mark.asyncio
+async def test_run_writes_to_the_sink(tmp_path, monkeypatch, capsys):
+    sink = str(tmp_path / "images.jsonl")
+    args = main.parse_args(["cat", "-n", "90", "--sink", sink], environ={})
+
+    async with MockFreeImagesServer(latency=0) as server:
+        monkeypatch.setattr(FreeImagesAsyncScraper, "BASE_URL", server.base_url)
+        result = await main.run(args)
+
+    # the writer is closed at the end, so every record is on disk
+    assert result.items == 90
+    assert len(list(JsonLinesWriter.read(sink))) == 90
+    assert f"into '{sink}'" in capsys.readouterr().out
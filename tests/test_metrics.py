@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+
+import aiohttp
+import pytest
+
+from benchmarks.mock_server import MockFreeImagesServer
+from metrics import NULL_METRICS, MetricsRegistry, PrometheusExporter
+from pipeline import WritePipeline
+from scraper import FreeImagesAsyncScraper
+from writers import IWriter
+
+
+def test_null_metrics_do_nothing():
+    # the default implementation accepts every call and records nothing
+    assert not NULL_METRICS.enabled
+    NULL_METRICS.increment("pages")
+    NULL_METRICS.observe("latency", 0.1)
+    NULL_METRICS.set_gauge("depth", 3)
+    with NULL_METRICS.span("fetch", url="x"):
+        pass
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry(buckets={"latency": (0.1, 1.0)})
+    registry.increment("requests_total", labels={"status": "200"})
+    registry.increment("requests_total", 2, labels={"status": "200"})
+    registry.set_gauge("depth", 4)
+    for value in (0.05, 0.5, 5.0):
+        registry.observe("latency", value)
+
+    # the histogram buckets are cumulative, with the +Inf bucket holding the count
+    assert registry.render_prometheus() == (
+        "# TYPE requests_total counter\n"
+        'requests_total{status="200"} 3\n'
+        "# TYPE depth gauge\n"
+        "depth 4\n"
+        "# TYPE latency histogram\n"
+        'latency_bucket{le="0.1"} 1\n'
+        'latency_bucket{le="1"} 2\n'
+        'latency_bucket{le="+Inf"} 3\n'
+        "latency_sum 5.55\n"
+        "latency_count 3\n"
+    )
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.increment("errors_total", labels={"reason": 'say "hi"\n'})
+
+    assert 'errors_total{reason="say \\"hi\\"\\n"} 1' in registry.render_prometheus()
+
+
+@pytest.mark.asyncio
+async def test_exporter_serves_metrics():
+    registry = MetricsRegistry()
+    registry.increment("pages_total")
+
+    async with PrometheusExporter(registry, port=0) as exporter:
+        async with aiohttp.ClientSession() as session:
+            url = f"http://{exporter.host}:{exporter.port}/metrics"
+            async with session.get(url) as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                assert "pages_total 1" in await response.text()
+
+
+@pytest.mark.asyncio
+async def test_scraper_reports_fetch_parse_and_write_metrics():
+    spans = []
+
+    @contextmanager
+    def span_hook(name, attributes):
+        spans.append(name)
+        yield
+
+    registry = MetricsRegistry(span_hook=span_hook)
+
+    class CountingWriter(IWriter):
+        @staticmethod
+        def write(data):
+            pass
+
+    async with MockFreeImagesServer(latency=0) as server:
+        writer = CountingWriter()
+        scraper = FreeImagesAsyncScraper(
+            120,
+            "dog",
+            writer,
+            write_pipeline=WritePipeline(writer, metrics=registry),
+            metrics=registry,
+        )
+        scraper.BASE_URL = server.base_url
+        await scraper.scrap()
+
+    # every page was fetched, parsed and written
+    assert registry.value("scraper_fetch_requests_total", {"status": "200"}) == 2
+    assert registry.value("scraper_fetch_bytes_total") > 0
+    assert registry.value("scraper_fetch_seconds") == 2
+    assert registry.value("scraper_parse_seconds") == 2
+    assert registry.value("scraper_pages_total", {"outcome": "ok"}) == 2
+    assert registry.value("scraper_write_batch_rows") >= 1
+    assert registry.value("scraper_in_flight_pages") is not None
+    assert spans.count("scrape_page") == spans.count("fetch") == 2
+    assert spans.count("parse") == 2
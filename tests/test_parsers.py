@@ -0,0 +1,102 @@
+import pytest
+
+from benchmarks.pages import build_search_page
+from parsers import PARSERS, BeautifulSoupParser, get_parser
+from records import ImageRecord
+
+DOG = ImageRecord(
+    url="/photo/dog-1383342",
+    preview_url="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&w=500",
+    width=2000,
+    height=1600,
+    title="cuteeeeyy",
+    tags=("dog", "dogg", "doggy"),
+)
+
+
+@pytest.mark.parametrize("name", PARSERS)
+def test_backend_conformance(name, html_content):
+    # every backend returns the same records as the BeautifulSoup reference
+    expected = BeautifulSoupParser().parse(html_content)
+    assert get_parser(name).parse(html_content) == expected
+    assert expected == [DOG] * 3
+
+
+@pytest.mark.parametrize("name", PARSERS)
+def test_backend_conformance_on_full_page(name):
+    # the synthetic page adds header, footer and script noise around 60 results
+    html_content = build_search_page("dog", 2)
+    expected = BeautifulSoupParser().parse(html_content)
+    assert get_parser(name).parse(html_content) == expected
+    assert len(expected) == 60
+
+
+@pytest.mark.parametrize("name", PARSERS)
+def test_backend_ignores_links_outside_grid(name):
+    # links that are not in a grid article, or are commented out, are skipped
+    html_content = """
+        <a class="grid-link" href="/photo/outside">outside</a>
+        <!-- <article class="grid-article"><a class="grid-link" href="/photo/comment"></a></article> -->
+        <article class="other"><a class="grid-link" href="/photo/other"></a></article>
+        <article class="grid-article"><a class="grid-link" href=""></a><a href="/photo/tag"></a>
+        <a class="x grid-link" href="/photo/a&amp;b">ok</a></article>
+    """
+    assert get_parser(name).parse(html_content) == [ImageRecord("/photo/a&b")]
+
+
+@pytest.mark.parametrize("name", PARSERS)
+def test_backend_record_fallbacks(name):
+    # without a caption the title is the alt text, without an img the preview is the srcset
+    html_content = """
+        <article class="grid-article"><a class="grid-link" href="/photo/a">
+        <picture><source srcset="https://cdn/a.jpg 1x, https://cdn/a2.jpg 2x"></picture>
+        </a><a href="/search/red%20car"> Red &amp; <b>Car</b> </a></article>
+        <article class="grid-article"><a class="grid-link" href="/photo/b">
+        <img alt=" A  bird " src="https://cdn/b.jpg" width="wide"></a></article>
+    """
+    assert get_parser(name).parse(html_content, "https://host") == [
+        ImageRecord("https://host/photo/a", "https://cdn/a.jpg", tags=("Red & Car",)),
+        ImageRecord("https://host/photo/b", "https://cdn/b.jpg", title="A bird"),
+    ]
+
+
+@pytest.mark.parametrize("name", PARSERS)
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_incremental_parse_matches_full_parse(name, chunk_size):
+    # the page is fed in chunks that split tags, attributes and texts anywhere
+    html_content = build_search_page("dog", 2, items=10)
+    feed = get_parser(name).incremental()
+    for start in range(0, len(html_content), chunk_size):
+        feed.feed(html_content[start : start + chunk_size])
+
+    assert feed.close() == get_parser(name).parse(html_content)
+    assert len(feed.records) == 10
+
+
+@pytest.mark.parametrize("name", ["tokenizer", "streaming"])
+def test_incremental_parse_stops_after_grid(name):
+    # the end of the main content closes the grid, so the rest of the page can be skipped
+    page = build_search_page("dog", 2, items=10)
+    grid_end = page.index("</main>")
+    feed = get_parser(name).incremental()
+    feed.feed(page[:grid_end])
+    assert not feed.grid_closed
+    feed.feed("</main>")
+    assert feed.grid_closed
+
+    assert feed.close() == get_parser(name).parse(page)
+
+
+@pytest.mark.parametrize("name", ["tokenizer", "streaming"])
+def test_incremental_parse_stops_at_expected_items(name):
+    page = build_search_page("dog", 2, items=10)
+    feed = get_parser(name).incremental(expected_items=10)
+    feed.feed(page[: page.rindex("</article>") + len("</article>")])
+
+    assert feed.grid_closed
+    assert len(feed.close()) == 10
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_parser("missing")
@@ -0,0 +1,153 @@
+import asyncio
+import sqlite3
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from pipeline import WritePipeline
+from storage import Database
+from writers import DatabaseWriter, IWriter
+
+
+def mocked_writer():
+    # a mocked sink that keeps the default write_pages, so batches end up in write
+    writer = MagicMock()
+    writer.write_pages.side_effect = lambda pages: IWriter.write_pages(writer, pages)
+    return writer
+
+
+@pytest.mark.asyncio
+async def test_pages_are_grouped_into_batches():
+    writer = mocked_writer()
+
+    # ten pages of 60 rows with a batch size of 300 rows
+    async with WritePipeline(writer, batch_rows=300, flush_interval=10) as pipeline:
+        for page in range(10):
+            await pipeline.put([f"{page}-{row}" for row in range(60)])
+
+    # the sink saw two large batches, in order
+    batches = [call.args[0] for call in writer.write.call_args_list]
+    assert [len(batch) for batch in batches] == [300, 300]
+    assert batches[0][0] == "0-0" and batches[1][-1] == "9-59"
+
+
+@pytest.mark.asyncio
+async def test_batch_is_flushed_after_the_time_window():
+    writer = mocked_writer()
+    flushed = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    writer.write.side_effect = lambda batch: loop.call_soon_threadsafe(flushed.set)
+
+    async with WritePipeline(writer, batch_rows=1000, flush_interval=0.01) as pipeline:
+        await pipeline.put(["a", "b"])
+
+        # the small batch is written without waiting for more rows or for close
+        await asyncio.wait_for(flushed.wait(), 1)
+
+    writer.write.assert_called_once_with(["a", "b"])
+
+
+@pytest.mark.asyncio
+async def test_writes_run_on_the_writer_thread():
+    threads = []
+    writer = mocked_writer()
+    writer.write.side_effect = lambda batch: threads.append(threading.current_thread())
+
+    async with WritePipeline(writer) as pipeline:
+        await pipeline.put(["a"])
+
+    assert threads and threads[0] is not threading.current_thread()
+
+
+@pytest.mark.asyncio
+async def test_backpressure_when_sink_falls_behind():
+    release = threading.Event()
+    writer = mocked_writer()
+    writer.write.side_effect = lambda batch: release.wait(5)
+
+    pipeline = WritePipeline(writer, batch_rows=1, max_pending_pages=2)
+    await pipeline.start()
+
+    # the first page is taken by the blocked writer and the next two fill the queue
+    for page in range(3):
+        await pipeline.put([page])
+    await asyncio.sleep(0.05)
+
+    # the next page has to wait until the sink catches up
+    blocked_put = asyncio.ensure_future(pipeline.put([3]))
+    await asyncio.sleep(0.05)
+    assert not blocked_put.done()
+
+    release.set()
+    await asyncio.wait_for(blocked_put, 1)
+    await pipeline.close()
+
+    # every page was still written on close
+    written = [row for call in writer.write.call_args_list for row in call.args[0]]
+    assert written == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_writer_error_is_raised():
+    writer = mocked_writer()
+    writer.write.side_effect = ValueError("disk full")
+
+    pipeline = WritePipeline(writer, flush_interval=0)
+    await pipeline.start()
+    await pipeline.put(["a"])
+
+    with pytest.raises(RuntimeError):
+        await pipeline.close()
+
+
+@pytest.mark.asyncio
+async def test_put_requires_running_pipeline():
+    with pytest.raises(RuntimeError):
+        await WritePipeline(MagicMock()).put(["a"])
+
+
+@pytest.mark.asyncio
+async def test_database_writer_through_pipeline(tmp_path, monkeypatch):
+    # the sqlite connection is created here and used from the writer thread
+    monkeypatch.chdir(tmp_path)
+    writer = DatabaseWriter()
+
+    async with WritePipeline(writer) as pipeline:
+        await pipeline.put(["https://example.com/1", "https://example.com/2"])
+
+    rows = Database().execute(f"SELECT url FROM {writer.table_name}").fetchall()
+    assert rows == [("https://example.com/1",), ("https://example.com/2",)]
+
+
+@pytest.mark.asyncio
+async def test_pages_are_checkpointed_with_their_rows(tmp_path):
+    writer = DatabaseWriter("dog", str(tmp_path / "test.sqlite3"))
+
+    # a checkpointed page and a page written without a page number
+    async with WritePipeline(writer) as pipeline:
+        await pipeline.put(["https://example.com/1", "https://example.com/2"], page=1)
+        await pipeline.put(["https://example.com/3"])
+
+    assert writer.completed_pages("dog") == {1: 2}
+    assert writer.completed_pages("cat") == {}
+
+
+@pytest.mark.asyncio
+async def test_database_write_error_fails_the_pipeline(tmp_path, monkeypatch):
+    writer = DatabaseWriter("dog", str(tmp_path / "test.sqlite3"))
+    monkeypatch.setattr(
+        writer.db,
+        "executemany",
+        MagicMock(side_effect=sqlite3.OperationalError("locked")),
+    )
+
+    pipeline = WritePipeline(writer)
+    await pipeline.start()
+    await pipeline.put(["https://example.com/1"], page=1)
+
+    # the page was not stored, so it is neither checkpointed nor reported as written
+    with pytest.raises(RuntimeError):
+        await pipeline.close()
+    monkeypatch.undo()
+    assert writer.completed_pages("dog") == {}
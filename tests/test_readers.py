@@ -0,0 +1,164 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+import writers
+from queries import SELECT_INDEX_NAMES
+from readers import DatabaseReader, ResultCursor
+from records import ImageRecord
+from writers import DatabaseWriter
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    # three runs: "dog" twice, then "cat", one hour apart; the second "dog" run finds
+    # one image already stored by the first one
+    db_name = str(tmp_path / "results.sqlite3")
+    runs = [
+        ("dog", 1000.0, ["https://a.com/dog/1", "https://a.com/dog/2"]),
+        ("dog", 4600.0, ["https://a.com/dog/2", "https://a.com/dog/3"]),
+        ("cat", 8200.0, ["https://a.com/cat/1"]),
+    ]
+    for query, started_at, urls in runs:
+        with patch.object(writers, "datetime") as mocked_datetime:
+            mocked_datetime.timestamp.return_value = started_at
+            writer = DatabaseWriter(query, db_name)
+        writer.write([ImageRecord(url, title=url[-1]) for url in urls])
+    return db_name
+
+
+def urls(rows):
+    return [row.url for row in rows]
+
+
+def test_iter_images_streams_every_run_in_order(db_name):
+    reader = DatabaseReader(db_name)
+
+    # small batches page through the runs without skipping or repeating a row
+    rows = list(reader.iter_images(batch_size=2))
+
+    assert urls(rows) == [
+        "https://a.com/dog/1",
+        "https://a.com/dog/2",
+        "https://a.com/dog/2",
+        "https://a.com/dog/3",
+        "https://a.com/cat/1",
+    ]
+    assert [row.run_id for row in rows] == [1, 1, 2, 2, 3]
+    assert rows[0].query == "dog" and rows[0].started_at == 1000.0
+    assert rows[0].title == "1"
+
+
+def test_filters(db_name):
+    reader = DatabaseReader(db_name)
+
+    assert urls(reader.iter_images(query="cat")) == ["https://a.com/cat/1"]
+    assert urls(reader.iter_images(run_id=2)) == [
+        "https://a.com/dog/2",
+        "https://a.com/dog/3",
+    ]
+    # since is included, until is excluded
+    assert [row.run_id for row in reader.iter_images(since=4600, until=8200)] == [2, 2]
+
+
+def test_page_returns_a_cursor_to_the_next_page(db_name):
+    reader = DatabaseReader(db_name)
+
+    first = reader.page(query="dog", limit=3)
+    second = reader.page(query="dog", after=first.next_cursor, limit=3)
+
+    assert urls(first.rows) == [
+        "https://a.com/dog/1",
+        "https://a.com/dog/2",
+        "https://a.com/dog/2",
+    ]
+    assert first.next_cursor == ResultCursor(2, first.rows[-1].image_id)
+    # the last page has no next cursor
+    assert urls(second.rows) == ["https://a.com/dog/3"]
+    assert second.next_cursor is None
+
+
+def test_rows_added_between_pages_are_read(db_name):
+    reader = DatabaseReader(db_name)
+    first = reader.page(limit=4)
+
+    # a run written while paging shows up on the next page
+    DatabaseWriter("bird", db_name).write(["https://a.com/bird/1"])
+
+    second = reader.page(after=first.next_cursor, limit=4)
+    assert urls(second.rows) == ["https://a.com/cat/1", "https://a.com/bird/1"]
+    assert second.next_cursor is None
+
+
+def test_count_and_summary(db_name):
+    reader = DatabaseReader(db_name)
+
+    assert reader.count() == 5
+    assert reader.count(query="dog") == 4
+    assert reader.count(query="bird") == 0
+
+    # the two "dog" runs share an image
+    summary = reader.summary(query="dog")
+    assert summary.images == 3
+    assert summary.rows == 4
+    assert [(run.run_id, run.images) for run in summary.runs] == [(1, 2), (2, 2)]
+    assert reader.summary().images == 4
+
+
+def test_read_indexes_are_used(db_name):
+    reader = DatabaseReader(db_name)
+
+    plan = reader.db.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM runs WHERE query = ? AND started_at >= ?;",
+        ("dog", 0),
+    ).fetchall()
+
+    assert "runs_query" in str(plan)
+
+
+@pytest.mark.asyncio
+async def test_async_variants(db_name):
+    reader = DatabaseReader(db_name)
+
+    rows = [row async for row in reader.aiter_images(query="dog", batch_size=1)]
+
+    assert len(rows) == 4
+    assert await reader.acount(query="cat") == 1
+    assert (await reader.apage(limit=2)).next_cursor is not None
+    assert (await reader.asummary()).rows == 5
+
+
+def test_missing_database_is_not_created(tmp_path):
+    db_name = tmp_path / "typo.sqlite3"
+
+    with pytest.raises(RuntimeError):
+        DatabaseReader(str(db_name))
+
+    assert not db_name.exists()
+
+
+def test_reader_does_not_take_the_write_lock(db_name):
+    # a writer holds the write lock while the reader opens and reads
+    writer = sqlite3.connect(db_name)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        reader = DatabaseReader(db_name)
+        assert reader.count() == 5
+        with pytest.raises(RuntimeError):
+            reader.db.execute("DELETE FROM runs;")
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_missing_read_indexes_are_created(db_name):
+    connection = sqlite3.connect(db_name)
+    connection.execute("DROP INDEX runs_query;")
+    connection.commit()
+    connection.close()
+
+    reader = DatabaseReader(db_name)
+
+    names = {name for (name,) in reader.db.execute(SELECT_INDEX_NAMES)}
+    assert {"runs_query", "runs_started_at"} <= names
@@ -0,0 +1,87 @@
+import asyncio
+from email.utils import formatdate
+from time import monotonic, time
+
+import pytest
+
+from retry import CircuitBreaker, RateLimiter, RetryPolicy, TokenBucket
+
+
+def test_backoff_grows_and_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+
+    # full jitter keeps every delay between 0 and the exponential ceiling
+    for attempt, ceiling in [(1, 1), (2, 2), (3, 4), (4, 5), (10, 5)]:
+        delays = [policy.backoff(attempt) for _ in range(50)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+
+
+def test_at_least_one_attempt():
+    with pytest.raises(ValueError):
+        RetryPolicy(max_attempts=0)
+
+
+def test_retry_after_header():
+    policy = RetryPolicy(max_delay=30)
+
+    assert policy.retry_after({}) is None
+    assert policy.retry_after({"Retry-After": "3"}) == 3
+    assert policy.retry_after({"Retry-After": "3600"}) == 30
+    assert policy.retry_after({"Retry-After": "not a date"}) is None
+
+    # an HTTP date in the future
+    delay = policy.retry_after({"Retry-After": formatdate(time() + 10, usegmt=True)})
+    assert 8 <= delay <= 10
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests():
+    # a burst of 2, then 50 requests per second
+    bucket = TokenBucket(rate=50, burst=2)
+    start = monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+
+    # the 4 requests after the burst needed about 80ms
+    assert monotonic() - start >= 0.07
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_has_one_bucket_per_host():
+    limiter = RateLimiter(rate=1, burst=1)
+
+    # different hosts don't wait for each other
+    await asyncio.wait_for(
+        asyncio.gather(limiter.acquire("a.com"), limiter.acquire("b.com")), 0.5
+    )
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_on_pushback():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=0.05)
+
+    # a plain failure below the threshold doesn't open the circuit
+    breaker.record_failure()
+    assert not breaker.is_open
+
+    # a pushback opens it for the Retry-After delay, and every request waits
+    breaker.record_failure(pushback=True, delay=0.05)
+    assert breaker.is_open
+    start = monotonic()
+    await breaker.wait()
+    assert monotonic() - start >= 0.04
+    assert not breaker.is_open
+
+    # a success resets the failure count
+    breaker.record_success()
+    assert breaker.failures == 0
+
+
+def test_circuit_breaker_cooldown_doubles():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=1, max_cooldown=3)
+
+    for expected in [1, 2, 3, 3]:
+        before = monotonic()
+        breaker._open_until = 0
+        breaker.record_failure()
+        assert breaker._open_until - before == pytest.approx(expected, abs=0.01)
@@ -1,20 +1,16 @@
-from unittest.mock import AsyncMock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import aiohttp
 import pytest
 
+from benchmarks.mock_server import MockFreeImagesServer
+from concurrency import AIMDController
+from pipeline import WritePipeline
+from records import ImageRecord
+from retry import CircuitBreaker, FetchError, RetryPolicy
 from scraper import FreeImagesAsyncScraper
-
-
-@pytest.fixture
-def html_content():
-    return """<html>
-                <body>
-                    <article class="grid-article"><a class="grid-link" href="/photo/dog-1383342"> <figure class="grid-figure" style="background:#fff"><picture><source srcset="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500"><img alt="dog" class="grid-thumb" height="1600" loading="lazy" src="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500" width="2000"></picture><figcaption class="figcaption">cuteeeeyy</figcaption></figure> </a><div class="grid-item-overlay absolute z-10 opacity-0 top-0 left-0 right-0 bottom-0 pointer-events-none transition-opacity"><div class="flex flex-col justify-between group absolute w-full h-full"><div class="thumb-overlay-container flex h-full w-full"><div class="w-full h-full bg-gradient-to-t from-black-op-0.6 to-transparent relative"><div class="tags-container absolute px-4 py-3"><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dog"> dog </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dogg"> dogg </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/doggy"> doggy </a></div><div class="flex h-full items-end px-4 py-3"><h4 class="text-white truncate">Dog</h4></div></div></div></div></div></article>
-                    <article class="grid-article"><a class="grid-link" href="/photo/dog-1383342"> <figure class="grid-figure" style="background:#fff"><picture><source srcset="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500"><img alt="dog" class="grid-thumb" height="1600" loading="lazy" src="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500" width="2000"></picture><figcaption class="figcaption">cuteeeeyy</figcaption></figure> </a><div class="grid-item-overlay absolute z-10 opacity-0 top-0 left-0 right-0 bottom-0 pointer-events-none transition-opacity"><div class="flex flex-col justify-between group absolute w-full h-full"><div class="thumb-overlay-container flex h-full w-full"><div class="w-full h-full bg-gradient-to-t from-black-op-0.6 to-transparent relative"><div class="tags-container absolute px-4 py-3"><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dog"> dog </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dogg"> dogg </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/doggy"> doggy </a></div><div class="flex h-full items-end px-4 py-3"><h4 class="text-white truncate">Dog</h4></div></div></div></div></div></article>
-                    <article class="grid-article"><a class="grid-link" href="/photo/dog-1383342"> <figure class="grid-figure" style="background:#fff"><picture><source srcset="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500"><img alt="dog" class="grid-thumb" height="1600" loading="lazy" src="https://images.freeimages.com/images/large-previews/3f8/dog-1383342.jpg?fmt=webp&amp;w=500" width="2000"></picture><figcaption class="figcaption">cuteeeeyy</figcaption></figure> </a><div class="grid-item-overlay absolute z-10 opacity-0 top-0 left-0 right-0 bottom-0 pointer-events-none transition-opacity"><div class="flex flex-col justify-between group absolute w-full h-full"><div class="thumb-overlay-container flex h-full w-full"><div class="w-full h-full bg-gradient-to-t from-black-op-0.6 to-transparent relative"><div class="tags-container absolute px-4 py-3"><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dog"> dog </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/dogg"> dogg </a><a class="bg-opacity-20 bg-black px-2.5 py-1 rounded-full text-sm text-white mb-0.5 inline-block backdrop-filter backdrop-blur-sm pointer-events-auto" href="/search/doggy"> doggy </a></div><div class="flex h-full items-end px-4 py-3"><h4 class="text-white truncate">Dog</h4></div></div></div></div></div></article>
-                </body>
-    </html>
-"""
+from writers import DatabaseWriter, IWriter
 
 
 @pytest.fixture
@@ -96,34 +92,537 @@ async def test_generate_tasks(mocked_scrape_page, async_scraper):
     # mocks the scrape page function.
     mocked_scrape_page.side_effect = lambda x: [f"Page {x}"]
 
-    # generate the tasks.
-    tasks = async_scraper.generate_tasks()
+    # generate the tasks, lazily.
+    tasks = [task async for task in async_scraper.generate_tasks()]
 
     # assert that the len of the tasks equals the max pages. It calculates the ceil(number_of_items / self.ITEMS_PER_PAGE).
     assert len(tasks) == async_scraper.max_pages
 
     # for each task, it asserts that the scrape page returns the correct page which was mocked above.
-    for i, task in enumerate(tasks, start=1):
+    for i, (page, task) in enumerate(tasks, start=1):
+        assert page == i
         assert await task == [f"Page {i}"]
 
 
+@pytest.mark.asyncio
+async def test_generate_tasks_is_lazy(async_scraper):
+    # a huge crawl doesn't create any coroutine up front
+    async_scraper.max_pages = 10**9
+    scraped_pages = []
+
+    async def scrape_page(page):
+        scraped_pages.append(page)
+        return []
+
+    with patch.object(async_scraper, "scrape_page", scrape_page):
+        tasks = async_scraper.generate_tasks()
+        page, coroutine = await anext(tasks)
+        await coroutine
+
+        # the generator stops once the end of the results is known
+        async_scraper._last_page = 2
+        async for page, coroutine in tasks:
+            await coroutine
+
+    assert scraped_pages == [1, 2]
+
+
+async def delayed_page(result, delay):
+    # a fake page coroutine that finishes after the given delay
+    await asyncio.sleep(delay)
+    return result
+
+
+async def as_tasks(coroutines):
+    # pairs the coroutines with page numbers, like generate_tasks does
+    for page, coroutine in enumerate(coroutines, start=1):
+        yield page, coroutine
+
+
 @patch("scraper.FreeImagesAsyncScraper.write_to_storage")
 @pytest.mark.asyncio
 async def test_process_tasks_in_chunks(mocked_write_to_storage, async_scraper):
-    # generate a list of AsyncMocks representing asynchronous coroutines
-    coro_results = [AsyncMock(return_value=f"test_{_}") for _ in range(1, 5)]
-
-    # mock the asyncio.gather function to simulate asynchronous task execution
-    with patch("asyncio.gather", AsyncMock()) as mocked_gather:
-        # define a test list containing task results to be returned by asyncio.gather
-        test_list = ["test_1", "test_2", "test_3", "test_4", "test_5"]
-        mocked_gather.return_value = [test_list]
+    # a single page with 5 results
+    test_list = ["test_1", "test_2", "test_3", "test_4", "test_5"]
 
-        # call the function under test and store the result
-        result = await async_scraper.process_tasks_in_chunks(coro_results)
+    # call the function under test and store the result
+    result = await async_scraper.process_tasks_in_chunks(
+        as_tasks([delayed_page(test_list, 0)])
+    )
 
     # the write_to_storage function is called exactly once
     assert mocked_write_to_storage.call_count == 1
 
     # the result matches the expected len of 5
     assert result == 5
+
+
+@patch("scraper.FreeImagesAsyncScraper.write_to_storage")
+@pytest.mark.asyncio
+async def test_process_tasks_in_chunks_keeps_page_order(
+    mocked_write_to_storage, async_scraper
+):
+    # earlier pages finish last, so results arrive in reverse order
+    async_scraper.number_of_items = 4
+    async_scraper.ITEMS_PER_PAGE = 1
+    tasks = as_tasks(delayed_page([f"page_{i}"], 0.01 * (4 - i)) for i in range(4))
+
+    result = await async_scraper.process_tasks_in_chunks(tasks)
+
+    # the pages are still written in page order
+    written = [call.args for call in mocked_write_to_storage.call_args_list]
+    assert written == [
+        (["page_0"], 1),
+        (["page_1"], 2),
+        (["page_2"], 3),
+        (["page_3"], 4),
+    ]
+    assert result == 4
+
+
+@patch("scraper.FreeImagesAsyncScraper.write_to_storage")
+@pytest.mark.asyncio
+async def test_process_tasks_in_chunks_sliding_window(
+    mocked_write_to_storage, async_scraper
+):
+    # tracks how many pages are running at the same time
+    running = 0
+    peak = 0
+
+    async def page(delay):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(delay)
+        running -= 1
+        return ["url"]
+
+    # one slow page and many fast ones, with a window of 3
+    async_scraper.chunk_size = 3
+    async_scraper.number_of_items = 10
+    async_scraper.ITEMS_PER_PAGE = 1
+    tasks = as_tasks(page(0.05 if i == 0 else 0.001) for i in range(10))
+
+    result = await async_scraper.process_tasks_in_chunks(tasks)
+
+    # the window was full but never exceeded
+    assert peak == 3
+    assert result == 10
+
+
+@patch("scraper.FreeImagesAsyncScraper.write_to_storage")
+@pytest.mark.asyncio
+async def test_process_tasks_in_chunks_cancels_after_target(
+    mocked_write_to_storage, async_scraper
+):
+    # the first page already reaches the target, the second one never finishes
+    cancelled = asyncio.Event()
+
+    async def never_finishes():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async_scraper.number_of_items = 2
+    async_scraper.ITEMS_PER_PAGE = 3
+    tasks = as_tasks([delayed_page(["a", "b", "c"], 0), never_finishes()])
+
+    result = await async_scraper.process_tasks_in_chunks(tasks)
+
+    # the result is trimmed to the target and the in-flight page is cancelled
+    mocked_write_to_storage.assert_called_once_with(["a", "b"], None)
+    assert result == 2
+    assert cancelled.is_set()
+
+
+@pytest.fixture
+def mocked_session(html_content):
+    # builds a session whose get() returns a response holding the mocked html
+    response = MagicMock()
+    response.read = AsyncMock(return_value=html_content.encode())
+    response.get_encoding.return_value = "utf-8"
+    session = MagicMock()
+    session.get.return_value.__aenter__.return_value = response
+    session.close = AsyncMock()
+    return session
+
+
+@pytest.fixture
+def session_scraper(mocked_session):
+    return FreeImagesAsyncScraper(
+        number_of_items=60, query="dog", writer=MagicMock(), session=mocked_session
+    )
+
+
+@pytest.mark.asyncio
+async def test_fetch_reuses_injected_session(session_scraper, html_content):
+    scraper = session_scraper
+
+    # fetches two pages through the same scraper
+    first = await scraper.fetch(f"{scraper.BASE_URL}/search/dog/1")
+    second = await scraper.fetch(f"{scraper.BASE_URL}/search/dog/2")
+
+    # both requests went through the single injected session
+    assert first == second == html_content
+    assert scraper.session.get.call_count == 2
+
+    # closing the scraper must not close a session it doesn't own
+    await scraper.close()
+    scraper.session.close.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_fetch_without_session(async_scraper):
+    # fetching before the session is opened is a programming error
+    with pytest.raises(RuntimeError):
+        await async_scraper.fetch(f"{async_scraper.BASE_URL}/search/dog/1")
+
+
+@pytest.mark.asyncio
+async def test_context_manager_owns_session(async_scraper):
+    # entering the scraper creates a pooled session
+    async with async_scraper as scraper:
+        session = scraper.session
+        assert session is not None
+        assert session.connector.limit_per_host == scraper.limit_per_host
+
+    # leaving the scraper closes the session it created
+    assert session.closed
+    assert async_scraper.session is None
+
+
+@pytest.mark.parametrize("parse_executor", ["thread", "process"])
+@pytest.mark.asyncio
+async def test_scrape_page_in_executor(parse_executor, mocked_session, html_content):
+    # the page is parsed by a worker pool instead of the event loop
+    scraper = FreeImagesAsyncScraper(
+        number_of_items=60,
+        query="dog",
+        writer=MagicMock(),
+        session=mocked_session,
+        parse_executor=parse_executor,
+        parse_workers=2,
+    )
+
+    async with scraper:
+        assert scraper._executor is not None
+        res = await scraper.scrape_page(1)
+
+    # the workers return the same records, with absolute urls, as the inline parser
+    assert res == scraper.parse(html_content)
+    assert [record.url for record in res] == [
+        f"{scraper.BASE_URL}/photo/dog-1383342"
+    ] * 3
+
+    # the pool is shut down with the scraper
+    assert scraper._executor is None
+
+
+def test_unknown_parse_executor():
+    with pytest.raises(ValueError):
+        FreeImagesAsyncScraper(
+            number_of_items=60, query="dog", writer=MagicMock(), parse_executor="gpu"
+        )
+
+
+@pytest.mark.asyncio
+async def test_scrap_through_write_pipeline(mocked_session):
+    # the writer only receives batches from the background pipeline
+    writer = MagicMock()
+    writer.write_pages.side_effect = lambda pages: IWriter.write_pages(writer, pages)
+    scraper = FreeImagesAsyncScraper(
+        number_of_items=2,
+        query="dog",
+        writer=writer,
+        session=mocked_session,
+        write_pipeline=WritePipeline(writer, flush_interval=10),
+    )
+
+    result = await scraper.scrap()
+
+    # the pipeline was flushed and stopped when the run finished
+    assert result.items == 2
+    assert not scraper.write_pipeline.is_running
+    written = writer.write.call_args.args[0]
+    assert writer.write.call_count == 1
+    assert [record.url for record in written] == [
+        f"{scraper.BASE_URL}/photo/dog-1383342"
+    ] * 2
+
+
+@pytest.mark.asyncio
+async def test_resumed_scrap_skips_completed_pages(tmp_path):
+    # a previous run of 3 pages died after checkpointing pages 1 and 3
+    writer = DatabaseWriter("dog", str(tmp_path / "test.sqlite3"))
+    writer.write_pages([(1, ["https://a.com/1"] * 60), (3, ["https://a.com/3"] * 60)])
+
+    scraper = FreeImagesAsyncScraper(
+        number_of_items=180,
+        query="dog",
+        writer=writer,
+        session=MagicMock(),
+        resume=True,
+    )
+    scraped_pages = []
+
+    async def scrape_page(page):
+        scraped_pages.append(page)
+        return [f"https://a.com/{page}-{item}" for item in range(60)]
+
+    with patch.object(scraper, "scrape_page", scrape_page):
+        result = await scraper.scrap()
+
+    # only the missing page is fetched, and the resumed items count towards the target
+    assert scraped_pages == [2]
+    assert result.items == 180
+    assert writer.completed_pages("dog") == {1: 60, 2: 60, 3: 60}
+
+
+def mocked_response(status, body=b"", headers=None):
+    # a response for the mocked session, usable as an async context manager
+    response = MagicMock()
+    response.status = status
+    response.headers = headers or {}
+    response.read = AsyncMock(return_value=body)
+    response.get_encoding.return_value = "utf-8"
+    context = MagicMock()
+    context.__aenter__.return_value = response
+    return context
+
+
+@pytest.fixture
+def retrying_scraper():
+    # a scraper whose retries don't wait
+    session = MagicMock()
+    return FreeImagesAsyncScraper(
+        number_of_items=60,
+        query="dog",
+        writer=MagicMock(),
+        session=session,
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0),
+        circuit_breaker=CircuitBreaker(cooldown=0),
+    )
+
+
+@pytest.mark.asyncio
+async def test_fetch_retries_until_success(retrying_scraper):
+    # the site answers 503, then a connection error, then the page
+    retrying_scraper.session.get.side_effect = [
+        mocked_response(503, headers={"Retry-After": "0"}),
+        aiohttp.ClientConnectionError("reset"),
+        mocked_response(200, b"<html></html>"),
+    ]
+
+    assert await retrying_scraper.fetch("https://a.com/1") == "<html></html>"
+    assert retrying_scraper.session.get.call_count == 3
+    assert retrying_scraper.circuit_breaker.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_fetch_gives_up_after_max_attempts(retrying_scraper):
+    retrying_scraper.session.get.side_effect = lambda *args, **kwargs: mocked_response(
+        429
+    )
+
+    with pytest.raises(FetchError) as error:
+        await retrying_scraper.fetch("https://a.com/1")
+
+    assert error.value.status == 429
+    assert retrying_scraper.session.get.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_does_not_retry_client_errors(retrying_scraper):
+    # a 404 won't get better by retrying
+    response = mocked_response(404)
+    response.__aenter__.return_value.raise_for_status.side_effect = (
+        aiohttp.ClientResponseError(MagicMock(), (), status=404)
+    )
+    retrying_scraper.session.get.return_value = response
+
+    with pytest.raises(FetchError) as error:
+        await retrying_scraper.fetch("https://a.com/1")
+
+    assert error.value.status == 404
+    assert retrying_scraper.session.get.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_records_errors_reading_the_body(retrying_scraper):
+    # the body can't be decoded: the error isn't retried, but still counts as a failure
+    retrying_scraper.session.get.return_value = mocked_response(200, b"<html>")
+    read_body = AsyncMock(side_effect=FetchError("https://a.com/1", "bad encoding"))
+
+    with patch.object(retrying_scraper, "_read_body", read_body):
+        with pytest.raises(FetchError):
+            await retrying_scraper.fetch("https://a.com/1")
+
+    assert retrying_scraper.session.get.call_count == 1
+    assert retrying_scraper.circuit_breaker.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_pages_are_reported(retrying_scraper):
+    retrying_scraper.number_of_items = 120
+    retrying_scraper.max_pages = 2
+
+    async def scrape_page(page):
+        if page == 1:
+            raise FetchError("https://a.com/1", "HTTP 503", 503)
+        return [f"https://a.com/{page}-{item}" for item in range(60)]
+
+    with patch.object(retrying_scraper, "scrape_page", scrape_page):
+        result = await retrying_scraper.scrap()
+
+    # the failed page is in the result and nothing was written for it
+    assert result.items == 60
+    assert list(result.failed_pages) == [1]
+    retrying_scraper.writer.write_pages.assert_called_once()
+
+
+@patch("scraper.FreeImagesAsyncScraper.write_to_storage")
+@pytest.mark.asyncio
+async def test_process_tasks_follows_the_concurrency_controller(
+    mocked_write_to_storage, async_scraper
+):
+    running = 0
+    peak = 0
+
+    async def page():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return ["url"]
+
+    # the controller allows 2 pages in flight, under a chunk size of 5
+    async_scraper.chunk_size = 5
+    async_scraper.number_of_items = 10
+    async_scraper.concurrency_controller = AIMDController(max_limit=8, initial_limit=2)
+    async_scraper.ITEMS_PER_PAGE = 1
+    assert async_scraper.concurrency_limit == 2
+
+    await async_scraper.process_tasks_in_chunks(as_tasks(page() for _ in range(10)))
+    assert peak == 2
+
+    # the chunk size stays the hard cap
+    async_scraper.concurrency_controller.limit = 8
+    assert async_scraper.concurrency_limit == 5
+
+
+@patch("scraper.FreeImagesAsyncScraper.write_to_storage")
+@pytest.mark.asyncio
+async def test_short_page_ends_the_crawl(mocked_write_to_storage, async_scraper):
+    # the result set ends on page 3, far below the requested number of items
+    async_scraper.number_of_items = 60 * 1000
+    async_scraper.max_pages = 1000
+    async_scraper.chunk_size = 5
+    scraped_pages = []
+
+    async def scrape_page(page):
+        scraped_pages.append(page)
+        # later pages are slower, so the short page 3 finishes before 4 and 5
+        await asyncio.sleep(0.001 * page)
+        return ["url"] * (60 if page < 3 else 10 if page == 3 else 0)
+
+    with patch.object(async_scraper, "scrape_page", scrape_page):
+        result = await async_scraper.scrap()
+
+    # nothing after page 3 is written or started once the short page is seen
+    written = [call.args[1] for call in mocked_write_to_storage.call_args_list]
+    assert written == [1, 2, 3]
+    assert result.items == 130
+    assert max(scraped_pages) < 3 + 2 * async_scraper.chunk_size
+
+
+@patch("scraper.FreeImagesAsyncScraper.write_to_storage")
+@pytest.mark.asyncio
+async def test_written_urls_are_queued_for_download(
+    mocked_write_to_storage, async_scraper
+):
+    # a running downloader receives the full size images of every page once it is written
+    async_scraper.downloader = MagicMock(is_running=True, put=AsyncMock())
+    async_scraper.number_of_items = 3
+    async_scraper.ITEMS_PER_PAGE = 2
+    pages = [
+        [ImageRecord("a", "a.jpg?fmt=webp&w=500"), ImageRecord("b")],
+        [ImageRecord("c", "c.jpg?w=500"), ImageRecord("d", "d.jpg")],
+    ]
+    tasks = as_tasks([delayed_page(pages[0], 0), delayed_page(pages[1], 0)])
+
+    await async_scraper.process_tasks_in_chunks(tasks)
+
+    # the download stage sees the same, trimmed, records as the storage
+    puts = [list(call.args[0]) for call in async_scraper.downloader.put.call_args_list]
+    assert puts == [["a.jpg"], ["c.jpg"]]
+
+
+class CollectingWriter(IWriter):
+    def __init__(self):
+        self.rows = []
+
+    def write(self, data):
+        self.rows.extend(data)
+
+
+async def scrape_mock_server(server, **kwargs):
+    # returns the result and the written rows of a crawl of the mock server
+    writer = CollectingWriter()
+    scraper = FreeImagesAsyncScraper(180, "dog", writer, **kwargs)
+    scraper.BASE_URL = server.base_url
+    return await scraper.scrap(), writer.rows
+
+
+@pytest.mark.asyncio
+async def test_streaming_skips_the_end_of_the_page():
+    # a heavy footer follows the grid of every page
+    async with MockFreeImagesServer(
+        latency=0, total_items=150, padding=200_000
+    ) as server:
+        full, full_rows = await scrape_mock_server(server)
+        streamed, streamed_rows = await scrape_mock_server(
+            server, streaming=True, stream_chunk_size=4096
+        )
+
+    # the same records are found, without reading the whole pages
+    assert streamed_rows == full_rows
+    assert streamed.items == full.items == 150
+    assert 0 < streamed.transfer_bytes < full.transfer_bytes / 2
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.asyncio
+async def test_compressed_pages_are_decoded(streaming):
+    async with MockFreeImagesServer(latency=0, total_items=150) as server:
+        plain, plain_rows = await scrape_mock_server(server, streaming=streaming)
+        server.compress = True
+        compressed, compressed_rows = await scrape_mock_server(
+            server, streaming=streaming
+        )
+
+    # the transfer size counts the gzip bytes, not the decoded pages
+    assert compressed_rows == plain_rows
+    assert 0 < compressed.transfer_bytes < plain.transfer_bytes / 5
+
+
+def test_streaming_needs_inline_parsing():
+    with pytest.raises(ValueError):
+        FreeImagesAsyncScraper(
+            60, "dog", MagicMock(), streaming=True, parse_executor="thread"
+        )
+
+
+def test_parse_processes_are_spawned():
+    # the pool never forks the process running the event loop and its threads
+    scraper = FreeImagesAsyncScraper(
+        number_of_items=60, query="dog", writer=MagicMock(), parse_executor="process"
+    )
+
+    executor = scraper.create_executor()
+    try:
+        assert executor._mp_context.get_start_method() == "spawn"
+    finally:
+        executor.shutdown()
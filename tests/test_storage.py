@@ -0,0 +1,86 @@
+import pytest
+
+from storage import Database, FileStorage, open_text_stream
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = Database(str(tmp_path / "test.sqlite3"), profile="ingest", mmap_size=2**20)
+    db.execute("CREATE TABLE items(value INTEGER);")
+    return db
+
+
+def test_ingest_profile_pragmas(database):
+    # the ingest profile switches to WAL with relaxed fsyncs
+    assert database.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert database.execute("PRAGMA synchronous").fetchone() == (1,)
+    assert database.execute("PRAGMA mmap_size").fetchone() == (2**20,)
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        Database(profile="turbo")
+
+
+def test_transaction_commits_once(database):
+    with database.transaction():
+        database.executemany("INSERT INTO items(value) VALUES (?);", [(1,), (2,)])
+        database.execute("INSERT INTO items(value) VALUES (?);", (3,))
+
+        # nothing is committed while the transaction is open
+        other = Database(database.db_name)
+        assert other.execute("SELECT COUNT(*) FROM items").fetchone() == (0,)
+
+    assert other.execute("SELECT COUNT(*) FROM items").fetchone() == (3,)
+
+
+def test_transaction_rolls_back_on_error(database):
+    with pytest.raises(ValueError):
+        with database.transaction():
+            database.execute("INSERT INTO items(value) VALUES (?);", (1,))
+            raise ValueError("boom")
+
+    assert database.execute("SELECT COUNT(*) FROM items").fetchone() == (0,)
+
+
+def test_bulk_insert_from_generator(database):
+    # rows come from a generator and are split in several transactions
+    rows = ((value,) for value in range(2500))
+    count = database.bulk_insert("INSERT INTO items(value) VALUES (?);", rows, 1000)
+
+    assert count == 2500
+    assert database.execute("SELECT COUNT(*), SUM(value) FROM items").fetchone() == (
+        2500,
+        sum(range(2500)),
+    )
+
+
+def test_file_storage_reads_back_lines(tmp_path):
+    storage = FileStorage(str(tmp_path / "images.txt"))
+
+    # the file is opened once, and read back line by line
+    storage.write("a\nb\n")
+    storage.write("c\n")
+    storage.close()
+
+    assert storage.read() == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("file_name", ["out.txt", "out.gz", "out.zst"])
+def test_text_streams_can_be_appended(file_name, tmp_path):
+    if file_name.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    file_name = str(tmp_path / file_name)
+
+    # every run appends a new frame, and the reader sees one stream
+    for text in ("first\n", "second\n"):
+        with open_text_stream(file_name, "a") as file:
+            file.write(text)
+
+    with open_text_stream(file_name) as file:
+        assert file.read() == "first\nsecond\n"
+
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError):
+        open_text_stream(str(tmp_path / "out"), "a", compression="lz4")
@@ -0,0 +1,37 @@
+import gzip
+import zlib
+
+import pytest
+
+from transfer import ContentDecoder
+
+
+@pytest.mark.parametrize(
+    "encoding, compress",
+    [
+        ("gzip", gzip.compress),
+        ("deflate", zlib.compress),
+        (None, lambda body: body),
+    ],
+)
+def test_decoder_decodes_chunk_by_chunk(encoding, compress):
+    body = b"<html>" + b"x" * 10_000 + b"</html>"
+    encoded = compress(body)
+    decoder = ContentDecoder(encoding)
+
+    decoded = b"".join(
+        decoder.decode(encoded[start : start + 100])
+        for start in range(0, len(encoded), 100)
+    )
+
+    assert decoded == body
+
+
+def test_unsupported_encoding():
+    with pytest.raises(ValueError):
+        ContentDecoder("compress")
+
+
+def test_corrupt_body():
+    with pytest.raises(ValueError):
+        ContentDecoder("gzip").decode(b"not gzip at all")
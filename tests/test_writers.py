@@ -0,0 +1,193 @@
+import pytest
+
+from records import ImageRecord
+from storage import Database
+from writers import (
+    DatabaseWriter,
+    FileWriter,
+    JsonLinesWriter,
+    ParquetWriter,
+    RecentKeys,
+)
+
+DOG = "https://www.freeimages.com/photo/dog-1383342"
+CAT = "https://www.freeimages.com/photo/cat-1"
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    return str(tmp_path / "test.sqlite3")
+
+
+def count(db_name, table):
+    return Database(db_name).execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_duplicates_within_a_run(db_name):
+    writer = DatabaseWriter("dog", db_name)
+
+    # the same image repeated inside a page and across pages, with url variants
+    writer.write([DOG, DOG, DOG + "/"])
+    writer.write([DOG, CAT])
+
+    assert count(db_name, "images") == 2
+    assert count(db_name, "run_images") == 2
+
+
+def test_duplicates_across_runs(db_name):
+    first = DatabaseWriter("dog", db_name)
+    first.write([DOG, CAT])
+
+    # a second, overlapping run adds no image rows but is still associated with them
+    second = DatabaseWriter("dog", db_name)
+    second.write([DOG, CAT])
+
+    assert count(db_name, "images") == 2
+    assert count(db_name, "runs") == 2
+    rows = Database(db_name).execute(
+        "SELECT run_id, COUNT(*) FROM run_images GROUP BY run_id ORDER BY run_id"
+    )
+    assert rows.fetchall() == [(first.run_id, 2), (second.run_id, 2)]
+
+
+def test_known_keys_are_bounded(db_name):
+    known_keys = RecentKeys(max_size=2)
+    writer = DatabaseWriter("dog", db_name, known_keys=known_keys)
+
+    # the least recently stored keys are forgotten, and deduplicated by SQLite instead
+    writer.write([f"{DOG}/{i}" for i in range(5)])
+    assert len(known_keys) == 2 and f"{DOG}/4" in known_keys
+    DatabaseWriter("dog", db_name, known_keys=known_keys).write([f"{DOG}/0"])
+
+    assert count(db_name, "images") == 5
+    assert count(db_name, "run_images") == 6
+
+
+def test_close_only_an_owned_database(db_name):
+    with DatabaseWriter("dog", db_name) as writer:
+        writer.write([DOG])
+    assert writer.db._connection is None
+
+    # a database passed in is left open for its other users
+    db = Database(db_name)
+    with DatabaseWriter("cat", db=db) as writer:
+        writer.write([CAT])
+    assert db._connection is not None
+
+
+def test_runs_record_the_query(db_name):
+    writer = DatabaseWriter("cat", db_name)
+
+    row = Database(db_name).execute(
+        "SELECT query FROM runs WHERE id = ?", (writer.run_id,)
+    )
+    assert row.fetchone() == ("cat",)
+
+
+def test_records_store_metadata_and_tags(db_name):
+    writer = DatabaseWriter("dog", db_name)
+
+    # the tags are stored once, and linked to every image carrying them
+    writer.write(
+        [
+            ImageRecord(DOG, "https://cdn/dog.jpg", 2000, 1600, "Dog", ("dog", "pet")),
+            ImageRecord(CAT, "https://cdn/cat.jpg", 800, 600, "Cat", ("pet",)),
+        ]
+    )
+
+    db = Database(db_name)
+    rows = db.execute(
+        "SELECT url, preview_url, width, height, title FROM images ORDER BY id"
+    )
+    assert rows.fetchall() == [
+        (DOG, "https://cdn/dog.jpg", 2000, 1600, "Dog"),
+        (CAT, "https://cdn/cat.jpg", 800, 600, "Cat"),
+    ]
+    assert count(db_name, "tags") == 2
+    rows = db.execute(
+        "SELECT images.url, tags.name FROM image_tags"
+        " JOIN images ON images.id = image_id JOIN tags ON tags.id = tag_id"
+        " ORDER BY images.id, tags.name"
+    )
+    assert rows.fetchall() == [(DOG, "dog"), (DOG, "pet"), (CAT, "pet")]
+
+
+def test_bare_urls_get_their_metadata_later(db_name):
+    # stored as a bare URL first, by a writer that remembers it
+    writer = DatabaseWriter("dog", db_name)
+    writer.write([DOG])
+    DatabaseWriter("dog", db_name, known_keys=writer._known_keys).write(
+        [ImageRecord(DOG, "https://cdn/dog.jpg", 2000, 1600, None, ("dog",))]
+    )
+    # stored metadata is never overwritten, only completed
+    DatabaseWriter("dog", db_name).write(
+        [ImageRecord(DOG, "https://cdn/other.jpg", 1, 1, "Dog", ("pet",))]
+    )
+
+    db = Database(db_name)
+    row = db.execute("SELECT preview_url, width, height, title FROM images")
+    assert row.fetchall() == [("https://cdn/dog.jpg", 2000, 1600, "Dog")]
+    rows = db.execute("SELECT tags.name FROM image_tags JOIN tags ON tags.id = tag_id")
+    assert sorted(rows.fetchall()) == [("dog",), ("pet",)]
+
+
+def test_older_databases_get_the_metadata_columns(db_name):
+    # an images table from before the metadata columns existed
+    Database(db_name).execute(
+        "CREATE TABLE images(id INTEGER PRIMARY KEY, url VARCHAR NOT NULL,"
+        " url_key VARCHAR NOT NULL);"
+    )
+
+    writer = DatabaseWriter("dog", db_name)
+    writer.write([ImageRecord(DOG, title="Dog")])
+
+    row = Database(db_name).execute("SELECT url, title FROM images").fetchone()
+    assert row == (DOG, "Dog")
+
+
+RECORDS = [
+    ImageRecord(DOG, "https://cdn/dog.jpg", 2000, 1600, "Dog", ("dog", "pet")),
+    ImageRecord(CAT),
+]
+
+
+def test_file_writer_round_trip(tmp_path):
+    file_name = str(tmp_path / "images.txt")
+
+    with FileWriter(file_name) as writer:
+        writer.write(RECORDS)
+        writer.write([DOG])
+
+    assert list(FileWriter.read(file_name)) == [DOG, CAT, DOG]
+
+
+@pytest.mark.parametrize(
+    "file_name", ["images.jsonl", "images.jsonl.gz", "images.jsonl.zst"]
+)
+def test_json_lines_round_trip(file_name, tmp_path):
+    if file_name.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    file_name = str(tmp_path / file_name)
+
+    with JsonLinesWriter(file_name) as writer:
+        writer.write_pages([(1, RECORDS), (2, [CAT])])
+
+    # the reader is lazy, and rebuilds the same records
+    records = JsonLinesWriter.read(file_name)
+    assert next(records) == RECORDS[0]
+    assert list(records) == [RECORDS[1], ImageRecord(CAT)]
+
+
+def test_parquet_round_trip(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    file_name = str(tmp_path / "images.parquet")
+
+    with ParquetWriter(file_name, row_group_size=2) as writer:
+        writer.write(RECORDS)
+        writer.write([ImageRecord(CAT, title="Cat")])
+
+    # full row groups are flushed as they fill up, and the rest on close
+    assert pq.ParquetFile(file_name).num_row_groups == 2
+    assert list(ParquetWriter.read(file_name, batch_size=1)) == RECORDS + [
+        ImageRecord(CAT, title="Cat")
+    ]
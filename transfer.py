@@ -0,0 +1,46 @@
+import importlib.util
+import zlib
+from typing import Optional
+
+from helpers import import_optional
+
+# Brotli is only advertised when it can be decoded.
+ACCEPT_ENCODING = "gzip, br" if importlib.util.find_spec("brotli") else "gzip"
+
+
+class ContentDecoder:
+    """
+    Undoes the Content-Encoding of a response body, one chunk at a time.
+
+    The scraper's own session leaves the bodies encoded, so the bytes read are the bytes
+    transferred, and decodes them with this class.
+
+    Raises
+    ------
+    ValueError
+        If the encoding isn't supported, or a chunk can't be decoded.
+    """
+
+    def __init__(self, content_encoding: Optional[str] = None):
+        encoding = (content_encoding or "identity").strip().lower()
+        self.encoding = encoding
+        if encoding in ("gzip", "x-gzip"):
+            self._decompress = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+        elif encoding == "deflate":
+            self._decompress = zlib.decompressobj().decompress
+        elif encoding == "br":
+            brotli = import_optional("brotli", "Brotli decoding")
+            self._decompress = brotli.Decompressor().process
+        elif encoding == "identity":
+            self._decompress = None
+        else:
+            raise ValueError(f"Unsupported content encoding: {content_encoding}")
+
+    def decode(self, chunk: bytes) -> bytes:
+        if self._decompress is None:
+            return chunk
+        try:
+            return self._decompress(chunk)
+        except Exception as e:
+            # zlib.error or brotli.error
+            raise ValueError(f"Invalid {self.encoding} body: {e}") from e
@@ -1,8 +1,28 @@
+import json
 from abc import ABC, abstractstaticmethod
+from collections import OrderedDict
 from datetime import datetime
+from typing import Iterator, Optional
 
-from queries import CREATE_IMAGES_TABLE, INSERT_IMAGES
-from storage import Database, FileStorage
+from helpers import import_optional, normalize_url
+from queries import (
+    CREATE_IMAGES_TABLE,
+    CREATE_SCHEMA,
+    IMAGES_METADATA_COLUMNS,
+    INSERT_CHECKPOINTS,
+    INSERT_IMAGE_TAGS,
+    INSERT_IMAGES,
+    INSERT_RUN,
+    INSERT_RUN_IMAGES,
+    INSERT_TAGS,
+    SELECT_CHECKPOINTS,
+    SELECT_IMAGES_COLUMNS,
+)
+from records import ImageRecord, as_record, intern_tags
+from storage import Database, FileStorage, open_text_stream
+
+# URL keys remembered by the pre-filter of DatabaseWriter.
+DEFAULT_RECENT_KEYS = 100_000
 
 
 class IWriter(ABC):
@@ -10,32 +30,273 @@ class IWriter(ABC):
     def write(data):
         pass
 
+    def write_pages(self, pages: list[tuple]):
+        # Writes a batch of (page, rows) pairs. By default all the rows go to a single write
+        # call; writers that keep page checkpoints override it to store both atomically.
+        self.write([row for _, rows in pages for row in rows])
+
+    def completed_pages(self, query: str) -> dict[int, int]:
+        # Pages already written for a query, mapped to their number of items.
+        return {}
+
+    def close(self):
+        # Releases what the writer holds open, such as an output file.
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class RecentKeys:
+    # Bounded LRU set of the URL keys stored recently. A key found here is known to be in the
+    # images table; any other one is inserted, and deduplicated by the unique index, so the
+    # memory used doesn't grow with the database.
+    def __init__(self, max_size=DEFAULT_RECENT_KEYS):
+        self.max_size = max_size
+        self._keys = OrderedDict()
+
+    def __contains__(self, key):
+        if key not in self._keys:
+            return False
+        self._keys.move_to_end(key)
+        return True
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, keys):
+        for key in keys:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+        while len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+
 
 class DatabaseWriter(IWriter):
-    def __init__(self):
-        self.db = Database()
-        now = datetime.now()
-        timestamp = datetime.timestamp(now)
-        self.table_name = f"img_{int(timestamp)}"
-        self.db.execute(CREATE_IMAGES_TABLE(self.table_name))
+    # Stores every image once in the canonical "images" table, keyed by its normalized URL,
+    # with its metadata and its tags in "tags" / "image_tags", and records which images each
+    # run found in "run_images". Rows can be ImageRecords or bare URLs.
+    table_name = "images"
+
+    def __init__(
+        self,
+        query=None,
+        db_name="data.sqlite3",
+        profile="default",
+        db=None,
+        known_keys=None,
+        create_schema=True,
+    ):
+        # Writers of a batch run share one Database and one set of known keys; the batch
+        # creates the schema once, and passes create_schema=False. A shared Database is
+        # closed by its owner, not by close().
+        self._owns_db = db is None
+        self.db = db or Database(db_name, profile=profile)
+        self.query = query
+        with self.db.transaction():
+            if create_schema:
+                self.create_schema(self.db)
+            timestamp = datetime.timestamp(datetime.now())
+            self.run_id = self.db.execute(INSERT_RUN, (query, timestamp)).lastrowid
+
+        # In-memory pre-filter, so most duplicates are dropped before they reach SQLite:
+        # URLs already seen in this run are skipped entirely, and URLs stored recently only
+        # get a run association. Older duplicates are left to the unique index.
+        self._known_keys = known_keys if known_keys is not None else RecentKeys()
+        self._run_keys = set()
+
+    @staticmethod
+    def create_schema(db):
+        db.execute(CREATE_IMAGES_TABLE)
+        # Databases created before the metadata columns existed get them added.
+        columns = {row[1] for row in db.execute(SELECT_IMAGES_COLUMNS)}
+        for column, column_type in IMAGES_METADATA_COLUMNS.items():
+            if column not in columns:
+                db.execute(f"ALTER TABLE images ADD COLUMN {column} {column_type};")
+        for statement in CREATE_SCHEMA:
+            db.execute(statement)
 
-    def write(self, data: list[str]):
+    def write(self, data: list):
+        self.write_pages([(None, data)])
+
+    def write_pages(self, pages: list[tuple]):
+        # The rows and the checkpoints of their pages are committed in the same transaction,
+        # so a page is never marked complete without its rows, or the other way around.
         try:
-            query = INSERT_IMAGES(self.table_name)
-            if data:
-                values = [(url,) for url in data]
-                self.db.executemany(query, values)
+            new_images = []
+            image_tags = []
+            run_images = []
+            checkpoints = []
+            # A dict, so the keys are remembered in the order they were written.
+            batch_keys = {}
+            timestamp = datetime.timestamp(datetime.now())
+            for page, data in pages:
+                for row in data:
+                    record = as_record(row)
+                    url_key = normalize_url(record.url)
+                    if url_key in self._run_keys or url_key in batch_keys:
+                        continue
+                    batch_keys[url_key] = None
+                    run_images.append((self.run_id, url_key))
+                    # A known image is still upserted when the record has metadata, which
+                    # it may have been stored without, and its tags are always added.
+                    has_metadata = any(
+                        value is not None
+                        for value in (
+                            record.preview_url,
+                            record.width,
+                            record.height,
+                            record.title,
+                        )
+                    )
+                    if has_metadata or url_key not in self._known_keys:
+                        new_images.append(
+                            (
+                                record.url,
+                                url_key,
+                                record.preview_url,
+                                record.width,
+                                record.height,
+                                record.title,
+                            )
+                        )
+                    image_tags.extend((url_key, tag) for tag in record.tags)
+                if page is not None and self.query is not None:
+                    checkpoints.append((self.query, page, len(data), timestamp))
+
+            if run_images or checkpoints:
+                with self.db.transaction():
+                    if new_images:
+                        self.db.executemany(INSERT_IMAGES, new_images)
+                    if image_tags:
+                        tag_names = dict.fromkeys(tag for _, tag in image_tags)
+                        self.db.executemany(INSERT_TAGS, ((tag,) for tag in tag_names))
+                        self.db.executemany(INSERT_IMAGE_TAGS, image_tags)
+                    if run_images:
+                        self.db.executemany(INSERT_RUN_IMAGES, run_images)
+                    if checkpoints:
+                        self.db.executemany(INSERT_CHECKPOINTS, checkpoints)
+                self._run_keys.update(batch_keys)
+                self._known_keys.update(batch_keys)
         except Exception as e:
-            print(f"Error writing to the database: {e}")
+            # Raised, so the pipeline fails the scrape instead of counting lost rows as stored.
+            raise RuntimeError(f"Error writing to the database: {e}") from e
+
+    def close(self):
+        if self._owns_db:
+            self.db.close()
+
+    def completed_pages(self, query: str) -> dict[int, int]:
+        return dict(self.db.execute(SELECT_CHECKPOINTS, (query,)).fetchall())
 
 
 class FileWriter(IWriter):
-    def __init__(self):
+    # Plain text output: one page URL per line.
+    def __init__(self, file_name=None):
         now = datetime.now()
         timestamp = datetime.timestamp(now)
-        self.file_name = f"img_{int(timestamp)}.txt"
+        self.file_name = file_name or f"img_{int(timestamp)}.txt"
+        self.file_storage = FileStorage(self.file_name)
+
+    def write(self, data: list):
+        formatted_data = "".join(f"{as_record(row).url}\n" for row in data)
+        self.file_storage.write(formatted_data)
+
+    def close(self):
+        self.file_storage.close()
+
+    @staticmethod
+    def read(file_name) -> Iterator[str]:
+        return FileStorage(file_name).iter_lines()
+
+
+class JsonLinesWriter(IWriter):
+    # One JSON object per record and per line. The file is compressed with gzip or zstd
+    # when its name ends with ".gz" or ".zst", or when a compression is given. It stays open,
+    # behind one buffer, until close().
+    def __init__(self, file_name="images.jsonl", compression: Optional[str] = None):
+        self.file_name = file_name
+        self.compression = compression
+        self._file = None
+
+    def write(self, data: list):
+        if self._file is None:
+            self._file = open_text_stream(self.file_name, "a", self.compression)
+        self._file.writelines(
+            json.dumps(as_record(row)._asdict(), ensure_ascii=False) + "\n"
+            for row in data
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def read(file_name, compression: Optional[str] = None) -> Iterator[ImageRecord]:
+        # Yields the records one line at a time.
+        with open_text_stream(file_name, "r", compression) as file:
+            for line in file:
+                if line.strip():
+                    yield ImageRecord.from_dict(json.loads(line))
+
+
+class ParquetWriter(IWriter):
+    # Columnar output, needs the optional pyarrow package. Records are buffered column by
+    # column and written as one row group every row_group_size records. Parquet files
+    # can't be appended to, so every writer creates its file.
+    def __init__(self, file_name="images.parquet", row_group_size=65536):
+        pa = import_optional("pyarrow", "The Parquet writer")
+        pq = import_optional("pyarrow.parquet", "The Parquet writer")
+        self.file_name = file_name
+        self.row_group_size = row_group_size
+        self.schema = pa.schema(
+            [
+                ("url", pa.string()),
+                ("preview_url", pa.string()),
+                ("width", pa.int32()),
+                ("height", pa.int32()),
+                ("title", pa.string()),
+                ("tags", pa.list_(pa.string())),
+            ]
+        )
+        self._pa = pa
+        self._writer = pq.ParquetWriter(file_name, self.schema)
+        self._columns = {name: [] for name in ImageRecord._fields}
+
+    def write(self, data: list):
+        columns = self._columns
+        for row in data:
+            for name, value in zip(ImageRecord._fields, as_record(row)):
+                columns[name].append(value)
+            if len(columns["url"]) >= self.row_group_size:
+                self._flush()
+
+    def _flush(self):
+        if self._columns["url"]:
+            self._writer.write_table(
+                self._pa.Table.from_pydict(self._columns, schema=self.schema)
+            )
+            self._columns = {name: [] for name in ImageRecord._fields}
+
+    def close(self):
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
 
-    def write(self, data: list[str]):
-        file_storage = FileStorage(self.file_name)
-        formatted_data = "\n".join(data) + "\n"
-        file_storage.write(formatted_data)
+    @staticmethod
+    def read(file_name, batch_size=65536) -> Iterator[ImageRecord]:
+        # Yields the records one batch of rows at a time.
+        pq = import_optional("pyarrow.parquet", "The Parquet reader")
+        for batch in pq.ParquetFile(file_name).iter_batches(batch_size=batch_size):
+            columns = batch.to_pydict()
+            for url, preview_url, width, height, title, tags in zip(
+                *(columns[name] for name in ImageRecord._fields)
+            ):
+                yield ImageRecord(
+                    url, preview_url, width, height, title, intern_tags(tags or ())
+                )